@@ -0,0 +1,364 @@
+"""
+Headless HTTP JSON API for POS terminals and bots, next to the Streamlit app.
+
+    python api.py --host 127.0.0.1 --port 8600
+    EXOTICBILL_API_TOKEN=secret python api.py      # require "Authorization: Bearer secret"
+
+Pure asyncio (no framework), HTTP/1.1 with keep-alive. Pricing, commission
+and persistence are the same db.py helpers the app uses. Bill submissions
+are queued to a single writer that commits up to API_BATCH_MAX queued bills
+per transaction (group commit), so many terminals don't fight over the
+SQLite write lock; reads run on a small thread pool.
+
+    POST /bills              {"employee_cid", "customer_cid", "billing_type",
+                              "items": {name: qty} | "base" | "parts", "repair_type",
+                              "redeem_points"}
+    POST /memberships        {"customer_cid", "tier", "seller_cid"}
+    POST /shifts/start       {"employee_cid"}
+    POST /shifts/end         {"employee_cid"}
+    GET  /stats/live
+    GET  /leaderboard?metric=Total Sales
+    GET  /hood-war?from=YYYY-MM-DD HH:MM:SS&to=...
+    GET  /timeseries?grain=hour|day|week|month&from=...&to=...
+                     [&employee_cid=&hood=&billing_type=&by=hood|employee_cid|billing_type]
+    GET  /loyalty/top?limit=100
+    GET  /health
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlsplit
+
+import db
+import timeseries
+
+API_TOKEN = os.environ.get("EXOTICBILL_API_TOKEN")
+API_ACTOR = "api"
+API_BATCH_MAX = 200
+API_READ_WORKERS = 4
+MAX_BODY = 64 * 1024
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+log = logging.getLogger("exoticbill.api")
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _require(body, *keys):
+    missing = [k for k in keys if not str(body.get(k) or "").strip()]
+    if missing:
+        raise ApiError(400, f"missing field(s): {', '.join(missing)}")
+    return [str(body[k]).strip() for k in keys]
+
+
+def _number(value, field, cast=float):
+    """value (JSON number or numeric string; missing/empty = 0) as a finite float or whole int, else 400."""
+    if value is None or value == "":
+        return cast(0)
+    try:
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError
+        num = float(value)
+        if not math.isfinite(num) or (cast is int and not num.is_integer()):
+            raise ValueError
+    except ValueError:
+        raise ApiError(400, f"{field} must be {'an integer' if cast is int else 'a number'}")
+    return cast(num)
+
+
+# ---------- WRITER ----------
+class BillWriter:
+    """One writer thread; queued bills are committed in batches."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-writer")
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, bill):
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((bill, fut))
+        return await fut
+
+    async def call(self, fn, *args):
+        """Any other write, on the same single writer thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < API_BATCH_MAX and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            bills = [b for b, _ in batch]
+            try:
+                ids = await loop.run_in_executor(self.pool, self._commit, bills)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), bid in zip(batch, ids):
+                if fut.done():
+                    continue
+                if isinstance(bid, Exception):
+                    fut.set_exception(bid)
+                else:
+                    fut.set_result(bid)
+
+    @staticmethod
+    def _commit(bills):
+        def op(conn):
+            out = []
+            for b in bills:
+                # a rejected bill (e.g. not enough points) mustn't take the rest of the batch with it
+                conn.execute("SAVEPOINT api_bill")
+                try:
+                    out.append(db._save_bill(conn, *b))
+                except ValueError as e:
+                    conn.execute("ROLLBACK TO api_bill")
+                    out.append(ApiError(400, str(e)))
+                conn.execute("RELEASE api_bill")
+            return out
+        return db.write_txn("api_bills", op)
+
+
+# ---------- HANDLERS ----------
+class Api:
+    def __init__(self):
+        self.writer = BillWriter()
+        self.readers = ThreadPoolExecutor(max_workers=API_READ_WORKERS, thread_name_prefix="api-read")
+        self.routes = {
+            ("POST", "/bills"): self.create_bill,
+            ("POST", "/memberships"): self.create_membership,
+            ("POST", "/shifts/start"): self.shift_start,
+            ("POST", "/shifts/end"): self.shift_end,
+            ("GET", "/stats/live"): self.live_stats,
+            ("GET", "/leaderboard"): self.leaderboard,
+            ("GET", "/hood-war"): self.hood_war,
+            ("GET", "/timeseries"): self.timeseries,
+            ("GET", "/loyalty/top"): self.top_loyalty,
+            ("GET", "/health"): self.health,
+        }
+
+    async def read(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.readers, fn, *args)
+
+    async def create_bill(self, body, query):
+        emp, cust, btype = _require(body, "employee_cid", "customer_cid", "billing_type")
+        items = body.get("items")
+        if items is not None:
+            if not isinstance(items, dict):
+                raise ApiError(400, "items must be an object of {item name: quantity}")
+            items = {str(name): _number(qty, f"quantity of {name}", int) for name, qty in items.items()}
+            if any(qty < 0 for qty in items.values()):
+                raise ApiError(400, "item quantities can't be negative")
+        repair_type = body.get("repair_type") or "Normal Repair"
+        if repair_type not in db.REPAIR_TYPES:
+            raise ApiError(400, f"repair_type must be one of: {', '.join(db.REPAIR_TYPES)}")
+        base, parts = _number(body.get("base"), "base"), _number(body.get("parts"), "parts", int)
+        redeem_points = _number(body.get("redeem_points"), "redeem_points", int)
+        mem = await self.read(db.get_membership, cust)
+        try:
+            total, det = db.price_bill(
+                btype, items=items, base=base, parts=parts,
+                repair_type=repair_type, tier=mem["tier"] if mem else None,
+            )
+        except (TypeError, ValueError) as e:
+            raise ApiError(400, str(e))
+        if total <= 0:
+            raise ApiError(400, "bill total is zero")
+        redeem = db.redeemable_points(redeem_points, total)
+        bill_id = await self.writer.submit((emp, cust, btype, det, total, redeem))
+        return 201, {"id": bill_id, "total": total - redeem * db.LOYALTY_REDEEM_RS, "redeemed_points": redeem,
+                     "details": det}
+
+    async def create_membership(self, body, query):
+        cust, tier, seller = _require(body, "customer_cid", "tier", "seller_cid")
+        if tier not in db.MEMBERSHIP_DISCOUNTS:
+            raise ApiError(400, f"unknown tier: {tier}")
+        await self.writer.call(db.add_membership, cust, tier)
+        bill = None
+        if tier in db.MEMBERSHIP_PRICES:
+            amt = db.MEMBERSHIP_PRICES[tier]
+            bill = {"id": await self.writer.submit((seller, cust, "MEMBERSHIP", f"{tier} Membership", amt)),
+                    "total": amt}
+        return 201, {"customer_cid": cust, "tier": tier, "bill": bill}
+
+    async def _shift(self, fn, body):
+        (emp,) = _require(body, "employee_cid")
+        ok, msg = await self.writer.call(lambda: fn(emp, actor=API_ACTOR))
+        return (200 if ok else 400), {"ok": ok, "message": msg}
+
+    async def shift_start(self, body, query):
+        return await self._shift(db.start_shift, body)
+
+    async def shift_end(self, body, query):
+        return await self._shift(db.end_shift, body)
+
+    async def live_stats(self, body, query):
+        stats = await self.read(db.get_live_stats, datetime.now(db.IST))
+        stats["top_types"] = [{"billing_type": t, "bills": n, "revenue": r} for t, n, r in stats["top_types"]]
+        stats["active_shifts"] = [{"employee_cid": e, "start_ts": s, "bills": n, "revenue": r}
+                                  for e, s, n, r in stats["active_shifts"]]
+        return 200, stats
+
+    async def leaderboard(self, body, query):
+        metric = query.get("metric", "Total Sales")
+        if metric != "Total Sales" and metric not in db.BILL_TYPES + ["MEMBERSHIP"]:
+            raise ApiError(400, f"unknown metric: {metric}")
+        rows = await self.read(db.get_employee_rankings, metric)
+        return 200, sorted(rows, key=lambda r: r[metric], reverse=True)
+
+    async def hood_war(self, body, query):
+        now = datetime.now(db.IST)
+        start = query.get("from") or (now - timedelta(days=7)).strftime(TS_FMT)
+        end = query.get("to") or now.strftime(TS_FMT)
+        rows = await self.read(db.get_hood_war, start, end)
+        return 200, [{"hood": h, "revenue": r} for h, r in rows]
+
+    async def timeseries(self, body, query):
+        now = datetime.now(db.IST)
+        start = query.get("from") or (now - timedelta(days=7)).strftime(TS_FMT)
+        end = query.get("to") or now.strftime(TS_FMT)
+        by = query.get("by") or None
+        try:
+            rows = await self.read(lambda: timeseries.revenue_series(
+                start, end, query.get("grain", "day"), employee_cid=query.get("employee_cid") or None,
+                hood=query.get("hood") or None, billing_type=query.get("billing_type") or None, by=by))
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        cols = ["bucket"] + ([by] if by else []) + ["bills", "revenue", "commission"]
+        return 200, [dict(zip(cols, r)) for r in rows]
+
+    async def top_loyalty(self, body, query):
+        limit = max(1, min(_number(query.get("limit", 100), "limit", int), 1000))
+        rows = await self.read(db.get_top_loyalty, limit)
+        return 200, [{"customer_cid": c, "points": p} for c, p in rows]
+
+    async def health(self, body, query):
+        return 200, {"ok": True, "queued_bills": self.writer.queue.qsize(),
+                     "writes": db.get_contention_stats()}
+
+    # ---------- HTTP ----------
+    async def dispatch(self, method, target, headers, raw):
+        if API_TOKEN and headers.get("authorization") != f"Bearer {API_TOKEN}":
+            raise ApiError(401, "missing or invalid token")
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path.rstrip("/") or "/"))
+        if handler is None:
+            known = any(path == url.path.rstrip("/") for _, path in self.routes)
+            raise ApiError(405 if known else 404, f"{method} {url.path}")
+        body = {}
+        if raw:
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                raise ApiError(400, "body is not valid JSON")
+            if not isinstance(body, dict):
+                raise ApiError(400, "body must be a JSON object")
+        return await handler(body, dict(parse_qsl(url.query)))
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() == "HTTP/1.1")
+
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # the body can't be framed, so the connection can't be reused either
+                    status, payload, keep_alive = 400, {"error": "Content-Length must be a non-negative integer"}, False
+                elif length > MAX_BODY:
+                    status, payload, keep_alive = 413, {"error": "body too large"}, False
+                else:
+                    raw = await reader.readexactly(length) if length else b""
+                    try:
+                        status, payload = await self.dispatch(method.upper(), target, headers, raw)
+                    except ApiError as e:
+                        status, payload = e.status, {"error": str(e)}
+                    except db.WriteBusyError as e:
+                        status, payload = 503, {"error": str(e)}
+                    except Exception:
+                        # details stay in the server log; clients only learn that it failed
+                        log.exception("%s %s failed", method, target)
+                        status, payload = 500, {"error": "internal error"}
+
+                data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port):
+    db.init_db()
+    api = Api()
+    api.writer.start()
+    server = await asyncio.start_server(api.handle, host, port)
+    print(f"ExoticBill API on http://{host}:{port} (db: {db.DB_PATH})")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    p = argparse.ArgumentParser(description="ExoticBill HTTP JSON API.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8600)
+    p.add_argument("--location", choices=list(db.LOCATIONS),
+                   help="serve this garage's database (one API process per garage)")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.location:
+        # process-wide, so the writer thread and read pool all see it
+        db.DB_PATH = db.location_path(args.location)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,746 +1,110 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
-import json
 import time
 
+from db import (
+    IST, LOCATIONS, default_location, use_location, current_db_path, get_bills_stamp, ITEM_PRICES, MEMBERSHIP_PRICES, BILL_TYPES, REPAIR_TYPES,
+    COMMISSION_RATES, TAX_RATE, LOYALTY_EARN_PER_RS, LOYALTY_REDEEM_RS, price_bill, redeemable_points,
+    connect, init_db, _ensure_shifts_schema, purge_expired_memberships,
+    add_loyalty_points, save_bill,
+    add_employee, delete_employee, update_employee, get_employee_details, get_all_employee_cids, get_employee_directory,
+    add_membership, get_membership, get_all_memberships, get_expiring_memberships, get_past_memberships,
+    delete_membership,
+    get_billing_summary_by_cid, get_employee_bills_page, soft_delete_bills, get_deleted_bills, restore_bills,
+    search_customers, get_customer_bills, find_customers, get_segment_summary, MEMBERSHIP_DISCOUNTS,
+    get_total_billing, get_bill_count, get_total_commission_and_tax,
+    add_hood, update_hood, delete_hood, get_all_hoods, assign_employees_to_hood, get_employees_by_hood,
+    get_bill_logs, start_shift, end_shift, get_employee_shifts, get_live_shifts,
+    reset_all_billings, get_live_stats, get_employee_rankings, get_employee_sales_since,
+    get_hood_war, get_top_loyalty, get_loyalty_points, get_loyalty_ledger, get_ledger_balance, reconcile_loyalty,
+    get_audit_log,
+    report_freshness, refresh_report_snapshot,
+    WriteBusyError, get_contention_stats, reset_contention_stats,
+    get_bill_archives, drop_bill_archive, companion_archive, close_settlement, get_settlement_periods, get_settlement, get_settlement_adjustments, get_unsettled_summary,
+)
+from shift_analytics import get_shift_analytics
+from rerate import rerate_bills, check_rates
+import perf
+import backup
+import maintenance
+import segments
+import federation
+import timeseries
+
 # ---------- CONFIG & SESSION STATE -----------
-IST = ZoneInfo("Asia/Kolkata")
 st.set_page_config(page_title="ExoticBill", page_icon="🧾")
 for key, default in [
     ("logged_in", False),
     ("role", None),
     ("username", ""),
+    ("location", default_location()),
     ("bill_saved", False),
     ("bill_total", 0.0),
 ]:
     if key not in st.session_state:
         st.session_state[key] = default
 
-# ---------- PRICING & DISCOUNTS -----------
-ITEM_PRICES = {
-    "Repair Kit": 400,
-    "Car Wax": 2000,
-    "NOS": 1500,
-    "Adv Lockpick": 400,
-    "Lockpick": 250,
-    "Wash Kit": 300,
-    "Harness": 12000,
-}
-PART_COST = 125
-LABOR = 450
-MEMBERSHIP_DISCOUNTS = {
-    "Tier1": {"REPAIR": 0.20, "CUSTOMIZATION": 0.10},
-    "Tier2": {"REPAIR": 0.33, "CUSTOMIZATION": 0.20},
-    "Tier3": {"REPAIR": 0.50, "CUSTOMIZATION": 0.30},
-    "Racer": {"REPAIR": 0.00, "CUSTOMIZATION": 0.00},
-}
-
-# ---------- MEMBERSHIP PRICES -----------
-MEMBERSHIP_PRICES = {"Tier1": 2000, "Tier2": 4000, "Tier3": 6000}
-
-# ---------- COMMISSION & TAX -----------
-COMMISSION_RATES = {
-    "Trainee": 0.10,
-    "Mechanic": 0.15,
-    "Senior Mechanic": 0.18,
-    "Lead Upgrade Specialist": 0.20,
-    "Stock Manager": 0.15,
-    "Manager": 0.25,
-    "CEO": 0.69,
-}
-TAX_RATE = 0.05  # 5% on the commission
-
-# ---------- LOYALTY ----------
-# Earn 1 point per ₹100 spent on non-membership bills (configurable)
-LOYALTY_EARN_PER_RS = 100  # 1 point per 100 INR
-
-
-# ========== DATABASE INIT & MIGRATION ==========
-def init_db():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    c = conn.cursor()
-
-    def has_column(table, col):
-        info = c.execute(f"PRAGMA table_info({table})").fetchall()
-        return any(row[1] == col for row in info)
-
-    # bills (base)
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS bills (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_cid TEXT,
-        customer_cid TEXT,
-        billing_type TEXT,
-        details TEXT,
-        total_amount REAL,
-        timestamp TEXT
-      )
-    """)
-    # migrations
-    if not has_column("bills", "commission"):
-        c.execute("ALTER TABLE bills ADD COLUMN commission REAL DEFAULT 0")
-    if not has_column("bills", "tax"):
-        c.execute("ALTER TABLE bills ADD COLUMN tax REAL DEFAULT 0")
-
-    # employees (base)
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS employees (
-        cid TEXT PRIMARY KEY,
-        name TEXT,
-        rank TEXT
-      )
-    """)
-    if not has_column("employees", "rank"):
-        c.execute("ALTER TABLE employees ADD COLUMN rank TEXT DEFAULT 'Trainee'")
-    if not has_column("employees", "hood"):
-        c.execute("ALTER TABLE employees ADD COLUMN hood TEXT DEFAULT 'No Hood'")
-
-    # memberships (active)
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS memberships (
-        customer_cid TEXT PRIMARY KEY,
-        tier TEXT,
-        dop TEXT
-      )
-    """)
-
-    # membership history (archived/expired)
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS membership_history (
-        customer_cid TEXT,
-        tier TEXT,
-        dop TEXT,
-        expired_at TEXT
-      )
-    """)
-
-    # hoods
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS hoods (
-        name TEXT PRIMARY KEY,
-        location TEXT
-      )
-    """)
-
-    # soft-deletes for bills
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS bills_deleted (
-        id INTEGER,
-        employee_cid TEXT,
-        customer_cid TEXT,
-        billing_type TEXT,
-        details TEXT,
-        total_amount REAL,
-        timestamp TEXT,
-        commission REAL,
-        tax REAL,
-        deleted_by TEXT,
-        deleted_at TEXT
-      )
-    """)
-
-    # audit log
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS audit_log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        action TEXT,
-        table_name TEXT,
-        row_id TEXT,
-        actor TEXT,
-        ts TEXT,
-        old_values TEXT,
-        new_values TEXT
-      )
-    """)
-
-    # shifts
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS shifts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_cid TEXT,
-        start_ts TEXT,
-        end_ts TEXT,
-        duration_minutes INTEGER,
-        bills_count INTEGER,
-        revenue REAL
-      )
-    """)
-
-    # loyalty
-    c.execute("""
-      CREATE TABLE IF NOT EXISTS loyalty (
-        customer_cid TEXT PRIMARY KEY,
-        points INTEGER DEFAULT 0
-      )
-    """)
-
-    # indexes (use try/except for broad SQLite compatibility)
-    for stmt in [
-        "CREATE INDEX idx_bills_ts ON bills(timestamp)",
-        "CREATE INDEX idx_bills_emp_ts ON bills(employee_cid, timestamp)",
-        "CREATE INDEX idx_bills_cust_ts ON bills(customer_cid, timestamp)",
-        "CREATE INDEX idx_memberships_dop ON memberships(dop)",
-        "CREATE INDEX idx_membership_hist_exp ON membership_history(expired_at)",
-        "CREATE INDEX idx_employees_hood ON employees(hood)",
-        "CREATE INDEX idx_shifts_emp_active ON shifts(employee_cid, end_ts)",
-        "CREATE INDEX idx_loyalty_points ON loyalty(points)",
-    ]:
-        try:
-            c.execute(stmt)
-        except sqlite3.OperationalError:
-            pass
-
-    conn.commit()
-    conn.close()
+# trace every query of this rerun while an admin has the Performance panel open
+perf.finish()       # a previous rerun cut short by st.rerun()/st.stop() left its trace open
+if st.session_state.get("perf_panel") and st.session_state.role == "admin":
+    perf.start_trace(actor=st.session_state.username)
+    perf.mark("Boot")
 
 
+# ---------- DATABASE BOOT ----------
+# every query in this rerun goes to the garage picked at login
+use_location(st.session_state.location)
 init_db()
 
-
-# ---------- SHIFTS SCHEMA ENSURER (same-connection, index-safe) ----------
-def _ensure_shifts_schema(conn):
-    conn.executescript("""
-        CREATE TABLE IF NOT EXISTS shifts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employee_cid TEXT,
-            start_ts TEXT,
-            end_ts TEXT,
-            duration_minutes INTEGER,
-            bills_count INTEGER,
-            revenue REAL
-        );
-    """)
-    try:
-        conn.execute("CREATE INDEX idx_shifts_emp_active ON shifts(employee_cid, end_ts)")
-    except sqlite3.OperationalError:
-        pass
-
-
 # Ensure shifts exist at boot as well (handles old DBs before any UI action)
-with sqlite3.connect("auto_exotic_billing.db") as _boot_conn:
+with connect() as _boot_conn:
     _ensure_shifts_schema(_boot_conn)
 
-
-# ---------- EXPIRE MEMBERSHIPS ----------
-def purge_expired_memberships():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    c = conn.cursor()
-    cutoff_dt = datetime.now(IST) - timedelta(days=7)
-    cutoff_str = cutoff_dt.strftime("%Y-%m-%d %H:%M:%S")
-    expired = c.execute(
-        "SELECT customer_cid, tier, dop FROM memberships WHERE dop <= ?",
-        (cutoff_str,)
-    ).fetchall()
-    for cid, tier, dop_str in expired:
-        try:
-            dop = datetime.strptime(dop_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=IST)
-        except Exception:
-            dop = cutoff_dt
-        expired_at = (dop + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
-        c.execute(
-            "INSERT INTO membership_history (customer_cid, tier, dop, expired_at) VALUES (?,?,?,?)",
-            (cid, tier, dop_str, expired_at)
-        )
-    c.execute("DELETE FROM memberships WHERE dop <= ?", (cutoff_str,))
-    conn.commit()
-    conn.close()
-
-
 purge_expired_memberships()
+backup.start_scheduler()
+maintenance.start_scheduler()
 
 
-# ---------- HELPERS ----------
-def get_employee_rank(cid):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    row = conn.execute("SELECT rank FROM employees WHERE cid = ?", (cid,)).fetchone()
-    conn.close()
-    return row[0] if row else "Trainee"
-
-
-def audit(action, table_name, row_id, actor, old_values=None, new_values=None):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    conn.execute("""
-      INSERT INTO audit_log (action, table_name, row_id, actor, ts, old_values, new_values)
-      VALUES (?,?,?,?,?,?,?)
-    """, (
-        action, table_name, str(row_id), actor,
-        datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"),
-        json.dumps(old_values) if old_values is not None else None,
-        json.dumps(new_values) if new_values is not None else None
-    ))
-    conn.commit()
-    conn.close()
-
-
-def add_loyalty_points(customer_cid, points):
-    if points <= 0:
+# ---------- PERFORMANCE PANEL ----------
+def render_perf_panel():
+    trace = perf.finish()
+    if trace is None:
         return
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    cur = conn.cursor()
-    row = cur.execute("SELECT points FROM loyalty WHERE customer_cid = ?", (customer_cid,)).fetchone()
-    if row:
-        cur.execute("UPDATE loyalty SET points = points + ? WHERE customer_cid = ?", (points, customer_cid))
-    else:
-        cur.execute("INSERT INTO loyalty (customer_cid, points) VALUES (?, ?)", (customer_cid, points))
-    conn.commit()
-    conn.close()
-
-
-def save_bill(emp, cust, btype, det, amt):
-    now_ist = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
-
-    # Commission rules:
-    # - No commission/tax on UPGRADES and MEMBERSHIP
-    # - No commission/tax on ITEMS if ONLY Harness and/or NOS are present
-    no_commission = False
-    if btype in ["UPGRADES", "MEMBERSHIP"]:
-        no_commission = True
-    elif btype == "ITEMS":
-        no_commission_items = {"Harness", "NOS"}
-        item_names = []
-        if det:
-            try:
-                item_names = [i.strip().split("×")[0] for i in det.split(",") if i.strip()]
-            except Exception:
-                item_names = []
-        if item_names and all(name in no_commission_items for name in item_names):
-            no_commission = True
-
-    if no_commission:
-        commission = 0.0
-        tax = 0.0
-    else:
-        comm_rate = COMMISSION_RATES.get(get_employee_rank(emp), 0)
-        commission = amt * comm_rate
-        tax = commission * TAX_RATE
-
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    conn.execute("""
-        INSERT INTO bills
-          (employee_cid, customer_cid, billing_type, details, total_amount, timestamp, commission, tax)
-        VALUES (?,?,?,?,?,?,?,?)
-    """, (emp, cust, btype, det, amt, now_ist, commission, tax))
-    conn.commit()
-    conn.close()
-
-    # Loyalty on non-membership bills
-    if btype != "MEMBERSHIP" and cust:
-        points = int(amt // LOYALTY_EARN_PER_RS)
-        add_loyalty_points(cust, points)
-
-
-def add_employee(cid, name, rank="Trainee"):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    try:
-        conn.execute("INSERT INTO employees (cid, name, rank) VALUES (?,?,?)", (cid, name, rank))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        st.warning("Employee CID already exists.")
-    conn.close()
-
-
-def delete_employee(cid):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    conn.execute("DELETE FROM employees WHERE cid = ?", (cid,))
-    conn.commit()
-    conn.close()
-
-
-def update_employee(cid, name=None, rank=None, hood=None):
-    before = get_employee_details(cid)
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    if name is not None:
-        conn.execute("UPDATE employees SET name = ? WHERE cid = ?", (name, cid))
-    if rank is not None:
-        conn.execute("UPDATE employees SET rank = ? WHERE cid = ?", (rank, cid))
-    if hood is not None:
-        conn.execute("UPDATE employees SET hood = ? WHERE cid = ?", (hood, cid))
-    conn.commit()
-    conn.close()
-    after = get_employee_details(cid)
-    audit("UPDATE_EMP", "employees", cid, st.session_state.get("username", "?"), before, after)
-
-
-def get_employee_details(cid):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    row = conn.execute("SELECT name, rank, hood FROM employees WHERE cid = ?", (cid,)).fetchone()
-    conn.close()
-    if row:
-        return {"name": row[0], "rank": row[1], "hood": row[2]}
-    return None
-
-
-def get_all_employee_cids():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    rows = conn.execute("SELECT cid, name FROM employees").fetchall()
-    conn.close()
-    return rows
-
-
-def add_membership(cust, tier):
-    dop_ist = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    conn.execute(
-        "INSERT OR REPLACE INTO memberships (customer_cid, tier, dop) VALUES (?,?,?)",
-        (cust, tier, dop_ist)
-    )
-    conn.commit()
-    conn.close()
-
-
-def get_membership(cust):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    row = conn.execute(
-        "SELECT tier, dop FROM memberships WHERE customer_cid = ?", (cust,)
-    ).fetchone()
-    conn.close()
-    return {"tier": row[0], "dop": row[1]} if row else None
-
-
-def get_all_memberships():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    rows = conn.execute("SELECT customer_cid, tier, dop FROM memberships").fetchall()
-    conn.close()
-    return rows
-
-
-def get_past_memberships():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    rows = conn.execute("""
-        SELECT customer_cid, tier, dop, expired_at
-        FROM membership_history
-        ORDER BY expired_at DESC
-    """).fetchall()
-    conn.close()
-    return rows
-
-
-def get_billing_summary_by_cid(cid):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    summary = {}
-    for bt in ["ITEMS", "UPGRADES", "REPAIR", "CUSTOMIZATION", "MEMBERSHIP"]:
-        amt = conn.execute(
-            "SELECT SUM(total_amount) FROM bills WHERE employee_cid=? AND billing_type=?",
-            (cid, bt)
-        ).fetchone()[0] or 0.0
-        summary[bt] = amt
-    total = conn.execute("SELECT SUM(total_amount) FROM bills WHERE employee_cid=?", (cid,)).fetchone()[0] or 0.0
-    conn.close()
-    return summary, total
-
-
-def get_employee_bills(cid):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    rows = conn.execute("""
-        SELECT id, customer_cid, billing_type, details,
-               total_amount, timestamp, commission, tax
-        FROM bills WHERE employee_cid=?
-        ORDER BY timestamp DESC
-    """, (cid,)).fetchall()
-    conn.close()
-    return rows
-
-
-def get_bill_by_id(bill_id):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    row = conn.execute("""
-        SELECT id, employee_cid, customer_cid, billing_type, details,
-               total_amount, timestamp, commission, tax
-        FROM bills WHERE id=?
-    """, (bill_id,)).fetchone()
-    conn.close()
-    return row
-
-
-def soft_delete_bill(bill_id, actor):
-    row = get_bill_by_id(bill_id)
-    if not row:
-        return False
-    (bid, emp, cust, btype, details, amt, ts, comm, tax) = row
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    cur = conn.cursor()
-    cur.execute("""
-      INSERT INTO bills_deleted
-      (id, employee_cid, customer_cid, billing_type, details, total_amount, timestamp, commission, tax, deleted_by, deleted_at)
-      VALUES (?,?,?,?,?,?,?,?,?,?,?)
-    """, (
-        bid, emp, cust, btype, details, amt, ts, comm, tax,
-        actor, datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
-    ))
-    cur.execute("DELETE FROM bills WHERE id=?", (bill_id,))
-    conn.commit()
-    conn.close()
-    audit("DELETE_BILL", "bills", bill_id, actor, old_values={
-        "id": bid, "employee_cid": emp, "customer_cid": cust, "billing_type": btype,
-        "details": details, "total_amount": amt, "timestamp": ts,
-        "commission": comm, "tax": tax
-    }, new_values=None)
-    return True
-
-
-def get_all_customers():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    rows = conn.execute("SELECT DISTINCT customer_cid FROM bills").fetchall()
-    conn.close()
-    return [r[0] for r in rows]
-
-
-def get_customer_bills(cid):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    try:
-        rows = conn.execute("""
-            SELECT employee_cid, billing_type, details,
-                   total_amount, timestamp, commission, tax
-            FROM bills
-            WHERE customer_cid = ?
-            ORDER BY timestamp DESC
-        """, (cid,)).fetchall()
-        return rows
-    finally:
-        conn.close()
-
-
-def get_total_billing():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    total = conn.execute("SELECT SUM(total_amount) FROM bills").fetchone()[0] or 0.0
-    conn.close()
-    return total
-
-
-def get_bill_count():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    cnt = conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0] or 0
-    conn.close()
-    return cnt
-
-
-def get_total_commission_and_tax():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    row = conn.execute("SELECT SUM(commission), SUM(tax) FROM bills").fetchone()
-    conn.close()
-    return (row[0] or 0.0, row[1] or 0.0)
-
-
-# ---------- HOODS HELPERS ----------
-def add_hood(name, location):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    try:
-        conn.execute("INSERT INTO hoods (name, location) VALUES (?,?)", (name, location))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        st.warning("That hood already exists.")
-    conn.close()
-
-
-def update_hood(old_name, new_name, new_location):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    c = conn.cursor()
-    c.execute("UPDATE hoods SET name=?, location=? WHERE name=?", (new_name, new_location, old_name))
-    c.execute("UPDATE employees SET hood=? WHERE hood=?", (new_name, old_name))
-    conn.commit()
-    conn.close()
-
-
-def delete_hood(name):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    c = conn.cursor()
-    c.execute("DELETE FROM hoods WHERE name=?", (name,))
-    c.execute("UPDATE employees SET hood='No Hood' WHERE hood=?", (name,))
-    conn.commit()
-    conn.close()
-
-
-def get_all_hoods():
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    rows = conn.execute("SELECT name, location FROM hoods").fetchall()
-    conn.close()
-    return rows
-
-
-def assign_employees_to_hood(hood, cids):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    for cid in cids:
-        conn.execute("UPDATE employees SET hood=? WHERE cid=?", (hood, cid))
-    conn.commit()
-    conn.close()
-
-
-def get_employees_by_hood(hood):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    rows = conn.execute("SELECT cid, name FROM employees WHERE hood=?", (hood,)).fetchall()
-    conn.close()
-    return rows
-
-
-# ---------- BILL LOGS HELPER ----------
-def get_bill_logs(start_str=None, end_str=None):
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    c = conn.cursor()
-    base_sql = """
-        SELECT
-            b.id, b.timestamp,
-            COALESCE(e.name, 'Unknown') AS emp_name,
-            b.employee_cid,
-            COALESCE(e.hood, 'No Hood') AS hood,
-            b.customer_cid, b.billing_type, b.details,
-            b.total_amount, b.commission, b.tax
-        FROM bills b
-        LEFT JOIN employees e ON e.cid = b.employee_cid
-    """
-    params = ()
-    if start_str and end_str:
-        base_sql += " WHERE b.timestamp >= ? AND b.timestamp <= ?"
-        params = (start_str, end_str)
-    base_sql += " ORDER BY b.timestamp DESC"
-    rows = c.execute(base_sql, params).fetchall()
-    conn.close()
-    return rows
-
-
-# ---------- SHIFT HELPERS ----------
-def _ensure_shifts_schema(conn):
-    """
-    Ensure the 'shifts' table exists and contains all required columns.
-    Safe to call repeatedly; will migrate older tables forward.
-    """
-    cur = conn.cursor()
-    # Does the table exist?
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='shifts'")
-    exists = cur.fetchone() is not None
-
-    if not exists:
-        # Fresh create with full schema
-        cur.executescript("""
-            CREATE TABLE IF NOT EXISTS shifts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_cid TEXT,
-                start_ts TEXT,
-                end_ts TEXT,
-                duration_minutes INTEGER,
-                bills_count INTEGER,
-                revenue REAL
-            );
-        """)
-    else:
-        # Migrate missing columns on older DBs
-        cols = {row[1] for row in cur.execute("PRAGMA table_info('shifts')").fetchall()}
-        if "employee_cid" not in cols:
-            cur.execute("ALTER TABLE shifts ADD COLUMN employee_cid TEXT")
-        if "start_ts" not in cols:
-            cur.execute("ALTER TABLE shifts ADD COLUMN start_ts TEXT")
-        if "end_ts" not in cols:
-            cur.execute("ALTER TABLE shifts ADD COLUMN end_ts TEXT")
-        if "duration_minutes" not in cols:
-            cur.execute("ALTER TABLE shifts ADD COLUMN duration_minutes INTEGER")
-        if "bills_count" not in cols:
-            cur.execute("ALTER TABLE shifts ADD COLUMN bills_count INTEGER")
-        if "revenue" not in cols:
-            cur.execute("ALTER TABLE shifts ADD COLUMN revenue REAL")
-
-    # Create the index if missing (works on old SQLite too)
-    try:
-        cur.execute("CREATE INDEX idx_shifts_emp_active ON shifts(employee_cid, end_ts)")
-    except sqlite3.OperationalError:
-        # Index already exists (or older SQLite message) – ignore
-        pass
-
-    conn.commit()
-
-def start_shift(employee_cid):
-    if not (employee_cid and str(employee_cid).strip()):
-        return False, "Please enter your CID first."
-
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    try:
-        _ensure_shifts_schema(conn)
-        try:
-            active = conn.execute(
-                "SELECT id FROM shifts WHERE employee_cid=? AND end_ts IS NULL",
-                (employee_cid,)
-            ).fetchone()
-        except sqlite3.OperationalError:
-            _ensure_shifts_schema(conn)
-            active = conn.execute(
-                "SELECT id FROM shifts WHERE employee_cid=? AND end_ts IS NULL",
-                (employee_cid,)
-            ).fetchone()
-
-        if active:
-            return False, "Shift already active."
-
-        conn.execute(
-            "INSERT INTO shifts (employee_cid, start_ts) VALUES (?,?)",
-            (employee_cid, datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"))
-        )
-        conn.commit()
-    finally:
-        conn.close()
-
-    audit("SHIFT_START", "shifts", "-", st.session_state.get("username", "?"),
-          new_values={"employee_cid": employee_cid})
-    return True, "Shift started."
+    st.markdown("---")
+    st.header("⏱️ Performance")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Rerun Time", f"{trace.total_ms:,.1f} ms")
+    col2.metric("Queries", f"{len(trace.queries):,}")
+    col3.metric("Time in SQL", f"{sum(q['ms'] for q in trace.queries):,.1f} ms")
 
+    st.subheader("Sections")
+    st.table(pd.DataFrame(perf.section_summary(trace)))
 
-def end_shift(employee_cid):
-    if not (employee_cid and str(employee_cid).strip()):
-        return False, "Please enter your CID first."
+    nplus = perf.n_plus_one(trace)
+    if nplus:
+        st.subheader("⚠️ Possible N+1 Patterns")
+        st.warning(f"{len(nplus)} statement shape(s) ran {perf.N_PLUS_ONE_MIN}+ times in one section.")
+        st.dataframe(pd.DataFrame(nplus)[["section", "count", "ms", "rows", "sql"]], use_container_width=True)
 
-    conn = sqlite3.connect("auto_exotic_billing.db")
-    try:
-        _ensure_shifts_schema(conn)
-        try:
-            row = conn.execute(
-                "SELECT id, start_ts FROM shifts WHERE employee_cid=? AND end_ts IS NULL",
-                (employee_cid,)
-            ).fetchone()
-        except sqlite3.OperationalError:
-            _ensure_shifts_schema(conn)
-            row = conn.execute(
-                "SELECT id, start_ts FROM shifts WHERE employee_cid=? AND end_ts IS NULL",
-                (employee_cid,)
-            ).fetchone()
-
-        if not row:
-            return False, "No active shift."
-
-        sid, start_ts = row
-        now = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
-
-        bills = conn.execute("""
-            SELECT COUNT(*), COALESCE(SUM(total_amount),0)
-            FROM bills WHERE employee_cid=? AND timestamp>=? AND timestamp<=?
-        """, (employee_cid, start_ts, now)).fetchone()
-        bcount, revenue = (bills[0] or 0, bills[1] or 0.0)
-
-        dt_start = datetime.strptime(start_ts, "%Y-%m-%d %H:%M:%S")
-        dt_end = datetime.strptime(now, "%Y-%m-%d %H:%M:%S")
-        duration = int((dt_end - dt_start).total_seconds() // 60)
-
-        conn.execute("""
-            UPDATE shifts SET end_ts=?, duration_minutes=?, bills_count=?, revenue=?
-            WHERE id=?
-        """, (now, duration, bcount, revenue, sid))
-        conn.commit()
-    finally:
-        conn.close()
-
-    audit("SHIFT_END", "shifts", sid, st.session_state.get("username", "?"),
-          old_values={"start_ts": start_ts},
-          new_values={"end_ts": now, "bills": bcount, "revenue": revenue})
-    return True, "Shift ended."
+    st.subheader("Slowest Statements")
+    slow = perf.slowest(trace)
+    if slow:
+        st.dataframe(pd.DataFrame(slow)[["section", "ms", "rows", "sql"]], use_container_width=True)
+    st.caption(f"Each traced rerun is appended to {perf.LOG_PATH}.")
 
 
 # ---------- AUTHENTICATION ----------
-def login(u, p):
+def login(u, p, loc):
     if u == "AutoExotic" and p == "AutoExotic123":
         st.session_state.logged_in, st.session_state.role, st.session_state.username = True, "admin", u
     elif u == "User" and p == "User123":
         st.session_state.logged_in, st.session_state.role, st.session_state.username = True, "user", u
     else:
         st.error("Invalid credentials")
+        return
+    st.session_state.location = loc
+    st.rerun()      # boot again against the chosen garage's database
 
 
 if not st.session_state.logged_in:
@@ -748,17 +112,55 @@ if not st.session_state.logged_in:
     with st.form("login_form"):
         uname = st.text_input("Username")
         pwd = st.text_input("Password", type="password")
+        loc = st.selectbox("Garage", list(LOCATIONS)) if len(LOCATIONS) > 1 else default_location()
         if st.form_submit_button("Login"):
-            login(uname, pwd)
+            login(uname, pwd, loc)
     st.stop()
 
 with st.sidebar:
     st.success(f"Logged in as: {st.session_state.username}")
+    if len(LOCATIONS) > 1:
+        st.caption(f"📍 Garage: **{st.session_state.location}**")
     if st.button("Logout"):
         st.session_state.clear()
         st.rerun()
 
 
+# ---------- FLASH MESSAGES ----------
+# st.rerun() discards whatever the current run has drawn, so a confirmation
+# shown right before it never appears; park it here and show it next run.
+def flash(msg):
+    st.session_state.flash = msg
+
+
+def show_flash():
+    msg = st.session_state.pop("flash", None)
+    if msg:
+        st.success(msg)
+
+
+# ---------- LAZY SECTIONS ----------
+# st.tabs runs every tab's body on each rerun; these pages use a keyed
+# selector instead, so only the visible section queries the database.
+SECTION_CACHE_ENTRIES = 64
+
+
+def section_picker(key, labels):
+    return st.radio("Section", labels, horizontal=True, key=key, label_visibility="collapsed")
+
+
+# Heavier per-section results, shared across sessions for quick switching. They are
+# keyed on the bills stamp (changes whenever bills do) and the staff involved.
+@st.cache_data(max_entries=SECTION_CACHE_ENTRIES, show_spinner=False)
+def cached_rankings(db_path, stamp, staff, metric):
+    return get_employee_rankings(metric)
+
+
+@st.cache_data(max_entries=SECTION_CACHE_ENTRIES, show_spinner=False)
+def cached_hood_summary(db_path, stamp, members):
+    return [{"CID": cid, "Name": name, "Total": get_billing_summary_by_cid(cid)[1]} for cid, name in members]
+
+
 # ---------- USER PANEL ----------
 if st.session_state.role == "user":
     st.title("🧾 ExoticBill - Add New Bill")
@@ -774,69 +176,60 @@ if st.session_state.role == "user":
         with colA:
             if st.button("▶️ Start Shift"):
                 if cid_for_shift:
-                    ok, msg = start_shift(cid_for_shift)
+                    ok, msg = start_shift(cid_for_shift, actor=st.session_state.get("username", "?"))
                     (st.success if ok else st.warning)(msg)
                 else:
                     st.warning("Enter your CID to start shift.")
         with colB:
             if st.button("⏹️ End Shift"):
                 if cid_for_shift:
-                    ok, msg = end_shift(cid_for_shift)
+                    ok, msg = end_shift(cid_for_shift, actor=st.session_state.get("username", "?"))
                     (st.success if ok else st.warning)(msg)
                 else:
                     st.warning("Enter your CID to end shift.")
 
     st.markdown("---")
-    btype = st.selectbox("Select Billing Type", ["ITEMS", "UPGRADES", "REPAIR", "CUSTOMIZATION"])
-    rtype = st.radio("Repair Type", ["Normal Repair", "Advanced Repair"]) if btype == "REPAIR" else None
+    btype = st.selectbox("Select Billing Type", BILL_TYPES)
+    rtype = st.radio("Repair Type", REPAIR_TYPES) if btype == "REPAIR" else None
 
     with st.form("bill_form", clear_on_submit=True):
         emp_cid = st.text_input("Your CID (Employee)")
         cust_cid = st.text_input("Customer CID")
-        total, det = 0.0, ""
-
+        items, base, parts = {}, 0.0, 0
         if btype == "ITEMS":
-            sel = {}
             for item, price in ITEM_PRICES.items():
-                q = st.number_input(f"{item} (₹{price}) – Qty", min_value=0, step=1, key=f"user_items_{item}")
-                if q:
-                    sel[item] = q
-                    total += price * q
-            det = ", ".join(f"{i}×{q}" for i, q in sel.items())
-
+                items[item] = st.number_input(f"{item} (₹{price}) – Qty", min_value=0, step=1, key=f"user_items_{item}")
         elif btype == "UPGRADES":
-            amt = st.number_input("Base upgrade amount (₹)", min_value=0.0, key="user_upg_amt")
-            total = amt * 1.5
-            det = f"Upgrade: ₹{amt}"
-
+            base = st.number_input("Base upgrade amount (₹)", min_value=0.0, key="user_upg_amt")
         elif btype == "REPAIR":
             if rtype == "Normal Repair":
-                b = st.number_input("Base repair charge (₹)", min_value=0.0, key="user_rep_base")
-                total = b + LABOR
-                det = f"Normal Repair: ₹{b}+₹{LABOR}"
+                base = st.number_input("Base repair charge (₹)", min_value=0.0, key="user_rep_base")
             else:
-                p = st.number_input("Number of parts repaired", min_value=0, step=1, key="user_rep_parts")
-                total = p * PART_COST
-                det = f"Advanced Repair: {p}×₹{PART_COST}"
+                parts = st.number_input("Number of parts repaired", min_value=0, step=1, key="user_rep_parts")
         else:
-            c_amt = st.number_input("Base customization amount (₹)", min_value=0.0, key="user_cust_amt")
-            total = c_amt * 2
-            det = f"Customization: ₹{c_amt}×2"
+            base = st.number_input("Base customization amount (₹)", min_value=0.0, key="user_cust_amt")
+
+        redeem = st.number_input(f"Redeem loyalty points (₹{LOYALTY_REDEEM_RS:g} off each)", min_value=0, step=1,
+                                 key="user_redeem_pts")
 
         mem = get_membership(cust_cid)
-        if mem:
-            disc = MEMBERSHIP_DISCOUNTS.get(mem["tier"], {}).get(btype, 0)
-            if disc > 0:
-                total *= (1 - disc)
-                det += f" | {mem['tier']} discount {int(disc * 100)}%"
+        total, det = price_bill(btype, items=items, base=base, parts=parts, repair_type=rtype,
+                                tier=mem["tier"] if mem else None)
 
         if st.form_submit_button("💾 Save Bill"):
             if not emp_cid or not cust_cid or total == 0:
                 st.warning("Fill all fields.")
             else:
-                save_bill(emp_cid, cust_cid, btype, det, total)
-                st.session_state.bill_saved = True
-                st.session_state.bill_total = total
+                try:
+                    pts = redeemable_points(redeem, total)
+                    save_bill(emp_cid, cust_cid, btype, det, total, redeem_points=pts)
+                    st.session_state.bill_saved = True
+                    st.session_state.bill_total = total - pts * LOYALTY_REDEEM_RS
+                except ValueError as e:
+                    st.error(f"Bill NOT saved: {e}.")
+                except WriteBusyError:
+                    st.error(f"The system is busy and the bill was NOT saved. Please submit it again "
+                             f"({btype}, ₹{total:,.2f} for {cust_cid}).")
 
     # MEMBERSHIP FORM (user only)
     st.markdown("---")
@@ -867,32 +260,141 @@ if st.session_state.role == "user":
     if st.button("Check Membership"):
         mem = get_membership(lookup)
         if mem:
-            dop = datetime.strptime(mem["dop"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=IST)
-            expiry = dop + timedelta(days=7)
-            rem = expiry - datetime.now(IST)
-            st.info(f"{lookup}: {mem['tier']}, expires in {rem.days}d {rem.seconds // 3600}h on {expiry.strftime('%Y-%m-%d %H:%M:%S')} IST")
+            rem = datetime.strptime(mem["expires_at"], "%Y-%m-%d %H:%M:%S") - datetime.now(IST).replace(tzinfo=None)
+            st.info(f"{lookup}: {mem['tier']}, expires in {rem.days}d {rem.seconds // 3600}h on {mem['expires_at']} IST")
         else:
             st.info(f"No active membership for {lookup}")
 
 # ---------- ADMIN PANEL & MAIN MENU ----------
 elif st.session_state.role == "admin":
+    perf.mark("Header")
+    st.sidebar.toggle("⏱️ Performance panel", key="perf_panel")
     st.title("👑 ExoticBill Admin")
     st.metric("💵 Total Revenue", f"₹{get_total_billing():,.2f}")
+    fresh = report_freshness()
+    with st.sidebar:
+        if fresh["mode"] == "snapshot":
+            st.caption(f"📊 Reports read a snapshot from {fresh['as_of']} IST ({fresh['age_s']:.0f}s old, "
+                       f"refreshed every {fresh['max_staleness_s']:g}s).")
+            if st.button("🔄 Refresh Reports"):
+                refresh_report_snapshot()
+                st.rerun()
+        else:
+            st.caption("📊 Reports read live data (read-only).")
     st.markdown("---")
     st.subheader("🧹 Maintenance")
-    confirm = st.checkbox("I understand this will erase all billing history")
+    confirm = st.checkbox("I understand this will clear all live billing history and loyalty points "
+                          "(both are kept as an archive)")
     if confirm and st.button("⚠️ Reset All Billings"):
-        conn = sqlite3.connect("auto_exotic_billing.db")
-        conn.execute("DELETE FROM bills")
-        conn.commit()
-        conn.close()
-        st.success("All billing records have been reset.")
+        archive = reset_all_billings(actor=st.session_state.username)
+        if archive:
+            st.success(f"All billing records have been reset. The old bills are archived in `{archive}`, "
+                       f"deleted bills in `{companion_archive(archive, 'bills_deleted')}` and the loyalty "
+                       f"ledger in `{companion_archive(archive, 'loyalty_ledger')}`.")
+        else:
+            st.info("There were no bills to reset.")
+
+    archives = get_bill_archives()
+    if archives:
+        with st.expander(f"🗄️ Bill Archives ({len(archives)})"):
+            st.dataframe(pd.DataFrame(archives, columns=["Archive", "Created At", "By", "Bills", "Revenue"]),
+                         use_container_width=True, hide_index=True)
+            drop = st.selectbox("Archive", [a[0] for a in archives], key="archive_drop")
+            if st.checkbox("Permanently delete this archive", key="archive_drop_confirm") and \
+                    st.button("🗑️ Drop Archive"):
+                drop_bill_archive(drop, actor=st.session_state.username)
+                st.rerun()
+
+    with st.expander("💾 Backups"):
+        st.caption(f"Online snapshots in `{backup.backup_dir()}/`, keeping the newest {backup.BACKUP_KEEP}"
+                   + (f", every {backup.BACKUP_INTERVAL_S / 3600:g} h." if backup.BACKUP_INTERVAL_S > 0
+                      else " (scheduler off)."))
+        bk_status = backup.get_status()
+        if bk_status["last_error"]:
+            st.error(f"Last backup failed: {bk_status['last_error']}")
+        elif bk_status["last_ok"]:
+            st.caption(f"Last backup {bk_status['last_file']} at {bk_status['last_ok']} "
+                       f"({bk_status['last_seconds']}s).")
+        bk_compress = st.checkbox("Compress (gzip)", value=backup.BACKUP_COMPRESS, key="bk_compress")
+        if st.button("Back Up Now"):
+            with st.spinner("Backing up…"):
+                name = backup.create_backup(compress=bk_compress)
+            st.success(f"Wrote {name}")
+        snaps = backup.list_backups()
+        if snaps:
+            st.dataframe(pd.DataFrame([(n, f"{b / 1e6:,.1f}", m) for n, b, m in snaps],
+                                      columns=["Snapshot", "Size (MB)", "Modified"]),
+                         use_container_width=True, hide_index=True)
+            snap = st.selectbox("Restore snapshot", [n for n, _, _ in snaps], key="bk_restore")
+            if st.checkbox("Replace ALL current data with this snapshot", key="bk_restore_confirm") and \
+                    st.button("♻️ Restore"):
+                with st.spinner("Restoring…"):
+                    safety = backup.restore_backup(snap, actor=st.session_state.username)
+                st.success(f"Restored {snap}. The data it replaced was saved as {safety}.")
+
+    with st.expander("🛠️ Database Maintenance"):
+        st.caption(f"ANALYZE/optimize, incremental vacuum (≤{maintenance.VACUUM_PAGES_PER_RUN:,} pages per run) and a "
+                   f"WAL checkpoint, nightly between {maintenance.MAINT_WINDOW} h IST when the shop is quiet.")
+        runs = maintenance.get_maintenance_runs()
+        if st.button("Run Maintenance Now"):
+            with st.spinner("Running maintenance…"):
+                maintenance.run_maintenance(actor=st.session_state.username)
+            st.rerun()
+        if runs:
+            mb = 1024 * 1024
+            last = runs[0]
+            if last["after"]["auto_vacuum"] != "incremental":
+                st.warning("This database was created without incremental auto_vacuum, so freed pages are never "
+                           "returned to the OS. Switching needs a one-off full VACUUM (blocks writes while it runs).")
+                if st.checkbox("I understand, run a full VACUUM now", key="maint_vacuum_confirm") and \
+                        st.button("Enable Incremental Vacuum"):
+                    with st.spinner("Vacuuming…"):
+                        maintenance.enable_incremental_vacuum()
+                        maintenance.run_maintenance(actor=st.session_state.username)
+                    st.rerun()
+            c1, c2, c3 = st.columns(3)
+            c1.metric("DB Size", f"{last['after']['bytes'] / mb:,.1f} MB",
+                      f"{(last['after']['bytes'] - last['before']['bytes']) / mb:+,.1f} MB", delta_color="inverse")
+            c2.metric("Free Pages", f"{last['after']['free_bytes'] / mb:,.1f} MB",
+                      f"{(last['after']['free_bytes'] - last['before']['free_bytes']) / mb:+,.1f} MB",
+                      delta_color="inverse")
+            c3.metric("WAL", f"{last['after']['wal_bytes'] / mb:,.1f} MB",
+                      f"{(last['after']['wal_bytes'] - last['before']['wal_bytes']) / mb:+,.1f} MB",
+                      delta_color="inverse")
+            st.caption(f"Last run {last['started_at']} ({last['trigger']}, {last['actor']}).")
+            st.dataframe(pd.DataFrame(last["tasks"]), use_container_width=True, hide_index=True)
+            st.dataframe(pd.DataFrame([{
+                "Started": r["started_at"], "Trigger": r["trigger"],
+                "Size Before (MB)": round(r["before"]["bytes"] / mb, 1),
+                "Size After (MB)": round(r["after"]["bytes"] / mb, 1),
+                "Total ms": round(sum(t["ms"] for t in r["tasks"]), 1),
+                "Errors": sum(not t["ok"] for t in r["tasks"]),
+            } for r in runs]), use_container_width=True, hide_index=True)
+        else:
+            st.info("No maintenance runs yet.")
+
+    with st.expander("🔒 Write Contention"):
+        st.caption("Per-operation write retries and lock waits since the app process started.")
+        contention = get_contention_stats()
+        if contention:
+            df_c = pd.DataFrame(contention)[["op", "calls", "retries", "failed", "avg_wait_ms", "max_wait_ms"]]
+            st.dataframe(df_c.round(1), use_container_width=True)
+        else:
+            st.info("No writes yet.")
+        if st.button("Reset Counters"):
+            reset_contention_stats()
+            st.rerun()
 
     menu = st.sidebar.selectbox(
         "Main Menu",
-        ["Sales", "Live Stats", "Manage Hoods", "Manage Staff", "Tracking", "Bill Logs", "Hood War", "Loyalty", "Shifts", "Audit"],
+        ["Sales", "Live Stats", "Manage Hoods", "Manage Staff", "Tracking", "Bill Logs", "Deleted Bills", "Hood War", "Loyalty", "Customers", "Shifts", "Settlements", "Audit"]
+        + (["Group"] if len(LOCATIONS) > 1 else []),
         index=0
     )
+    if perf.current():
+        perf.current().label = menu
+        perf.mark(menu)
+    show_flash()
 
     # Sales Overview
     if menu == "Sales":
@@ -908,31 +410,49 @@ elif st.session_state.role == "admin":
         st.metric("Total Tax on Commission", f"₹{sum_tax:,.2f}")
         st.metric("Estimated Profit", f"₹{profit:,.2f}")
 
+        st.markdown("---")
+        st.subheader("📈 Revenue Over Time")
+        now = datetime.now(IST)
+        col1, col2, col3 = st.columns(3)
+        grain = col1.selectbox("Bucket", timeseries.GRAINS, index=1, format_func=str.title, key="ts_grain")
+        ts_from = col2.date_input("From", value=(now - timedelta(days=30)).date(), key="ts_from")
+        ts_to = col3.date_input("To", value=now.date(), key="ts_to")
+        col4, col5 = st.columns(2)
+        ts_metric = col4.selectbox("Metric", ["revenue", "bills", "commission"], format_func=str.title, key="ts_metric")
+        splits = {None: "Nothing", "hood": "Hood", "employee_cid": "Employee", "billing_type": "Billing Type"}
+        ts_split = col5.selectbox("Split by", list(splits), format_func=splits.get, key="ts_split")
+        col6, col7, col8 = st.columns(3)
+        ts_hood = col6.selectbox("Hood", ["All"] + [h for h, _ in get_all_hoods()], key="ts_hood")
+        ts_emp = col7.selectbox("Employee", ["All"] + [cid for cid, _ in get_all_employee_cids()], key="ts_emp")
+        ts_type = col8.selectbox("Billing Type", ["All"] + BILL_TYPES + ["MEMBERSHIP"], key="ts_type")
+        rows = timeseries.revenue_series(
+            f"{ts_from:%Y-%m-%d} 00:00:00", f"{ts_to:%Y-%m-%d} 23:59:59", grain,
+            employee_cid=None if ts_emp == "All" else ts_emp, hood=None if ts_hood == "All" else ts_hood,
+            billing_type=None if ts_type == "All" else ts_type, by=ts_split,
+        )
+        if not rows:
+            st.info("Pick a valid date range.")
+        elif ts_split:
+            df = pd.DataFrame(rows, columns=["Bucket", splits[ts_split], "bills", "revenue", "commission"])
+            if df.empty:
+                st.info("No sales in this range.")
+            else:
+                df[splits[ts_split]] = df[splits[ts_split]].fillna("None")
+                st.line_chart(df.assign(Bucket=pd.to_datetime(df["Bucket"])).pivot_table(
+                    index="Bucket", columns=splits[ts_split], values=ts_metric, aggfunc="sum", fill_value=0))
+        else:
+            df = pd.DataFrame(rows, columns=["Bucket", "bills", "revenue", "commission"])
+            st.line_chart(df.assign(Bucket=pd.to_datetime(df["Bucket"])).set_index("Bucket")[[ts_metric]])
+
     # Live Stats
     elif menu == "Live Stats":
         st.header("📈 Live Stats")
         auto = st.toggle("Auto-refresh every 60s", value=False)
         now = datetime.now(IST)
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        last_hour = now - timedelta(hours=1)
-
-        conn = sqlite3.connect("auto_exotic_billing.db")
-        cur = conn.cursor()
-        today_count = cur.execute("SELECT COUNT(*) FROM bills WHERE timestamp>=?",
-                                  (today_start.strftime("%Y-%m-%d %H:%M:%S"),)).fetchone()[0] or 0
-        today_amount = cur.execute("SELECT COALESCE(SUM(total_amount),0) FROM bills WHERE timestamp>=?",
-                                   (today_start.strftime("%Y-%m-%d %H:%M:%S"),)).fetchone()[0] or 0.0
-        hr_count = cur.execute("SELECT COUNT(*) FROM bills WHERE timestamp>=?",
-                               (last_hour.strftime("%Y-%m-%d %H:%M:%S"),)).fetchone()[0] or 0
-        hr_amount = cur.execute("SELECT COALESCE(SUM(total_amount),0) FROM bills WHERE timestamp>=?",
-                                (last_hour.strftime("%Y-%m-%d %H:%M:%S"),)).fetchone()[0] or 0.0
-        top_types = cur.execute("""
-            SELECT billing_type, COUNT(*), COALESCE(SUM(total_amount),0)
-            FROM bills WHERE timestamp>=?
-            GROUP BY billing_type ORDER BY 3 DESC
-        """, (today_start.strftime("%Y-%m-%d %H:%M:%S"),)).fetchall()
-        active_shifts = cur.execute("SELECT employee_cid, start_ts FROM shifts WHERE end_ts IS NULL").fetchall()
-        conn.close()
+        live = get_live_stats(now)
+        today_count, today_amount = live["today_count"], live["today_amount"]
+        hr_count, hr_amount = live["hr_count"], live["hr_amount"]
+        top_types, active_shifts = live["top_types"], live["active_shifts"]
 
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -955,9 +475,20 @@ elif st.session_state.role == "admin":
         else:
             st.info("No bills yet today.")
 
+        st.subheader("Revenue by Hour (Last 24h)")
+        hourly = pd.DataFrame(
+            timeseries.revenue_series((now - timedelta(hours=23)).strftime("%Y-%m-%d %H:%M:%S"),
+                                      now.strftime("%Y-%m-%d %H:%M:%S"), "hour", by="billing_type"),
+            columns=["Hour", "Type", "Bills", "Revenue", "Commission"])
+        if hourly.empty:
+            st.info("No bills in the last 24 hours.")
+        else:
+            st.bar_chart(hourly.assign(Hour=pd.to_datetime(hourly["Hour"])).pivot_table(
+                index="Hour", columns="Type", values="Revenue", aggfunc="sum", fill_value=0))
+
         if active_shifts:
             st.subheader("Active Shifts")
-            st.table(pd.DataFrame(active_shifts, columns=["Employee CID", "Start Time"]))
+            st.table(pd.DataFrame(active_shifts, columns=["Employee CID", "Start Time", "Bills", "Revenue"]))
         if auto:
             time.sleep(60)
             st.rerun()
@@ -965,18 +496,20 @@ elif st.session_state.role == "admin":
     # Manage Hoods
     elif menu == "Manage Hoods":
         st.header("🏙️ Manage Hoods")
-        tabs = st.tabs(["Add Hood", "Edit Hood", "Assign Staff", "View Hoods"])
+        section = section_picker("hoods_section", ["Add Hood", "Edit Hood", "Assign Staff", "View Hoods"])
 
-        with tabs[0]:
+        if section == "Add Hood":
             st.subheader("➕ Add New Hood")
             with st.form("add_hood", clear_on_submit=True):
                 hname = st.text_input("Hood Name")
                 hloc = st.text_input("Location")
                 if st.form_submit_button("Add Hood") and hname and hloc:
-                    add_hood(hname, hloc)
-                    st.success(f"Added hood '{hname}'")
+                    if add_hood(hname, hloc):
+                        st.success(f"Added hood '{hname}'")
+                    else:
+                        st.warning("That hood already exists.")
 
-        with tabs[1]:
+        elif section == "Edit Hood":
             st.subheader("✏️ Edit / Delete Hood")
             hds = get_all_hoods()
             if hds:
@@ -986,7 +519,7 @@ elif st.session_state.role == "admin":
                 new_name = st.text_input("New Name", sel, key="edit_hood_name")
                 new_loc = st.text_input("New Location", old_loc, key="edit_hood_loc")
                 if st.button("Update Hood"):
-                    update_hood(sel, new_name, new_loc)
+                    update_hood(sel, new_name, new_loc, actor=st.session_state.username)
                     st.success("Hood updated.")
                 if st.button("Delete Hood"):
                     delete_hood(sel)
@@ -994,7 +527,7 @@ elif st.session_state.role == "admin":
             else:
                 st.info("No hoods defined yet.")
 
-        with tabs[2]:
+        elif section == "Assign Staff":
             st.subheader("👷 Assign Employees to Hood")
             hds = get_all_hoods()
             if hds:
@@ -1009,7 +542,7 @@ elif st.session_state.role == "admin":
             else:
                 st.info("Define some hoods first.")
 
-        with tabs[3]:
+        elif section == "View Hoods":
             st.subheader("🔍 View Hoods & Members")
             hds = get_all_hoods()
             if hds:
@@ -1026,9 +559,10 @@ elif st.session_state.role == "admin":
     # Manage Staff
     elif menu == "Manage Staff":
         st.header("👷 Manage Staff")
-        tabs = st.tabs(["➕ Add Employee", "🗑️ Remove Employee", "✏️ Edit Employee", "📋 View All Employees"])
+        section = section_picker("staff_section", ["➕ Add Employee", "🗑️ Remove Employee", "✏️ Edit Employee",
+                                                   "📋 View All Employees"])
 
-        with tabs[0]:
+        if section == "➕ Add Employee":
             st.subheader("➕ Add New Employee")
             with st.form("add_emp", clear_on_submit=True):
                 new_cid = st.text_input("Employee CID")
@@ -1038,14 +572,16 @@ elif st.session_state.role == "admin":
                 new_hood = st.selectbox("Hood", ["No Hood"] + hds)
                 if st.form_submit_button("Add Employee"):
                     if new_cid and new_name:
-                        add_employee(new_cid, new_name, new_rank)
-                        if new_hood != "No Hood":
-                            update_employee(new_cid, hood=new_hood)
-                        st.success(f"Added {new_name} ({new_cid})")
+                        if not add_employee(new_cid, new_name, new_rank):
+                            st.warning("Employee CID already exists.")
+                        else:
+                            if new_hood != "No Hood":
+                                update_employee(new_cid, hood=new_hood, actor=st.session_state.get("username", "?"))
+                            st.success(f"Added {new_name} ({new_cid})")
                     else:
                         st.warning("CID and Name required.")
 
-        with tabs[1]:
+        elif section == "🗑️ Remove Employee":
             st.subheader("🗑️ Remove Employee")
             all_emp = get_all_employee_cids()
             if all_emp:
@@ -1057,7 +593,7 @@ elif st.session_state.role == "admin":
             else:
                 st.info("No employees to remove.")
 
-        with tabs[2]:
+        elif section == "✏️ Edit Employee":
             st.subheader("✏️ Edit Employee")
             all_emp = get_all_employee_cids()
             if not all_emp:
@@ -1094,22 +630,15 @@ elif st.session_state.role == "admin":
                             hood = st.selectbox("Hood", hood_options, index=hood_index)
                             submitted = st.form_submit_button("Update Employee")
                             if submitted:
-                                update_employee(emp_cid, name=name, rank=rank, hood=hood)
+                                update_employee(emp_cid, name=name, rank=rank, hood=hood,
+                                                actor=st.session_state.get("username", "?"))
                                 st.success(f"Updated {sel_emp}")
                                 st.rerun()
 
-        with tabs[3]:
+        elif section == "📋 View All Employees":
             st.subheader("📋 All Employees List")
-            all_rows = []
-            for cid, name in get_all_employee_cids():
-                details = get_employee_details(cid)
-                if details:
-                    all_rows.append({
-                        "CID": cid,
-                        "Name": name,
-                        "Rank": details["rank"],
-                        "Hood": details["hood"]
-                    })
+            all_rows = [{"CID": cid, "Name": name, "Rank": rank, "Hood": hood}
+                        for cid, (name, rank, hood) in get_employee_directory().items()]
             if all_rows:
                 df = pd.DataFrame(all_rows)
                 st.dataframe(df)
@@ -1119,19 +648,18 @@ elif st.session_state.role == "admin":
     # Tracking
     elif menu == "Tracking":
         st.header("📊 Tracking")
-        tabs = st.tabs([
+        section = section_picker("tracking_section", [
             "Employee", "Customer", "Hood", "Membership",
             "Employee Rankings", "Custom Filter"
         ])
 
         # Employee tab
-        with tabs[0]:
+        if section == "Employee":
             st.subheader("Employee Billing")
             ranks = ["All"] + list(COMMISSION_RATES.keys())
             sel_rank = st.selectbox("Filter by Rank", ranks)
-            all_emps = get_all_employee_cids()
-            if sel_rank != "All":
-                all_emps = [(cid, name) for cid, name in all_emps if get_employee_rank(cid) == sel_rank]
+            all_emps = [(cid, name) for cid, (name, rank, _) in get_employee_directory().items()
+                        if sel_rank == "All" or rank == sel_rank]
             emp_keys = [f"{n} ({c})" for c, n in all_emps]
             if not emp_keys:
                 st.info("No employees match that rank.")
@@ -1145,141 +673,138 @@ elif st.session_state.role == "admin":
                         st.metric(k, f"₹{v:.2f}")
                     st.metric("Total", f"₹{total:.2f}")
                 else:
-                    bills = get_employee_bills(cid)
+                    st.subheader("📋 Bill Entries")
+                    BILL_PAGE = 50
+                    now = datetime.now(IST)
+                    f1, f2, f3 = st.columns(3)
+                    eb_from = f1.date_input("From", value=(now - timedelta(days=30)).date(), key="eb_from")
+                    eb_to = f2.date_input("To", value=now.date(), key="eb_to")
+                    eb_type = f3.selectbox("Type", ["All"] + BILL_TYPES + ["MEMBERSHIP"], key="eb_type")
+                    # keyset cursors of the pages seen so far; reset when the employee or a filter changes
+                    eb_key = (cid, str(eb_from), str(eb_to), eb_type)
+                    if st.session_state.get("eb_key") != eb_key:
+                        st.session_state.eb_key = eb_key
+                        st.session_state.eb_cursors = [None]
+                    cursors = st.session_state.eb_cursors
+                    bills, next_cursor = get_employee_bills_page(
+                        cid, f"{eb_from} 00:00:00", f"{eb_to} 23:59:59", None if eb_type == "All" else eb_type,
+                        after=cursors[-1], limit=BILL_PAGE)
                     if bills:
-                        st.subheader("📋 Bill Entries")
-                        for bill in bills:
-                            bill_id, cust, btype, details, amt, ts, comm, tax = bill
-                            col1, col2 = st.columns([9, 1])
-                            with col1:
-                                st.markdown(
-                                    f"**ID:** `{bill_id}` | **Customer:** `{cust}` | **Type:** `{btype}`  \n"
-                                    f"**Details:** {details}  \n"
-                                    f"**Amount:** ₹{amt:.2f} | **Commission:** ₹{comm:.2f} | **Tax:** ₹{tax:.2f}  \n"
-                                    f"🕒 {ts}"
-                                )
-                            with col2:
-                                if st.button("🗑️", key=f"del_{bill_id}"):
-                                    ok = soft_delete_bill(bill_id, st.session_state.get("username", "?"))
-                                    if ok:
-                                        st.success(f"Deleted bill ID {bill_id} (soft delete)")
-                                        st.rerun()
-                                    else:
-                                        st.warning("Bill not found.")
+                        df_eb = pd.DataFrame(bills, columns=["ID", "Employee", "Customer", "Type", "Details", "Amount",
+                                                             "Time", "Commission", "Tax", "Hood", "Settlement"])
+                        df_eb = df_eb.drop(columns=["Employee"])
+                        event = st.dataframe(df_eb, use_container_width=True, hide_index=True, on_select="rerun",
+                                             selection_mode="multi-row", key=f"eb_table_{len(cursors)}")
+                        p1, p2, p3 = st.columns([1, 2, 1])
+                        if p1.button("◀ Newer", key="eb_prev", disabled=len(cursors) == 1):
+                            cursors.pop()
+                            st.rerun()
+                        p2.caption(f"Page {len(cursors)} · {BILL_PAGE} per page")
+                        if p3.button("Older ▶", key="eb_next", disabled=next_cursor is None):
+                            cursors.append(next_cursor)
+                            st.rerun()
+                        picked = df_eb.iloc[event.selection.rows]["ID"].tolist()
+                        if picked and st.button(f"🗑️ Delete {len(picked)} selected bill(s)", key="eb_delete"):
+                            n = soft_delete_bills(picked, st.session_state.get("username", "?"))
+                            flash(f"Deleted {n} bill(s) (soft delete).")
+                            st.rerun()
                     else:
-                        st.info("No bills found for this employee.")
+                        st.info("No bills found for this employee in that range.")
 
         # Customer tab
-        with tabs[1]:
+        elif section == "Customer":
             st.subheader("Customer Billing History")
-            customers = get_all_customers()
+            CUST_PAGE = 25
+            cust_prefix = st.text_input("Customer CID starts with", key="cust_prefix").strip()
+            if st.session_state.get("cust_prefix_seen") != cust_prefix:
+                st.session_state.cust_prefix_seen = cust_prefix
+                st.session_state.cust_page = 0
+            page = st.session_state.get("cust_page", 0)
+            customers, has_more = search_customers(cust_prefix, limit=CUST_PAGE, offset=page * CUST_PAGE)
             if customers:
-                cust = st.selectbox("Select Customer", customers)
+                st.dataframe(pd.DataFrame(customers, columns=["Customer CID", "First Seen", "Last Seen",
+                                                              "Bills", "Lifetime Spend"]),
+                             use_container_width=True, hide_index=True)
+                c_prev, c_page, c_next = st.columns([1, 2, 1])
+                if c_prev.button("◀ Prev", key="cust_prev", disabled=page == 0):
+                    st.session_state.cust_page = page - 1
+                    st.rerun()
+                c_page.caption(f"Page {page + 1}")
+                if c_next.button("Next ▶", key="cust_next", disabled=not has_more):
+                    st.session_state.cust_page = page + 1
+                    st.rerun()
+                cust = st.selectbox("Select Customer", [r[0] for r in customers])
                 df = pd.DataFrame(get_customer_bills(cust),
                                   columns=["Employee", "Type", "Details", "Amount", "Time", "Commission", "Tax"])
                 st.dataframe(df)
+            elif cust_prefix or page:
+                st.info("No customers match.")
             else:
                 st.info("No customer billing data yet.")
 
         # Hood tab
-        with tabs[2]:
+        elif section == "Hood":
             st.subheader("Hood Summary")
             hood_names = [h[0] for h in get_all_hoods()]
             if hood_names:
                 sel_hood = st.selectbox("Select Hood", hood_names)
-                rows = []
-                for cid, name in get_employees_by_hood(sel_hood):
-                    _, tot = get_billing_summary_by_cid(cid)
-                    rows.append({"CID": cid, "Name": name, "Total": tot})
-                st.table(pd.DataFrame(rows))
+                st.table(pd.DataFrame(cached_hood_summary(current_db_path(), get_bills_stamp(),
+                                                          tuple(get_employees_by_hood(sel_hood)))))
             else:
                 st.info("No hoods found.")
 
         # Membership tab
-        with tabs[3]:
+        elif section == "Membership":
             st.subheader("📋 Memberships")
             view = st.radio("Show", ["Active", "Past"], horizontal=True)
             if view == "Active":
                 rows = get_all_memberships()
-                data = []
-                for cid, tier, dop_str in rows:
-                    dop = datetime.strptime(dop_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=IST)
-                    expiry = dop + timedelta(days=7)
-                    rem = expiry - datetime.now(IST)
-                    data.append({
-                        "Customer CID": cid,
-                        "Tier": tier,
-                        "Started On": dop.strftime("%Y-%m-%d %H:%M:%S"),
-                        "Expires On": expiry.strftime("%Y-%m-%d %H:%M:%S"),
-                        "Remaining": f"{rem.days}d {rem.seconds // 3600}h"
-                    })
-                st.table(pd.DataFrame(data))
+                st.metric("Expiring in the next 24h", len(get_expiring_memberships(24)))
+                df_mem = pd.DataFrame(rows, columns=["Customer CID", "Tier", "Started On", "Expires On"])
+                rem = (pd.to_datetime(df_mem["Expires On"], format="%Y-%m-%d %H:%M:%S")
+                       - pd.Timestamp(datetime.now(IST).replace(tzinfo=None)))
+                df_mem["Remaining"] = (rem.dt.days.astype(str) + "d "
+                                       + (rem.dt.seconds // 3600).astype(str) + "h")
+                st.dataframe(df_mem, use_container_width=True, hide_index=True)
 
                 st.markdown("---")
                 st.subheader("🗑️ Delete a Membership")
-                mem_options = {f"{cid} ({tier})": cid for cid, tier, _ in rows}
+                mem_options = {f"{cid} ({tier})": cid for cid, tier, _, _ in rows}
                 if mem_options:
                     sel_mem = st.selectbox("Select membership to delete", list(mem_options.keys()))
                     if st.button("Delete Selected Membership"):
                         cid_to_delete = mem_options[sel_mem]
-                        conn = sqlite3.connect("auto_exotic_billing.db")
-                        conn.execute("DELETE FROM memberships WHERE customer_cid = ?", (cid_to_delete,))
-                        conn.commit()
-                        conn.close()
+                        delete_membership(cid_to_delete)
                         st.success(f"Deleted membership for {cid_to_delete}.")
                         st.rerun()
                 else:
                     st.info("No active memberships found.")
             else:
-                rows = get_past_memberships()
-                data = []
-                for cid, tier, dop_str, expired_str in rows:
-                    data.append({
-                        "Customer CID": cid,
-                        "Tier": tier,
-                        "Started On": dop_str,
-                        "Expired At": expired_str
-                    })
-                st.table(pd.DataFrame(data))
+                st.dataframe(pd.DataFrame(get_past_memberships(),
+                                          columns=["Customer CID", "Tier", "Started On", "Expired At"]),
+                             use_container_width=True, hide_index=True)
 
         # Employee Rankings tab
-        with tabs[4]:
+        elif section == "Employee Rankings":
             st.subheader("🏆 Employee Rankings")
             metric = st.selectbox("Select ranking metric",
                                   ["Total Sales", "ITEMS", "UPGRADES", "REPAIR", "CUSTOMIZATION", "MEMBERSHIP"])
-            ranking = []
-            conn = sqlite3.connect("auto_exotic_billing.db")
-            for cid, name in get_all_employee_cids():
-                if metric == "Total Sales":
-                    q = "SELECT SUM(total_amount) FROM bills WHERE employee_cid=?"
-                    params = (cid,)
-                else:
-                    q = ("SELECT SUM(total_amount) FROM bills "
-                         "WHERE employee_cid=? AND billing_type=?")
-                    params = (cid, metric)
-                val = conn.execute(q, params).fetchone()[0] or 0.0
-                ranking.append({"Employee": f"{name} ({cid})", metric: val})
-            conn.close()
+            ranking = cached_rankings(current_db_path(), get_bills_stamp(), tuple(get_all_employee_cids()), metric)
             df_rank = pd.DataFrame(ranking).sort_values(by=metric, ascending=False)
             st.table(df_rank.head(100))
 
         # Custom Filter tab
-        with tabs[5]:
+        elif section == "Custom Filter":
             st.subheader("🔍 Custom Sales Filter")
             days = st.number_input("Last X days", min_value=1, max_value=30, value=7)
             min_sales = st.number_input("Min sales amount (₹)", min_value=0.0, value=0.0)
             if st.button("Apply Filter"):
                 cutoff = datetime.now(IST) - timedelta(days=days)
                 results = []
-                conn = sqlite3.connect("auto_exotic_billing.db")
-                for cid, name in get_all_employee_cids():
-                    q = ("SELECT SUM(total_amount) FROM bills "
-                         "WHERE employee_cid=? AND timestamp>=?")
-                    total = conn.execute(q, (cid, cutoff.strftime("%Y-%m-%d %H:%M:%S"))).fetchone()[0] or 0.0
+                for emp_label, total in get_employee_sales_since(cutoff.strftime("%Y-%m-%d %H:%M:%S")):
                     if total >= min_sales:
-                        results.append({"Employee": f"{name} ({cid})",
+                        results.append({"Employee": emp_label,
                                         f"Sales in last {days}d": total})
-                conn.close()
                 if results:
                     st.table(pd.DataFrame(results))
                 else:
@@ -1380,6 +905,39 @@ elif st.session_state.role == "admin":
             key="bill_logs_dl"
         )
 
+    # Deleted Bills (restore)
+    elif menu == "Deleted Bills":
+        st.header("♻️ Deleted Bills")
+        now = datetime.now(IST)
+        d1, d2, d3 = st.columns(3)
+        del_id = d1.number_input("Bill ID", min_value=0, step=1, key="del_id")
+        del_emp = d2.text_input("Employee CID", key="del_emp").strip()
+        del_by = d3.text_input("Deleted By", key="del_by").strip()
+        d4, d5 = st.columns(2)
+        del_from = d4.date_input("Deleted From", value=(now - timedelta(days=30)).date(), key="del_from")
+        del_to = d5.date_input("Deleted To", value=now.date(), key="del_to")
+        rows = get_deleted_bills(int(del_id) or None, del_emp or None, del_by or None,
+                                 f"{del_from} 00:00:00", f"{del_to} 23:59:59", limit=500)
+        if rows:
+            df_del = pd.DataFrame(rows, columns=["ID", "Employee", "Customer", "Type", "Details", "Amount", "Time",
+                                                 "Commission", "Tax", "Hood", "Settlement", "Deleted By",
+                                                 "Deleted At"])
+            event = st.dataframe(df_del, use_container_width=True, hide_index=True, on_select="rerun",
+                                 selection_mode="multi-row", key="del_table")
+            if len(rows) == 500:
+                st.caption("Showing the 500 most recent deletions; narrow the filters to see older ones.")
+            picked = df_del.iloc[event.selection.rows]["ID"].tolist()
+            if picked and st.button(f"♻️ Restore {len(picked)} selected bill(s)", key="del_restore"):
+                try:
+                    n = restore_bills(picked, st.session_state.username)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    flash(f"Restored {n} bill(s) under their original IDs.")
+                    st.rerun()
+        else:
+            st.info("No deleted bills match.")
+
     # Hood War
     elif menu == "Hood War":
         st.header("⚔️ Hood War — Revenue Leaderboard")
@@ -1394,16 +952,7 @@ elif st.session_state.role == "admin":
         start_str = datetime(sd.year, sd.month, sd.day, 0, 0, 0, tzinfo=IST).strftime("%Y-%m-%d %H:%M:%S")
         end_str = datetime(ed.year, ed.month, ed.day, 23, 59, 59, tzinfo=IST).strftime("%Y-%m-%d %H:%M:%S")
 
-        conn = sqlite3.connect("auto_exotic_billing.db")
-        rows = conn.execute("""
-          SELECT e.hood, COALESCE(SUM(b.total_amount),0) AS revenue
-          FROM employees e
-          LEFT JOIN bills b ON b.employee_cid = e.cid
-            AND b.timestamp >= ? AND b.timestamp <= ?
-          GROUP BY e.hood
-          ORDER BY revenue DESC
-        """, (start_str, end_str)).fetchall()
-        conn.close()
+        rows = get_hood_war(start_str, end_str)
         df = pd.DataFrame(rows, columns=["Hood", "Revenue"]).sort_values("Revenue", ascending=False)
         st.table(df)
 
@@ -1412,9 +961,7 @@ elif st.session_state.role == "admin":
         st.header("🎯 Customer Loyalty")
         st.caption(f"Earning rate: 1 point per ₹{LOYALTY_EARN_PER_RS} on non-membership bills")
 
-        conn = sqlite3.connect("auto_exotic_billing.db")
-        top = conn.execute("SELECT customer_cid, points FROM loyalty ORDER BY points DESC LIMIT 100").fetchall()
-        conn.close()
+        top = get_top_loyalty(100)
         if top:
             st.subheader("Top Customers")
             st.table(pd.DataFrame(top, columns=["Customer CID", "Points"]))
@@ -1426,23 +973,66 @@ elif st.session_state.role == "admin":
         with st.form("loyalty_adjust", clear_on_submit=True):
             cust = st.text_input("Customer CID")
             delta = st.number_input("Add/Subtract Points (e.g., 50 or -20)", value=0, step=1)
+            note = st.text_input("Reason")
             submitted = st.form_submit_button("Apply")
             if submitted:
                 if not cust or delta == 0:
                     st.warning("Enter CID and non-zero delta.")
                 else:
-                    add_loyalty_points(cust, int(delta))
-                    st.success("Points updated.")
+                    applied = add_loyalty_points(cust, int(delta), actor=st.session_state.username, note=note or None)
+                    st.success(f"Points updated ({applied:+d}).")
 
         st.markdown("---")
         st.subheader("Lookup Customer Points")
         lookup = st.text_input("Customer CID", key="loy_lookup")
         if st.button("Check Points"):
-            conn = sqlite3.connect("auto_exotic_billing.db")
-            row = conn.execute("SELECT points FROM loyalty WHERE customer_cid=?", (lookup,)).fetchone()
-            conn.close()
-            pts = row[0] if row else 0
+            pts = get_loyalty_points(lookup)
             st.info(f"{lookup} has **{pts}** loyalty points.")
+            booked = get_ledger_balance(lookup)
+            if booked != pts:
+                st.warning(f"Ledger says {booked} points; use Reconcile Balances below.")
+            ledger = get_loyalty_ledger(lookup)
+            if ledger:
+                st.dataframe(pd.DataFrame(ledger, columns=["Entry", "Time", "Kind", "Points", "Bill ID", "By", "Note"]),
+                             use_container_width=True, hide_index=True)
+
+        st.markdown("---")
+        st.caption("Balances are materialized from the loyalty ledger; this rebuilds them from snapshots plus "
+                   "later entries.")
+        if st.button("Reconcile Balances"):
+            st.success(f"{reconcile_loyalty()} balance(s) corrected.")
+
+    # Customers (RFM segments)
+    elif menu == "Customers":
+        st.header("🧭 Customer Segments")
+        summary = get_segment_summary()
+        if not summary:
+            st.info("No customers yet.")
+        else:
+            st.dataframe(pd.DataFrame(summary, columns=["Segment", "Customers", "Lifetime Spend", "LTV"]).round(2),
+                         use_container_width=True, hide_index=True)
+            st.caption(f"Scores and segments are refreshed nightly with database maintenance; "
+                       f"LTV projects {segments.LTV_HORIZON_DAYS} days ahead.")
+            if st.button("Recompute Segments Now"):
+                with st.spinner("Scoring customers…"):
+                    n = segments.refresh_segments()
+                st.success(f"Scored {n:,} customers.")
+                st.rerun()
+
+            c1, c2, c3, c4 = st.columns(4)
+            seg_f = c1.selectbox("Segment", ["All"] + segments.SEGMENTS, key="seg_filter")
+            tier_f = c2.selectbox("Membership", ["All", "None"] + list(MEMBERSHIP_DISCOUNTS), key="seg_tier")
+            pts_f = c3.number_input("Min Loyalty Points", min_value=0, value=0, step=50, key="seg_points")
+            sort_f = c4.selectbox("Sort By", ["ltv", "spend", "bills", "last_seen", "points"], key="seg_sort")
+            rows = find_customers(None if seg_f == "All" else seg_f, None if tier_f == "All" else tier_f,
+                                  int(pts_f), sort_f, limit=500)
+            df_seg = pd.DataFrame(rows, columns=["Customer CID", "Segment", "R", "F", "M", "Bills",
+                                                 "Lifetime Spend", "LTV", "Last Seen", "Membership", "Points"])
+            st.dataframe(df_seg.round(2), use_container_width=True, hide_index=True)
+            if len(rows) == 500:
+                st.caption("Showing the top 500; narrow the filters to see others.")
+            if rows:
+                st.download_button("Download CSV", df_seg.to_csv(index=False), "customers.csv", "text/csv")
 
     # Shifts
         # Shifts
@@ -1450,11 +1040,10 @@ elif st.session_state.role == "admin":
     elif menu == "Shifts":
         st.header("⏱️ Shifts")
 
-        # tabs: by-employee vs live
-        tab_emp, tab_live = st.tabs(["By Employee", "Live Shifts"])
+        section = section_picker("shifts_section", ["By Employee", "Live Shifts", "Coverage"])
 
         # ---------- BY EMPLOYEE ----------
-        with tab_emp:
+        if section == "By Employee":
             # employee selector (name + CID)
             all_emp = get_all_employee_cids()  # [(cid, name), ...]
             if not all_emp:
@@ -1477,24 +1066,7 @@ elif st.session_state.role == "admin":
                 end_str = datetime(ed.year, ed.month, ed.day, 23, 59, 59, tzinfo=IST).strftime("%Y-%m-%d %H:%M:%S")
 
                 # query only that employee's shifts, sorted (latest first)
-                conn = sqlite3.connect("auto_exotic_billing.db")
-                rows = conn.execute(
-                    """
-                    SELECT s.id,
-                           s.employee_cid,
-                           COALESCE(e.name, 'Unknown') AS employee_name,
-                           s.start_ts, s.end_ts,
-                           s.duration_minutes, s.bills_count, s.revenue
-                    FROM shifts s
-                    LEFT JOIN employees e ON e.cid = s.employee_cid
-                    WHERE s.employee_cid = ?
-                      AND s.start_ts >= ?
-                      AND s.start_ts <= ?
-                    ORDER BY COALESCE(s.end_ts, s.start_ts) DESC
-                    """,
-                    (sel_cid, start_str, end_str)
-                ).fetchall()
-                conn.close()
+                rows = get_employee_shifts(sel_cid, start_str, end_str)
 
                 df = pd.DataFrame(
                     rows,
@@ -1519,28 +1091,18 @@ elif st.session_state.role == "admin":
                 st.dataframe(df, use_container_width=True)
 
         # ---------- LIVE SHIFTS ----------
-        with tab_live:
+        elif section == "Live Shifts":
             st.subheader("Active (Live) Shifts")
             auto = st.toggle("Auto-refresh every 60s", value=False, key="shifts_live_auto")
 
             # show all active shifts with names and elapsed time
-            conn = sqlite3.connect("auto_exotic_billing.db")
-            live = conn.execute(
-                """
-                SELECT s.employee_cid, COALESCE(e.name, 'Unknown') AS employee_name, s.start_ts
-                FROM shifts s
-                LEFT JOIN employees e ON e.cid = s.employee_cid
-                WHERE s.end_ts IS NULL
-                ORDER BY s.start_ts ASC
-                """
-            ).fetchall()
-            conn.close()
+            live = get_live_shifts()
 
             if live:
                 # compute elapsed per shift
                 data = []
                 now_ist = datetime.now(IST)
-                for cid, name, start_ts in live:
+                for cid, name, start_ts, bcount, revenue in live:
                     try:
                         dt_start = datetime.strptime(start_ts, "%Y-%m-%d %H:%M:%S").replace(tzinfo=IST)
                     except Exception:
@@ -1550,7 +1112,9 @@ elif st.session_state.role == "admin":
                         "Employee Name": name,
                         "Employee CID": cid,
                         "Start Time": start_ts,
-                        "Elapsed (min)": elapsed_min
+                        "Elapsed (min)": elapsed_min,
+                        "Bills": bcount,
+                        "Revenue": revenue
                     })
                 st.table(pd.DataFrame(data).sort_values("Elapsed (min)", ascending=False))
             else:
@@ -1561,17 +1125,194 @@ elif st.session_state.role == "admin":
                 time.sleep(60)
                 st.rerun()
 
+        # ---------- COVERAGE ----------
+        elif section == "Coverage":
+            st.subheader("Staff Coverage & Overlap")
+            now = datetime.now(IST)
+            colA, colB = st.columns(2)
+            with colA:
+                sd = st.date_input("From", value=(now - timedelta(days=28)).date(), key="shift_cov_sd")
+            with colB:
+                ed = st.date_input("To", value=now.date(), key="shift_cov_ed")
+            start_str = datetime(sd.year, sd.month, sd.day, 0, 0, 0, tzinfo=IST).strftime("%Y-%m-%d %H:%M:%S")
+            end_str = datetime(ed.year, ed.month, ed.day, 23, 59, 59, tzinfo=IST).strftime("%Y-%m-%d %H:%M:%S")
+
+            cov = get_shift_analytics(start_str, end_str)
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Shifts", f"{cov['shifts']:,}")
+            col2.metric("Staffed Hours", f"{cov['staff_hours']:,.1f}")
+            col3.metric("Peak Concurrent", f"{cov['peak_concurrent']}")
+            col4.metric("Revenue / Staffed Hour", f"₹{cov['rev_per_staff_hour']:,.2f}")
+
+            metric_view = st.radio(
+                "Heatmap", ["Average staff on duty", "Peak concurrent shifts", "Revenue per staffed hour"],
+                horizontal=True, key="shift_cov_view"
+            )
+            grid = {
+                "Average staff on duty": cov["avg_staff"],
+                "Peak concurrent shifts": cov["peak"],
+                "Revenue per staffed hour": cov["rev_per_staff_hour_grid"],
+            }[metric_view]
+            st.caption("Rows: day of week · Columns: hour of day (IST)")
+            st.dataframe(grid.round(2), use_container_width=True)
+
+            st.subheader("By Hour of Day")
+            st.bar_chart(cov["by_hour"][["staff_hours"]])
+            st.dataframe(
+                cov["by_hour"].rename(columns={
+                    "staff_hours": "Staffed Hours", "peak": "Peak Concurrent",
+                    "revenue": "Revenue", "rev_per_staff_hour": "Revenue / Staffed Hour"
+                }).round(2),
+                use_container_width=True
+            )
+
+    # Settlements
+    elif menu == "Settlements":
+        st.header("💼 Payroll Settlements")
+
+        st.subheader("Close a Period")
+        now = datetime.now(IST)
+        cd = st.date_input("Settle all unsettled bills up to (inclusive)", value=now.date(), key="set_end")
+        end_str = datetime(cd.year, cd.month, cd.day, 23, 59, 59, tzinfo=IST).strftime("%Y-%m-%d %H:%M:%S")
+        n, gross, net, first = get_unsettled_summary(end_str)
+        if n:
+            st.info(f"{n:,} unsettled bills since {first}: gross ₹{gross:,.2f}, net payout ₹{net:,.2f}")
+            if st.checkbox("Bills in a closed period are locked to it", key="set_confirm") and \
+                    st.button("✅ Close Settlement"):
+                pid = close_settlement(end_str, actor=st.session_state.username)
+                st.success(f"Settlement #{pid} closed.")
+                st.rerun()
+        else:
+            st.info("Nothing to settle up to that date.")
+
+        st.markdown("---")
+        st.subheader("History")
+        periods = get_settlement_periods()
+        if not periods:
+            st.info("No settlements closed yet.")
+        else:
+            dfp = pd.DataFrame(periods, columns=[
+                "ID", "From", "To", "Closed At", "Closed By", "Bills", "Gross", "Commission", "Tax", "Net Payout",
+                "Adjustments", "Adjustment Net"])
+            st.dataframe(dfp, use_container_width=True)
+
+            pid = st.selectbox("Period", [p[0] for p in periods],
+                               format_func=lambda i: f"#{i}", key="set_period")
+            rows = get_settlement(pid)
+            dfs = pd.DataFrame(rows, columns=[
+                "Employee CID", "Name", "Bills", "Gross", "Commission", "Tax", "Net Payout",
+                "Adjustments", "Net After Adjustments"])
+            st.dataframe(dfs, use_container_width=True)
+            st.download_button("⬇️ Download CSV", dfs.to_csv(index=False), file_name=f"settlement_{pid}.csv",
+                               mime="text/csv")
+            adj = get_settlement_adjustments(pid)
+            if adj:
+                st.caption("Adjustments recorded after the period closed")
+                st.dataframe(pd.DataFrame(adj, columns=[
+                    "ID", "Employee CID", "Bill ID", "Reason", "Gross", "Commission", "Tax", "Net Payout",
+                    "Created At", "Actor"]), use_container_width=True)
+
+        st.markdown("---")
+        st.subheader("Re-rate Commission")
+        st.caption("Recompute commission/tax on unsettled bills with each employee's current rank. "
+                   "Preview first; applying writes one audit entry.")
+        colA, colB = st.columns(2)
+        with colA:
+            rsd = st.date_input("From", value=(now - timedelta(days=30)).date(), key="rr_sd")
+        with colB:
+            red = st.date_input("To", value=now.date(), key="rr_ed")
+        emps = get_all_employee_cids()
+        rr_emps = st.multiselect("Employees (empty = all)", [c for c, _ in emps],
+                                 format_func=lambda c: f"{dict(emps).get(c, '')} ({c})", key="rr_emps")
+        rates_df = st.data_editor(
+            pd.DataFrame({"Rank": list(COMMISSION_RATES), "Rate": list(COMMISSION_RATES.values())}),
+            disabled=["Rank"], hide_index=True, key="rr_rates",
+            column_config={"Rate": st.column_config.NumberColumn(min_value=0.0, max_value=1.0, required=True)})
+        rr_tax = st.number_input("Tax rate (on commission)", value=float(TAX_RATE), min_value=0.0, max_value=1.0,
+                                 step=0.01, key="rr_tax")
+        rr_args = dict(
+            start_str=datetime(rsd.year, rsd.month, rsd.day, 0, 0, 0).strftime("%Y-%m-%d %H:%M:%S"),
+            end_str=datetime(red.year, red.month, red.day, 23, 59, 59).strftime("%Y-%m-%d %H:%M:%S"),
+            employee_cids=rr_emps, rates=dict(zip(rates_df["Rank"], rates_df["Rate"])), tax_rate=rr_tax,
+        )
+        try:
+            rr_args["rates"], rr_args["tax_rate"] = check_rates(rr_args["rates"], rr_args["tax_rate"])
+            rr_ok = True
+        except ValueError as e:
+            st.error(f"{e}.")
+            rr_ok = False
+        # applying is only offered for exactly the settings last previewed
+        rr_sig = repr(sorted((k, repr(v)) for k, v in rr_args.items()))
+        preview = st.button("🔍 Preview", disabled=not rr_ok)
+        if preview:
+            rep = rerate_bills(**rr_args, dry_run=True, actor=st.session_state.username)
+            st.session_state["rr_preview"] = (rr_sig, rep["changed"], time.time())
+        previewed = st.session_state.get("rr_preview")
+        apply = False
+        if rr_ok and previewed and previewed[0] == rr_sig:
+            confirm = st.checkbox(f"Rewrite commission and tax on the {previewed[1]:,} bills in the preview",
+                                  key=f"rr_confirm_{previewed[2]}")      # fresh, unticked per preview
+            apply = confirm and st.button("⚠️ Apply Re-rating")
+        else:
+            st.caption("Preview these settings to enable applying them.")
+        if apply:
+            rep = rerate_bills(**rr_args, dry_run=False, actor=st.session_state.username)
+            st.session_state.pop("rr_preview", None)
+        if preview or apply:
+            (st.success if apply else st.info)(
+                f"{'Re-rated' if apply else 'Would re-rate'} {rep['changed']:,} of {rep['scanned']:,} bills "
+                f"({rep['skipped_settled']:,} settled bills skipped). Commission "
+                f"₹{rep['commission_before']:,.2f} → ₹{rep['commission_after']:,.2f}, tax "
+                f"₹{rep['tax_before']:,.2f} → ₹{rep['tax_after']:,.2f}.")
+            if not rep["per_employee"].empty:
+                st.dataframe(rep["per_employee"], use_container_width=True, hide_index=True)
+                st.caption("Largest per-bill changes")
+                st.dataframe(rep["sample"], use_container_width=True, hide_index=True)
+
     # Audit
     elif menu == "Audit":
         st.header("🛡️ Audit Log")
-        conn = sqlite3.connect("auto_exotic_billing.db")
-        rows = conn.execute("""
-          SELECT action, table_name, row_id, actor, ts, old_values, new_values
-          FROM audit_log ORDER BY ts DESC LIMIT 500
-        """).fetchall()
-        conn.close()
+        rows = get_audit_log(500)
         if rows:
             df = pd.DataFrame(rows, columns=["Action", "Table", "Row ID", "Actor", "Time", "Old", "New"])
             st.dataframe(df, use_container_width=True)
         else:
             st.info("Audit log is empty.")
+
+    elif menu == "Group":
+        st.header("🌐 Group Overview — All Garages")
+        now = datetime.now(IST)
+        colA, colB = st.columns(2)
+        with colA:
+            sd = st.date_input("Start date", value=(now - timedelta(days=7)).date(), key="grp_sd")
+        with colB:
+            ed = st.date_input("End date", value=now.date(), key="grp_ed")
+        start_str = f"{sd:%Y-%m-%d} 00:00:00"
+        end_str = f"{ed:%Y-%m-%d} 23:59:59"
+
+        totals = pd.DataFrame(federation.group_totals(start_str, end_str),
+                              columns=["Garage", "Bills", "Revenue", "Commission", "Tax"])
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Group Revenue", f"₹{totals['Revenue'].sum():,.2f}")
+        col2.metric("Group Bills", f"{int(totals['Bills'].sum()):,}")
+        col3.metric("Garages Reporting", f"{len(totals)} / {len(LOCATIONS)}")
+        st.subheader("By Garage")
+        st.dataframe(totals, use_container_width=True, hide_index=True)
+
+        st.subheader("🏆 Group Leaderboard")
+        lb = pd.DataFrame(federation.group_leaderboard(start_str, end_str, limit=25),
+                          columns=["CID", "Name", "Garages", "Bills", "Revenue", "Commission"])
+        st.dataframe(lb, use_container_width=True, hide_index=True)
+
+        st.subheader("⚔️ Group Hood War")
+        war = pd.DataFrame(federation.group_hood_war(start_str, end_str, by_location=True),
+                           columns=["Garage", "Hood", "Revenue"])
+        if war.empty:
+            st.info("No hoods yet.")
+        else:
+            war["Hood"] = war["Hood"].fillna("No Hood")
+            table = war.pivot_table(index="Hood", columns="Garage", values="Revenue", aggfunc="sum", fill_value=0)
+            table["Total"] = table.sum(axis=1)
+            st.dataframe(table.sort_values("Total", ascending=False), use_container_width=True)
+
+    render_perf_panel()
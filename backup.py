@@ -0,0 +1,243 @@
+"""
+Online backups with the sqlite3 backup API, plus rotation and restore.
+
+    python backup.py                  # one snapshot now
+    python backup.py --list
+    python backup.py --restore exoticbill_20261018_230000.db.gz
+
+Snapshots are copied in small page batches with a short pause between
+batches, so a large database never holds a lock long enough to stall bill
+entry. In WAL mode a batch copy restarts whenever someone commits; after a
+few restarts the copy switches to a single read snapshot, which WAL lets
+writers work around. The finished copy is integrity-checked, optionally
+gzipped, and renamed into place atomically; only the newest BACKUP_KEEP
+are kept. The app starts a scheduler thread (start_scheduler) at boot.
+
+Everything works on the current location's database (db.location); the
+default garage keeps its snapshots in BACKUP_DIR, every other garage in
+BACKUP_DIR/<name>. The scheduler backs up each location in turn.
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import db
+
+BACKUP_DIR = os.environ.get("EXOTICBILL_BACKUP_DIR", "backups")
+BACKUP_INTERVAL_S = int(os.environ.get("EXOTICBILL_BACKUP_INTERVAL", 6 * 3600))   # 0 = no scheduler
+BACKUP_KEEP = int(os.environ.get("EXOTICBILL_BACKUP_KEEP", 14))
+BACKUP_COMPRESS = os.environ.get("EXOTICBILL_BACKUP_COMPRESS", "1") != "0"
+BACKUP_PAGES = 256          # pages per step (1 MB at the default 4 KB page size)
+BACKUP_PAUSE_S = 0.005      # pause between steps, lets writers in
+BACKUP_MAX_RESTARTS = 3
+PREFIX = "exoticbill_"
+
+_lock = threading.Lock()        # one backup/restore at a time per process
+_scheduler_lock = threading.Lock()
+_scheduler = None
+_status = defaultdict(lambda: {"last_ok": None, "last_error": None, "last_seconds": None, "last_file": None,
+                               "running": False})
+
+
+def get_status():
+    """Last backup outcome for the current location."""
+    return _status[db.current_location()]
+
+
+def backup_dir():
+    name = db.current_location()
+    if name == db.default_location():
+        return BACKUP_DIR
+    return os.path.join(BACKUP_DIR, re.sub(r"[^A-Za-z0-9_-]+", "-", name))
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _copy(src, dst, pages, pause):
+    """Page-batched copy; raises _Restarted if concurrent commits keep restarting it."""
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(_status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > BACKUP_MAX_RESTARTS:
+                raise _Restarted()
+        state["remaining"] = remaining
+        if pause:
+            time.sleep(pause)
+
+    src.backup(dst, pages=pages, progress=progress)
+
+
+def _snapshot(path, pages=BACKUP_PAGES, pause=BACKUP_PAUSE_S):
+    src = sqlite3.connect(db.current_db_path())
+    try:
+        for attempt in ("batched", "snapshot"):
+            dst = sqlite3.connect(path)
+            try:
+                if attempt == "batched":
+                    _copy(src, dst, pages, pause)
+                else:
+                    src.backup(dst)     # one step = one read snapshot
+                ok = dst.execute("PRAGMA quick_check").fetchone()[0]
+                if ok != "ok":
+                    raise sqlite3.DatabaseError(f"backup failed quick_check: {ok}")
+                dst.execute("PRAGMA journal_mode=DELETE")   # self-contained file, no -wal
+                return attempt
+            except _Restarted:
+                continue
+            finally:
+                dst.close()
+    finally:
+        src.close()
+
+
+def create_backup(compress=None, label=""):
+    """Take a snapshot now; returns the file name inside backup_dir()."""
+    compress = BACKUP_COMPRESS if compress is None else compress
+    folder, status = backup_dir(), get_status()
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.now(db.IST).strftime("%Y%m%d_%H%M%S")
+    name = f"{PREFIX}{stamp}{'_' + label if label else ''}.db" + (".gz" if compress else "")
+    final = os.path.join(folder, name)
+    tmp = os.path.join(folder, f".{name}.tmp")
+    raw = tmp + ".db"
+    with _lock:
+        status["running"] = True
+        t0 = time.perf_counter()
+        try:
+            _snapshot(raw)
+            if compress:
+                with open(raw, "rb") as f, gzip.open(tmp, "wb", compresslevel=6) as g:
+                    shutil.copyfileobj(f, g, 1024 * 1024)
+                os.remove(raw)
+            else:
+                os.replace(raw, tmp)
+            os.replace(tmp, final)
+            status.update(last_ok=datetime.now(db.IST).strftime("%Y-%m-%d %H:%M:%S"), last_error=None,
+                          last_seconds=round(time.perf_counter() - t0, 2), last_file=name)
+        except Exception as e:
+            status["last_error"] = repr(e)
+            for p in (raw, tmp):
+                if os.path.exists(p):
+                    os.remove(p)
+            raise
+        finally:
+            status["running"] = False
+    rotate()
+    return name
+
+
+def list_backups():
+    """(name, size_bytes, modified) for every snapshot, newest first."""
+    folder = backup_dir()
+    if not os.path.isdir(folder):
+        return []
+    out = []
+    for name in os.listdir(folder):
+        if name.startswith(PREFIX) and (name.endswith(".db") or name.endswith(".db.gz")):
+            st = os.stat(os.path.join(folder, name))
+            out.append((name, st.st_size, datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M:%S")))
+    return sorted(out, key=lambda r: r[0], reverse=True)
+
+
+def rotate(keep=None):
+    """Delete all but the newest `keep` scheduled snapshots (labelled ones are kept)."""
+    keep = BACKUP_KEEP if keep is None else keep
+    plain = [n for n, _, _ in list_backups() if n.count("_") == 2]
+    for name in plain[keep:]:
+        os.remove(os.path.join(backup_dir(), name))
+
+
+def restore_backup(name, actor="?"):
+    """
+    Replace the live database's contents with a snapshot. A labelled
+    "prerestore" snapshot of the current data is taken first.
+    """
+    folder = backup_dir()
+    path = os.path.join(folder, os.path.basename(name))
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    safety = create_backup(label="prerestore")
+    with _lock:
+        src_path = path
+        if path.endswith(".gz"):
+            src_path = os.path.join(folder, f".restore_{os.getpid()}.db")
+            with gzip.open(path, "rb") as g, open(src_path, "wb") as f:
+                shutil.copyfileobj(g, f, 1024 * 1024)
+        try:
+            src = sqlite3.connect(src_path)
+            dst = sqlite3.connect(db.current_db_path(), timeout=db.WRITE_BUSY_TIMEOUT * 5)
+            try:
+                src.backup(dst)     # one step: readers see either the old or the restored data
+            finally:
+                src.close()
+                dst.close()
+        finally:
+            if src_path != path and os.path.exists(src_path):
+                os.remove(src_path)
+    db.init_db()    # snapshot may predate the newest migrations
+    db.invalidate_reference()
+    db.audit("RESTORE_BACKUP", "database", os.path.basename(name), actor, new_values={"safety_backup": safety})
+    return safety
+
+
+# ---------- SCHEDULER ----------
+def _loop(interval):
+    while True:
+        time.sleep(interval)
+        for name in db.LOCATIONS:
+            try:
+                with db.location(name):
+                    create_backup()
+            except Exception:
+                pass    # recorded in that location's status["last_error"]
+
+
+def start_scheduler(interval=None):
+    """Start the periodic backup thread once per process (safe to call on every rerun)."""
+    global _scheduler
+    interval = BACKUP_INTERVAL_S if interval is None else interval
+    if interval <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_loop, args=(interval,), name="exoticbill-backup", daemon=True)
+            _scheduler.start()
+    return _scheduler
+
+
+def main():
+    p = argparse.ArgumentParser(description="Back up or restore the ExoticBill database.")
+    p.add_argument("--db", help="database file (default: EXOTICBILL_DB or auto_exotic_billing.db)")
+    p.add_argument("--location", choices=list(db.LOCATIONS), help="garage from EXOTICBILL_LOCATIONS")
+    p.add_argument("--list", action="store_true", help="list snapshots")
+    p.add_argument("--restore", metavar="NAME", help="restore this snapshot into the live database")
+    p.add_argument("--no-compress", action="store_true")
+    args = p.parse_args()
+    if args.db:
+        db.DB_PATH = args.db
+    if args.location:
+        db.use_location(args.location)
+    if args.list:
+        for name, size, mtime in list_backups():
+            print(f"{mtime}  {size / 1e6:>10.1f} MB  {name}")
+    elif args.restore:
+        print(f"restored {args.restore}; previous data saved as {restore_backup(args.restore, actor='cli')}")
+    else:
+        t0 = time.perf_counter()
+        name = create_backup(compress=not args.no_compress)
+        print(f"wrote {os.path.join(backup_dir(), name)} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Benchmark suite for the data layer and each admin view's query set.
+
+    python bench.py --sizes 10000,100000,1000000 --repeat 5 --out bench_report.json
+    python bench.py --sizes 100000 --compare bench_report.json
+
+For every size a seeded synthetic database is generated (and reused from
+--workdir on later runs), then every case is timed `repeat` times. Mutating
+cases run against a fresh copy of the database each repeat. The JSON report
+is machine-readable; --compare prints per-case ratios against an earlier
+report and exits non-zero when a case regressed past --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import db
+import shift_analytics
+import synth_data
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+# ---------- CASES ----------
+def _ranges(now):
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "today": (today.strftime(TS_FMT), now.strftime(TS_FMT)),
+        "7d": ((now - timedelta(days=7)).strftime(TS_FMT), now.strftime(TS_FMT)),
+        "month": (today.replace(day=1).strftime(TS_FMT), now.strftime(TS_FMT)),
+        "90d": ((now - timedelta(days=90)).strftime(TS_FMT), now.strftime(TS_FMT)),
+    }
+
+
+def _sample(conn):
+    """Representative keys: the busiest employee, customer and hood."""
+    emp = conn.execute(
+        "SELECT employee_cid FROM bills GROUP BY employee_cid ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()
+    cust = conn.execute(
+        "SELECT customer_cid FROM bills GROUP BY customer_cid ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()
+    hood = conn.execute("SELECT name FROM hoods LIMIT 1").fetchone()
+    bill = conn.execute("SELECT MAX(id) FROM bills").fetchone()
+    return {
+        "emp": emp[0] if emp else "EMP00000",
+        "cust": cust[0] if cust else "CUS0000000",
+        "hood": hood[0] if hood else "No Hood",
+        "bill_id": bill[0] if bill else 1,
+    }
+
+
+def read_cases(now, k):
+    """Read-only data helpers: name -> zero-arg callable returning rows (or a value)."""
+    r = _ranges(now)
+    cases = {
+        "get_bill_logs[today]": lambda: db.get_bill_logs(*r["today"]),
+        "get_bill_logs[7d]": lambda: db.get_bill_logs(*r["7d"]),
+        "get_bill_logs[month]": lambda: db.get_bill_logs(*r["month"]),
+        "get_billing_summary_by_cid": lambda: db.get_billing_summary_by_cid(k["emp"]),
+        "get_employee_bills": lambda: db.get_employee_bills(k["emp"]),
+        "get_customer_bills": lambda: db.get_customer_bills(k["cust"]),
+        "get_all_customers": db.get_all_customers,
+        "search_customers": lambda: db.search_customers(k["cust"][:4]),
+        "get_total_billing": db.get_total_billing,
+        "get_bill_count": db.get_bill_count,
+        "get_total_commission_and_tax": db.get_total_commission_and_tax,
+        "get_all_employee_cids": db.get_all_employee_cids,
+        "get_all_memberships": db.get_all_memberships,
+        "get_past_memberships": db.get_past_memberships,
+        "get_employees_by_hood": lambda: db.get_employees_by_hood(k["hood"]),
+        "get_live_stats": lambda: db.get_live_stats(now),
+        "get_employee_rankings[Total Sales]": lambda: db.get_employee_rankings("Total Sales"),
+        "get_employee_rankings[REPAIR]": lambda: db.get_employee_rankings("REPAIR"),
+        "get_employee_sales_since[7d]": lambda: db.get_employee_sales_since(r["7d"][0]),
+        "get_hood_war[7d]": lambda: db.get_hood_war(*r["7d"]),
+        "get_top_loyalty": db.get_top_loyalty,
+        "get_employee_shifts[7d]": lambda: db.get_employee_shifts(k["emp"], *r["7d"]),
+        "get_live_shifts": db.get_live_shifts,
+        "get_audit_log": db.get_audit_log,
+    }
+
+    def analytics():
+        shift_analytics.clear_cache()
+        return shift_analytics.get_shift_analytics(*r["90d"])
+    cases["get_shift_analytics[90d, uncached]"] = analytics
+    return cases
+
+
+def write_cases(k):
+    """Mutating helpers; each call gets a fresh copy of the database."""
+    def save_bills():
+        for i in range(100):
+            db.save_bill(k["emp"], f"BENCH{i % 10}", "REPAIR", "Normal Repair: ₹500+₹450", 950.0)
+
+    def shift_cycle():
+        db.end_shift(k["emp"])
+        db.start_shift(k["emp"])
+        return db.end_shift(k["emp"])
+
+    return {
+        "save_bill x100": save_bills,
+        "end_shift": shift_cycle,
+        "soft_delete_bill": lambda: db.soft_delete_bill(k["bill_id"], "bench"),
+        "purge_expired_memberships": db.purge_expired_memberships,
+    }
+
+
+def view_query_sets(now, k):
+    """The helper calls each admin page makes on one rerun (mirrors app.py)."""
+    r = _ranges(now)
+
+    def staff_list():
+        for cid, _ in db.get_all_employee_cids():
+            db.get_employee_details(cid)
+        db.get_all_hoods()
+
+    def tracking():
+        emps = db.get_all_employee_cids()
+        db.get_billing_summary_by_cid(k["emp"])
+        db.search_customers()
+        db.get_customer_bills(k["cust"])
+        db.get_all_hoods()
+        for cid, _ in db.get_employees_by_hood(k["hood"]):
+            db.get_billing_summary_by_cid(cid)
+        db.get_all_memberships()
+        db.get_employee_rankings("Total Sales")
+        return emps
+
+    return {
+        "view:Header": db.get_total_billing,
+        "view:Sales": lambda: (db.get_total_billing(), db.get_bill_count(), db.get_total_commission_and_tax()),
+        "view:Live Stats": lambda: db.get_live_stats(now),
+        "view:Manage Hoods": lambda: [db.get_all_hoods() for _ in range(3)] + [db.get_all_employee_cids()],
+        "view:Manage Staff": staff_list,
+        "view:Tracking": tracking,
+        "view:Bill Logs[today]": lambda: db.get_bill_logs(*r["today"]),
+        "view:Hood War": lambda: db.get_hood_war(*r["7d"]),
+        "view:Loyalty": db.get_top_loyalty,
+        "view:Shifts": lambda: (db.get_all_employee_cids(), db.get_employee_shifts(k["emp"], *r["7d"]),
+                                db.get_live_shifts()),
+        "view:Audit": db.get_audit_log,
+    }
+
+
+# ---------- RUNNER ----------
+def _rows(result):
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def _time(fn, repeat, before=None):
+    times, rows = [], None
+    for _ in range(repeat):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+        rows = _rows(result)
+    times.sort()
+    return {
+        "n": repeat,
+        "min_ms": round(times[0], 3),
+        "median_ms": round(statistics.median(times), 3),
+        "p95_ms": round(times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))], 3),
+        "max_ms": round(times[-1], 3),
+        "rows": rows,
+    }
+
+
+def _copy_db(src, dst):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(dst + suffix):
+            os.remove(dst + suffix)
+    s, d = sqlite3.connect(src), sqlite3.connect(dst)
+    try:
+        s.backup(d)
+    finally:
+        s.close()
+        d.close()
+
+
+def _scaled(size):
+    """Other entity counts grow with the bill count, within sensible bounds."""
+    return {
+        "bills": size,
+        "employees": max(20, min(500, size // 2000)),
+        "customers": max(500, min(200_000, size // 20)),
+        "memberships": max(50, min(20_000, size // 200)),
+        "shifts": max(500, min(150_000, size // 20)),
+    }
+
+
+def run(sizes, repeat, workdir, seed, only=None):
+    os.makedirs(workdir, exist_ok=True)
+    now = datetime.now(db.IST)
+    results = []
+    prev_path = db.DB_PATH
+    try:
+        for size in sizes:
+            base = os.path.join(workdir, f"bench_{size}_s{seed}.db")
+            if not os.path.exists(base):
+                print(f"generating {size:,} bills -> {base}")
+                synth_data.generate(base, seed=seed, **_scaled(size))
+            with sqlite3.connect(base) as conn:
+                k = _sample(conn)
+
+            db.DB_PATH = base
+            groups = [("read", read_cases(now, k)), ("view", view_query_sets(now, k))]
+            for kind, cases in groups:
+                for name, fn in cases.items():
+                    if only and only not in name:
+                        continue
+                    res = _time(fn, repeat)
+                    results.append({"size": size, "kind": kind, "case": name, **res})
+                    print(f"{size:>10,}  {name:<40} median {res['median_ms']:>10.2f} ms")
+
+            scratch = os.path.join(workdir, "bench_scratch.db")
+            db.DB_PATH = scratch
+            for name, fn in write_cases(k).items():
+                if only and only not in name:
+                    continue
+                res = _time(fn, repeat, before=lambda: _copy_db(base, scratch))
+                results.append({"size": size, "kind": "write", "case": name, **res})
+                print(f"{size:>10,}  {name:<40} median {res['median_ms']:>10.2f} ms")
+    finally:
+        db.DB_PATH = prev_path
+    return results
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(old_report, new_results, threshold):
+    old = {(r["size"], r["case"]): r for r in old_report.get("results", [])}
+    regressions = 0
+    print(f"\n{'size':>10}  {'case':<40} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for r in new_results:
+        o = old.get((r["size"], r["case"]))
+        if not o or not o["median_ms"]:
+            continue
+        ratio = r["median_ms"] / o["median_ms"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{r['size']:>10,}  {r['case']:<40} {o['median_ms']:>10.2f} {r['median_ms']:>10.2f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark ExoticBill data helpers and admin views.")
+    p.add_argument("--sizes", default="10000,100000", help="comma-separated bill counts")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--workdir", default="bench_data", help="where generated databases are kept")
+    p.add_argument("--only", help="run only cases whose name contains this text")
+    p.add_argument("--out", default="bench_report.json")
+    p.add_argument("--compare", help="earlier report to compare against")
+    p.add_argument("--threshold", type=float, default=1.25, help="ratio counted as a regression")
+    args = p.parse_args()
+
+    sizes = [int(s.replace("_", "")) for s in args.sizes.split(",") if s.strip()]
+    old_report = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old_report = json.load(f)
+    results = run(sizes, args.repeat, args.workdir, args.seed, args.only)
+    report = {
+        "meta": {
+            "created_at": datetime.now(db.IST).strftime(TS_FMT),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "sizes": sizes,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nreport written to {args.out}")
+
+    if old_report:
+        regressions = compare(old_report, results, args.threshold)
+        if regressions:
+            raise SystemExit(f"{regressions} case(s) regressed by more than {args.threshold:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
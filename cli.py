@@ -0,0 +1,224 @@
+"""
+ExoticBill reports from the command line (cron, payroll), no Streamlit.
+
+    python cli.py daily-close                       # today, IST
+    python cli.py daily-close --day 2026-10-18 --format json
+    python cli.py payroll --from 2026-10-12 --to 2026-10-18 --format csv --out payroll.csv
+    python cli.py hood-war --from 2026-10-12
+    python cli.py settlements --id 3 --format csv
+    python cli.py rerate --from 2026-10-01 --rate Mechanic=0.2 [--apply]
+    python cli.py export --from 2026-10-01 --to 2026-10-31 --format csv --out bills.csv
+
+--from/--to are inclusive IST dates. Use --db (or EXOTICBILL_DB) to point
+at another database file, or --location for one garage's database.
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime, timedelta
+
+import db
+
+DATE_FMT = "%Y-%m-%d"
+
+
+def _day(s):
+    try:
+        return datetime.strptime(s, DATE_FMT).strftime(DATE_FMT)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {s!r}")
+
+
+def _fraction(s):
+    try:
+        v = float(s)
+    except ValueError:
+        v = float("nan")
+    if not 0.0 <= v <= 1.0:
+        raise argparse.ArgumentTypeError(f"expected a number between 0 and 1, got {s!r}")
+    return v
+
+
+def _rate(s):
+    rank, sep, val = s.partition("=")
+    if not sep or rank not in db.COMMISSION_RATES:
+        raise argparse.ArgumentTypeError(f"expected RANK=RATE with RANK one of {', '.join(db.COMMISSION_RATES)}, "
+                                         f"got {s!r}")
+    return rank, _fraction(val)
+
+
+def _range(args, default_days=7):
+    today = datetime.now(db.IST).strftime(DATE_FMT)
+    end = args.to or today
+    start = args.from_ or (datetime.strptime(end, DATE_FMT) - timedelta(days=default_days - 1)).strftime(DATE_FMT)
+    return f"{start} 00:00:00", f"{end} 23:59:59"
+
+
+# ---------- OUTPUT ----------
+def emit(columns, rows, fmt, out=None, meta=None):
+    """Write rows as an aligned table, CSV or JSON to --out (or stdout)."""
+    f = open(out, "w", encoding="utf-8", newline="") if out else sys.stdout
+    try:
+        if fmt == "csv":
+            w = csv.writer(f)
+            w.writerow(columns)
+            w.writerows(rows)
+        elif fmt == "json":
+            doc = [dict(zip(columns, r)) for r in rows]
+            json.dump({**meta, "rows": doc} if meta else doc, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        else:
+            cells = [[_fmt(v) for v in r] for r in rows]
+            widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+            f.write("  ".join(c.ljust(w) for c, w in zip(columns, widths)) + "\n")
+            for r in cells:
+                f.write("  ".join(v.rjust(w) if _numeric(v) else v.ljust(w) for v, w in zip(r, widths)) + "\n")
+    finally:
+        if out:
+            f.close()
+
+
+def _fmt(v):
+    if isinstance(v, float):
+        return f"{v:,.2f}"
+    return "" if v is None else str(v)
+
+
+def _numeric(s):
+    return s.replace(",", "").replace(".", "", 1).lstrip("-").isdigit()
+
+
+def emit_json(doc, out):
+    f = open(out, "w", encoding="utf-8") if out else sys.stdout
+    try:
+        json.dump(doc, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    finally:
+        if out:
+            f.close()
+
+
+# ---------- COMMANDS ----------
+def cmd_daily_close(args):
+    day = args.day or datetime.now(db.IST).strftime(DATE_FMT)
+    close = db.get_daily_close(day)
+    if args.format == "json":
+        close["by_type"] = [dict(zip(["billing_type", "bills", "revenue"], r)) for r in close["by_type"]]
+        close["by_hood"] = [dict(zip(["hood", "bills", "revenue"], r)) for r in close["by_hood"]]
+        emit_json(close, args.out)
+        return
+    summary = [
+        ("bills", close["bills"]), ("revenue", close["revenue"]), ("commission", close["commission"]),
+        ("tax", close["tax"]), ("shifts_closed", close["shifts_closed"]),
+        ("shift_minutes", close["shift_minutes"]), ("bills_deleted", close["bills_deleted"]),
+        ("deleted_amount", close["deleted_amount"]),
+    ]
+    if args.format == "csv":
+        emit(["metric", "value"], summary, "csv", args.out)
+        return
+    print(f"Daily close {day}\n")
+    emit(["metric", "value"], summary, "table")
+    print()
+    emit(["billing_type", "bills", "revenue"], close["by_type"], "table")
+    print()
+    emit(["hood", "bills", "revenue"], close["by_hood"], "table")
+
+
+def cmd_payroll(args):
+    start, end = _range(args)
+    rows = db.get_payroll(start, end)
+    cols = ["employee_cid", "name", "rank", "hood", "bills", "gross", "commission", "tax", "net_payout"]
+    emit(cols, rows, args.format, args.out, meta={"from": start, "to": end})
+
+
+def cmd_hood_war(args):
+    start, end = _range(args)
+    emit(["hood", "revenue"], db.get_hood_war(start, end), args.format, args.out, meta={"from": start, "to": end})
+
+
+def cmd_settlements(args):
+    if args.id is None:
+        cols = ["id", "from", "to", "closed_at", "closed_by", "bills", "gross", "commission", "tax", "net_payout",
+                "adjustments", "adjustment_net"]
+        emit(cols, db.get_settlement_periods(), args.format, args.out)
+    else:
+        cols = ["employee_cid", "name", "bills", "gross", "commission", "tax", "net_payout",
+                "adjustments", "net_after_adjustments"]
+        emit(cols, db.get_settlement(args.id), args.format, args.out, meta={"period_id": args.id})
+
+
+def cmd_rerate(args):
+    import rerate   # pandas is only needed here
+    start, end = _range(args, default_days=30)
+    rates = {**db.COMMISSION_RATES, **dict(args.rate or [])}
+    rep = rerate.rerate_bills(start, end, employee_cids=args.employee, rates=rates, tax_rate=args.tax_rate,
+                              dry_run=not args.apply, actor=args.actor)
+    print(f"{'applied' if args.apply else 'dry run'}: {rep['changed']:,} of {rep['scanned']:,} bills change "
+          f"({rep['skipped_settled']:,} settled skipped); commission {rep['commission_before']:,.2f} -> "
+          f"{rep['commission_after']:,.2f}, tax {rep['tax_before']:,.2f} -> {rep['tax_after']:,.2f}",
+          file=sys.stderr)
+    per = rep["per_employee"]
+    emit(list(per.columns), per.itertuples(index=False, name=None), args.format, args.out,
+         meta={k: rep[k] for k in ("start", "end", "dry_run", "scanned", "changed", "skipped_settled")})
+
+
+def cmd_export(args):
+    start, end = _range(args, default_days=1)
+    cols = ["id", "employee_cid", "customer_cid", "billing_type", "details", "total_amount",
+            "timestamp", "commission", "tax", "hood"]
+    rows = db.iter_bills(start, end)
+    if args.format == "json":
+        # JSON lines, so large exports stream instead of building one document
+        f = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+        try:
+            for r in rows:
+                f.write(json.dumps(dict(zip(cols, r)), ensure_ascii=False) + "\n")
+        finally:
+            if args.out:
+                f.close()
+    else:
+        emit(cols, rows, "csv", args.out)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="ExoticBill reports without the Streamlit UI.")
+    p.add_argument("--db", help="database file (default: EXOTICBILL_DB or auto_exotic_billing.db)")
+    p.add_argument("--location", choices=list(db.LOCATIONS), help="garage from EXOTICBILL_LOCATIONS")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    def add(name, fn, help, formats=("table", "csv", "json"), ranged=True):
+        sp = sub.add_parser(name, help=help)
+        if ranged:
+            sp.add_argument("--from", dest="from_", type=_day, help="first day (default: 7 days before --to)")
+            sp.add_argument("--to", type=_day, help="last day (default: today)")
+        sp.add_argument("--format", choices=formats, default=formats[0])
+        sp.add_argument("--out", help="write to this file instead of stdout")
+        sp.set_defaults(func=fn)
+        return sp
+
+    add("daily-close", cmd_daily_close, "totals for one day", ranged=False).add_argument(
+        "--day", type=_day, help="YYYY-MM-DD (default: today)")
+    add("payroll", cmd_payroll, "commission, tax and net payout per employee")
+    add("hood-war", cmd_hood_war, "revenue per hood")
+    add("settlements", cmd_settlements, "closed payroll periods, or one period per employee",
+        ranged=False).add_argument("--id", type=int, help="period id")
+    rr = add("rerate", cmd_rerate, "recompute commission/tax on unsettled bills (dry run unless --apply)")
+    rr.add_argument("--employee", action="append", help="limit to this employee CID (repeatable)")
+    rr.add_argument("--rate", action="append", type=_rate, metavar="RANK=RATE",
+                    help="override a rank's rate, e.g. Mechanic=0.2 (repeatable)")
+    rr.add_argument("--tax-rate", type=_fraction, help=f"tax on commission (default {db.TAX_RATE})")
+    rr.add_argument("--apply", action="store_true", help="write the changes")
+    rr.add_argument("--actor", default="cli")
+    add("export", cmd_export, "raw bills (CSV, or JSON lines); default range is today", formats=("csv", "json"))
+
+    args = p.parse_args(argv)
+    if args.db:
+        db.DB_PATH = args.db
+    if args.location:
+        db.use_location(args.location)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
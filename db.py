@@ -0,0 +1,2203 @@
+"""
+ExoticBill data layer: constants, schema/migrations and every SQLite helper.
+
+Importing this module has no side effects (no Streamlit, no DB access), so
+app.py, tools and benchmarks can all share it. Set DB_PATH (or the
+EXOTICBILL_DB environment variable) to point it at another database file.
+
+Each garage can keep its own database file: EXOTICBILL_LOCATIONS lists them
+as "Name=path,Name=path". use_location()/location() pick one for the
+current thread/context (the app does it per session at login); code that
+never picks one gets DB_PATH, which defaults to the first garage.
+"""
+import contextvars
+import sqlite3
+import os
+import random
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import json
+
+import perf
+
+# ---------- CONFIG -----------
+IST = ZoneInfo("Asia/Kolkata")
+
+
+def _parse_locations(spec):
+    locs = {}
+    for part in (spec or "").split(","):
+        name, _, path = part.partition("=")
+        if name.strip() and path.strip():
+            locs[name.strip()] = path.strip()
+    return locs
+
+
+# garage name -> database file; the first garage's file is the default DB_PATH
+LOCATIONS = _parse_locations(os.environ.get("EXOTICBILL_LOCATIONS"))
+DB_PATH = os.environ.get("EXOTICBILL_DB") or next(iter(LOCATIONS.values()), "auto_exotic_billing.db")
+if not LOCATIONS:
+    LOCATIONS = {"Main": None}      # None = whatever DB_PATH is (so --db and scratch copies still work)
+_location = contextvars.ContextVar("exoticbill_location", default=None)
+
+
+def location_path(name):
+    if name not in LOCATIONS:
+        raise KeyError(f"unknown location {name!r}")
+    return LOCATIONS[name] or DB_PATH
+
+
+def use_location(name):
+    """Point connect() at this garage's database for the current thread/context."""
+    location_path(name)
+    _location.set(name)
+
+
+def default_location():
+    return next(iter(LOCATIONS))
+
+
+def current_location():
+    return _location.get() or default_location()
+
+
+def current_db_path():
+    name = _location.get()
+    return location_path(name) if name else DB_PATH
+
+
+@contextmanager
+def location(name):
+    """Temporarily use this garage's database (schedulers, federated reports)."""
+    location_path(name)
+    token = _location.set(name)
+    try:
+        yield name
+    finally:
+        _location.reset(token)
+
+
+def connect(**kwargs):
+    return sqlite3.connect(current_db_path(), factory=perf.connection_factory(), **kwargs)
+
+
+# ---------- PRICING & DISCOUNTS -----------
+ITEM_PRICES = {
+    "Repair Kit": 400,
+    "Car Wax": 2000,
+    "NOS": 1500,
+    "Adv Lockpick": 400,
+    "Lockpick": 250,
+    "Wash Kit": 300,
+    "Harness": 12000,
+}
+PART_COST = 125
+LABOR = 450
+MEMBERSHIP_DISCOUNTS = {
+    "Tier1": {"REPAIR": 0.20, "CUSTOMIZATION": 0.10},
+    "Tier2": {"REPAIR": 0.33, "CUSTOMIZATION": 0.20},
+    "Tier3": {"REPAIR": 0.50, "CUSTOMIZATION": 0.30},
+    "Racer": {"REPAIR": 0.00, "CUSTOMIZATION": 0.00},
+}
+
+# ---------- MEMBERSHIP PRICES -----------
+MEMBERSHIP_PRICES = {"Tier1": 2000, "Tier2": 4000, "Tier3": 6000}
+# how long each tier lasts from purchase; stored on the row as expires_at
+MEMBERSHIP_DAYS = {"Tier1": 7, "Tier2": 7, "Tier3": 7, "Racer": 7}
+MEMBERSHIP_DEFAULT_DAYS = 7
+
+
+def membership_expiry(tier, dop):
+    """expires_at string for a membership of `tier` bought at `dop` (a datetime)."""
+    return (dop + timedelta(days=MEMBERSHIP_DAYS.get(tier, MEMBERSHIP_DEFAULT_DAYS))).strftime("%Y-%m-%d %H:%M:%S")
+
+# ---------- COMMISSION & TAX -----------
+COMMISSION_RATES = {
+    "Trainee": 0.10,
+    "Mechanic": 0.15,
+    "Senior Mechanic": 0.18,
+    "Lead Upgrade Specialist": 0.20,
+    "Stock Manager": 0.15,
+    "Manager": 0.25,
+    "CEO": 0.69,
+}
+TAX_RATE = 0.05  # 5% on the commission
+
+# ---------- LOYALTY ----------
+# Earn 1 point per ₹100 spent on non-membership bills (configurable)
+LOYALTY_EARN_PER_RS = 100  # 1 point per 100 INR
+LOYALTY_REDEEM_RS = 1.0    # ₹ off the bill per point redeemed
+LOYALTY_EXPIRE_DAYS = int(os.environ.get("EXOTICBILL_LOYALTY_EXPIRE_DAYS", 0))  # idle days before expiry; 0 = never
+LOYALTY_KINDS = ("earn", "adjust", "redeem", "expire")
+
+# ---------- WRITE TRANSACTIONS ----------
+# Every write goes through write_txn(): BEGIN IMMEDIATE takes the write lock up
+# front (no read-then-write lock upgrades), and SQLITE_BUSY is retried with
+# jittered exponential backoff instead of surfacing after the first timeout.
+WRITE_BUSY_TIMEOUT = 2.0    # seconds SQLite itself waits per attempt
+WRITE_RETRIES = 6
+WRITE_BACKOFF_BASE = 0.05   # seconds; doubles per retry, full jitter
+WRITE_BACKOFF_MAX = 2.0
+
+_contention = defaultdict(lambda: {"calls": 0, "retries": 0, "failed": 0, "wait_ms": 0.0, "max_wait_ms": 0.0})
+_contention_lock = threading.Lock()
+
+
+class WriteBusyError(sqlite3.OperationalError):
+    """The database stayed locked through every retry; nothing was written."""
+
+
+def _is_busy(exc):
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def _count_write(op, retries, wait_ms, failed=False):
+    with _contention_lock:
+        c = _contention[op]
+        c["calls"] += 1
+        c["retries"] += retries
+        c["failed"] += failed
+        c["wait_ms"] += wait_ms
+        c["max_wait_ms"] = max(c["max_wait_ms"], wait_ms)
+
+
+def write_txn(op, fn, retries=WRITE_RETRIES):
+    """
+    Run fn(conn) in one BEGIN IMMEDIATE transaction and return its result.
+    fn may be re-run on a fresh connection after SQLITE_BUSY, so it must only
+    touch the database. Raises WriteBusyError once the retries are used up.
+    """
+    t0 = time.perf_counter()
+    attempt = 0
+    while True:
+        conn = connect(timeout=WRITE_BUSY_TIMEOUT, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            locked = time.perf_counter()   # wait = time until we held the write lock
+            result = fn(conn)
+            conn.execute("COMMIT")
+            _count_write(op, attempt, (locked - t0) * 1000)
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if not _is_busy(e):
+                raise
+            if attempt >= retries:
+                _count_write(op, attempt, (time.perf_counter() - t0) * 1000, failed=True)
+                raise WriteBusyError(f"{op}: database is busy, gave up after {attempt + 1} attempts") from e
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        attempt += 1
+        time.sleep(random.uniform(0, min(WRITE_BACKOFF_MAX, WRITE_BACKOFF_BASE * 2 ** attempt)))
+
+
+def get_contention_stats():
+    """Per-operation write counters since process start, busiest first."""
+    with _contention_lock:
+        rows = [{"op": op, **c} for op, c in _contention.items()]
+    for r in rows:
+        r["avg_wait_ms"] = r["wait_ms"] / r["calls"] if r["calls"] else 0.0
+    return sorted(rows, key=lambda r: (r["retries"], r["wait_ms"]), reverse=True)
+
+
+def reset_contention_stats():
+    with _contention_lock:
+        _contention.clear()
+
+
+# ---------- READ-ONLY REPORTING ----------
+# Admin analytics (logs, rankings, Hood War, payroll, exports) read through
+# connect_report(): a read-only connection with query_only on, so a report
+# can never take the write lock. With REPORT_STALENESS_S > 0 they read a
+# copy of the database instead (<db>.report), refreshed with the backup API
+# once it is older than that, so long scans don't hold WAL read marks that
+# stop checkpoints while cashiers are billing.
+REPORT_STALENESS_S = float(os.environ.get("EXOTICBILL_REPORT_STALENESS", 0))     # 0 = read the live file
+REPORT_SUFFIX = ".report"
+
+_report_lock = threading.Lock()
+_report_snapshots = {}      # live db path -> (as_of, monotonic time taken)
+
+
+def _connect_ro(path, **kwargs):
+    uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, factory=perf.connection_factory(), **kwargs)
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def refresh_report_snapshot():
+    """Copy the current database to its reporting snapshot now; returns the as-of time."""
+    with _report_lock:
+        return _refresh_snapshot(current_db_path())
+
+
+def _refresh_snapshot(live):
+    snap = live + REPORT_SUFFIX
+    tmp = f"{snap}.{os.getpid()}.tmp"
+    as_of = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+    src, dst = sqlite3.connect(live), sqlite3.connect(tmp)
+    try:
+        src.backup(dst)      # one step = one consistent read of the live file
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        src.close()
+        dst.close()
+    os.replace(tmp, snap)    # open report connections keep reading the old copy
+    _report_snapshots[live] = (as_of, time.monotonic())
+    return as_of
+
+
+def _report_path():
+    live = current_db_path()
+    if REPORT_STALENESS_S <= 0:
+        return live
+    snap = live + REPORT_SUFFIX
+    hit = _report_snapshots.get(live)
+    if hit and time.monotonic() - hit[1] < REPORT_STALENESS_S:
+        return snap
+    # only one refresh at a time; while it runs, other readers use the previous copy
+    if not _report_lock.acquire(blocking=hit is None):
+        return snap
+    try:
+        hit = _report_snapshots.get(live)
+        if not hit or time.monotonic() - hit[1] >= REPORT_STALENESS_S:
+            _refresh_snapshot(live)
+    finally:
+        _report_lock.release()
+    return snap
+
+
+def connect_report(**kwargs):
+    """Read-only connection for analytics (live file or the reporting snapshot)."""
+    return _connect_ro(_report_path(), **kwargs)
+
+
+def report_freshness():
+    """How current report reads are: mode, as_of and age_s (None when reading live)."""
+    if REPORT_STALENESS_S <= 0:
+        return {"mode": "live", "as_of": None, "age_s": None, "max_staleness_s": 0}
+    hit = _report_snapshots.get(current_db_path())
+    return {"mode": "snapshot", "as_of": hit[0] if hit else None,
+            "age_s": round(time.monotonic() - hit[1], 1) if hit else None, "max_staleness_s": REPORT_STALENESS_S}
+
+
+# ========== DATABASE INIT & MIGRATION ==========
+def init_db():
+    conn = connect()
+    c = conn.cursor()
+    # only a brand-new (empty) file can take auto_vacuum without a full VACUUM, so only set it there;
+    # existing files switch once via maintenance.enable_incremental_vacuum
+    if c.execute("PRAGMA page_count").fetchone()[0] == 0:
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL: dashboards keep reading while a cashier's bill commits
+    c.execute("PRAGMA journal_mode=WAL")
+
+    def has_column(table, col):
+        info = c.execute(f"PRAGMA table_info({table})").fetchall()
+        return any(row[1] == col for row in info)
+
+    # bills (base)
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS bills (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_cid TEXT,
+        customer_cid TEXT,
+        billing_type TEXT,
+        details TEXT,
+        total_amount REAL,
+        timestamp TEXT
+      )
+    """)
+    # migrations
+    if not has_column("bills", "commission"):
+        c.execute("ALTER TABLE bills ADD COLUMN commission REAL DEFAULT 0")
+    if not has_column("bills", "tax"):
+        c.execute("ALTER TABLE bills ADD COLUMN tax REAL DEFAULT 0")
+    bills_had_hood = has_column("bills", "hood")
+    if not bills_had_hood:
+        c.execute("ALTER TABLE bills ADD COLUMN hood TEXT")
+    if not has_column("bills", "settlement_id"):
+        c.execute("ALTER TABLE bills ADD COLUMN settlement_id INTEGER")
+
+    # employees (base)
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS employees (
+        cid TEXT PRIMARY KEY,
+        name TEXT,
+        rank TEXT
+      )
+    """)
+    if not has_column("employees", "rank"):
+        c.execute("ALTER TABLE employees ADD COLUMN rank TEXT DEFAULT 'Trainee'")
+    if not has_column("employees", "hood"):
+        c.execute("ALTER TABLE employees ADD COLUMN hood TEXT DEFAULT 'No Hood'")
+
+    # backfill bills.hood once from the current assignment (best we can do for old rows)
+    if not bills_had_hood:
+        c.execute("""
+          UPDATE bills SET hood = COALESCE(
+            (SELECT e.hood FROM employees e WHERE e.cid = bills.employee_cid), 'No Hood'
+          )
+        """)
+
+    # memberships (active)
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS memberships (
+        customer_cid TEXT PRIMARY KEY,
+        tier TEXT,
+        dop TEXT
+      )
+    """)
+
+    if not has_column("memberships", "expires_at"):
+        c.execute("ALTER TABLE memberships ADD COLUMN expires_at TEXT")
+        # backfill from dop with each tier's duration (new rows always get expires_at from add_membership)
+        c.execute(f"""
+          UPDATE memberships SET expires_at = datetime(dop, '+' || (CASE tier {" ".join(
+              f"WHEN '{t}' THEN {d}" for t, d in MEMBERSHIP_DAYS.items())} ELSE {MEMBERSHIP_DEFAULT_DAYS} END) || ' days')
+          WHERE expires_at IS NULL
+        """)
+
+    # membership history (archived/expired)
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS membership_history (
+        customer_cid TEXT,
+        tier TEXT,
+        dop TEXT,
+        expired_at TEXT
+      )
+    """)
+
+    # hoods
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS hoods (
+        name TEXT PRIMARY KEY,
+        location TEXT
+      )
+    """)
+
+    # soft-deletes for bills
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS bills_deleted (
+        id INTEGER,
+        employee_cid TEXT,
+        customer_cid TEXT,
+        billing_type TEXT,
+        details TEXT,
+        total_amount REAL,
+        timestamp TEXT,
+        commission REAL,
+        tax REAL,
+        deleted_by TEXT,
+        deleted_at TEXT
+      )
+    """)
+    if not has_column("bills_deleted", "hood"):
+        c.execute("ALTER TABLE bills_deleted ADD COLUMN hood TEXT")
+    if not has_column("bills_deleted", "settlement_id"):
+        c.execute("ALTER TABLE bills_deleted ADD COLUMN settlement_id INTEGER")
+
+    # snapshots left behind by "Reset All Billings" (archive-and-swap)
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS bill_archives (
+        name TEXT PRIMARY KEY,
+        created_at TEXT,
+        created_by TEXT,
+        bills INTEGER,
+        revenue REAL
+      )
+    """)
+
+    # payroll settlements: closed periods, per-employee totals, and later corrections
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS settlement_periods (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        period_start TEXT,
+        period_end TEXT,
+        closed_at TEXT,
+        closed_by TEXT,
+        bills INTEGER DEFAULT 0,
+        gross REAL DEFAULT 0,
+        commission REAL DEFAULT 0,
+        tax REAL DEFAULT 0,
+        net_payout REAL DEFAULT 0
+      )
+    """)
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS settlements (
+        period_id INTEGER,
+        employee_cid TEXT,
+        bills INTEGER,
+        gross REAL,
+        commission REAL,
+        tax REAL,
+        net_payout REAL,
+        PRIMARY KEY (period_id, employee_cid)
+      )
+    """)
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS settlement_adjustments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        period_id INTEGER,
+        employee_cid TEXT,
+        bill_id INTEGER,
+        reason TEXT,
+        bills INTEGER,
+        gross REAL,
+        commission REAL,
+        tax REAL,
+        net_payout REAL,
+        created_at TEXT,
+        actor TEXT
+      )
+    """)
+
+    # maintenance.py run history (report = JSON with per-task timings)
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS maintenance_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT,
+        finished_at TEXT,
+        trigger TEXT,
+        actor TEXT,
+        size_before INTEGER,
+        size_after INTEGER,
+        report TEXT
+      )
+    """)
+
+    # audit log
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        action TEXT,
+        table_name TEXT,
+        row_id TEXT,
+        actor TEXT,
+        ts TEXT,
+        old_values TEXT,
+        new_values TEXT
+      )
+    """)
+
+    # shifts
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS shifts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_cid TEXT,
+        start_ts TEXT,
+        end_ts TEXT,
+        duration_minutes INTEGER,
+        bills_count INTEGER,
+        revenue REAL
+      )
+    """)
+
+    # loyalty: materialized balance (indexed for top-N) over the append-only ledger
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS loyalty (
+        customer_cid TEXT PRIMARY KEY,
+        points INTEGER DEFAULT 0
+      )
+    """)
+    ledger_exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='loyalty_ledger'"
+    ).fetchone()
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS loyalty_ledger (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_cid TEXT,
+        kind TEXT,
+        points INTEGER,
+        bill_id INTEGER,
+        ts TEXT,
+        actor TEXT,
+        note TEXT
+      )
+    """)
+    # balance as of ledger entry `ledger_id`; balance = snapshot + later deltas
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS loyalty_snapshots (
+        customer_cid TEXT PRIMARY KEY,
+        ledger_id INTEGER,
+        points INTEGER,
+        taken_at TEXT
+      )
+    """)
+    if not ledger_exists:
+        # balances from before the ledger become opening entries
+        c.execute("""
+          INSERT INTO loyalty_ledger (customer_cid, kind, points, ts, actor, note)
+          SELECT customer_cid, 'adjust', points, ?, 'migration', 'opening balance'
+          FROM loyalty WHERE points != 0
+        """, (datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"),))
+
+    # hourly rollup of bills (bucket = "YYYY-MM-DD HH"), maintained by save_bill / soft_delete_bill
+    rollup_exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='bills_hourly'"
+    ).fetchone()
+    if rollup_exists and not has_column("bills_hourly", "hood"):
+        # derived table: rebuild with the hood dimension
+        c.execute("DROP TABLE bills_hourly")
+        rollup_exists = None
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS bills_hourly (
+        bucket TEXT,
+        employee_cid TEXT,
+        billing_type TEXT,
+        hood TEXT,
+        bills INTEGER DEFAULT 0,
+        revenue REAL DEFAULT 0,
+        commission REAL DEFAULT 0,
+        tax REAL DEFAULT 0,
+        PRIMARY KEY (bucket, employee_cid, billing_type, hood)
+      )
+    """)
+    if not rollup_exists:
+        rebuild_bills_hourly(conn)
+
+    # one row per customer, maintained by save_bill / soft_delete_bill (replaces SELECT DISTINCT over bills)
+    customers_exist = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='customers'"
+    ).fetchone()
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS customers (
+        cid TEXT PRIMARY KEY,
+        first_seen TEXT,
+        last_seen TEXT,
+        bill_count INTEGER DEFAULT 0,
+        lifetime_spend REAL DEFAULT 0
+      )
+    """)
+    # RFM scores / segment / lifetime value, refreshed nightly by segments.py
+    for col, decl in [("r_score", "INTEGER"), ("f_score", "INTEGER"), ("m_score", "INTEGER"),
+                      ("segment", "TEXT DEFAULT 'New'"), ("ltv", "REAL DEFAULT 0"), ("scored_at", "TEXT")]:
+        if not has_column("customers", col):
+            c.execute(f"ALTER TABLE customers ADD COLUMN {col} {decl}")
+    if not customers_exist:
+        rebuild_customers(conn)
+
+    # one-shot data migrations, numbered in PRAGMA user_version so reruns don't write
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # running counters for open shifts (older DBs left them NULL until end_shift)
+        c.execute("""
+          UPDATE shifts SET
+            bills_count = (SELECT COUNT(*) FROM bills b
+                           WHERE b.employee_cid = shifts.employee_cid AND b.timestamp >= shifts.start_ts),
+            revenue = (SELECT COALESCE(SUM(b.total_amount), 0) FROM bills b
+                       WHERE b.employee_cid = shifts.employee_cid AND b.timestamp >= shifts.start_ts)
+          WHERE end_ts IS NULL AND (bills_count IS NULL OR revenue IS NULL)
+        """)
+        c.execute("PRAGMA user_version = 1")
+
+    # indexes (use try/except for broad SQLite compatibility)
+    for stmt in [
+        "CREATE INDEX idx_bills_ts ON bills(timestamp)",
+        "CREATE INDEX idx_bills_emp_ts ON bills(employee_cid, timestamp)",
+        "CREATE INDEX idx_bills_cust_ts ON bills(customer_cid, timestamp)",
+        "CREATE INDEX idx_bills_hood_ts ON bills(hood, timestamp)",
+        "CREATE INDEX idx_memberships_dop ON memberships(dop)",
+        "CREATE INDEX idx_membership_hist_exp ON membership_history(expired_at)",
+        "CREATE INDEX idx_employees_hood ON employees(hood)",
+        "CREATE INDEX idx_shifts_emp_active ON shifts(employee_cid, end_ts)",
+        "CREATE INDEX idx_loyalty_points ON loyalty(points)",
+        "CREATE INDEX idx_loyalty_ledger_cust ON loyalty_ledger(customer_cid, id)",
+        "CREATE INDEX idx_loyalty_ledger_bill ON loyalty_ledger(bill_id)",
+        "CREATE INDEX idx_bills_settlement_ts ON bills(settlement_id, timestamp)",
+        "CREATE INDEX idx_settlement_adj_period ON settlement_adjustments(period_id, employee_cid)",
+        "CREATE INDEX idx_customers_segment_ltv ON customers(segment, ltv)",
+        "CREATE INDEX idx_customers_ltv ON customers(ltv)",
+        "CREATE INDEX idx_memberships_tier ON memberships(tier)",
+        "CREATE INDEX idx_memberships_expires ON memberships(expires_at)",
+        "CREATE INDEX idx_bills_deleted_id ON bills_deleted(id)",
+        "CREATE INDEX idx_bills_deleted_at ON bills_deleted(deleted_at)",
+        "CREATE INDEX idx_bills_deleted_emp ON bills_deleted(employee_cid, deleted_at)",
+        "CREATE INDEX idx_bills_deleted_by ON bills_deleted(deleted_by, deleted_at)",
+    ]:
+        try:
+            c.execute(stmt)
+        except sqlite3.OperationalError:
+            pass
+
+    conn.commit()
+    conn.close()
+
+
+# ---------- EXPIRE MEMBERSHIPS ----------
+def purge_expired_memberships():
+    """
+    Move expired memberships to membership_history. Runs on every rerun, so
+    it first looks (read-only, one probe of idx_memberships_expires) and only
+    takes the write lock when something has expired; returns True if it purged.
+    """
+    now_str = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+    conn = connect()
+    try:
+        due = conn.execute("SELECT 1 FROM memberships WHERE expires_at <= ? LIMIT 1", (now_str,)).fetchone()
+    finally:
+        conn.close()
+    if not due:
+        return False
+    write_txn("purge_expired_memberships", _purge_expired_memberships)
+    return True
+
+
+def _purge_expired_memberships(conn):
+    # two range scans on idx_memberships_expires
+    now_str = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute("""
+        INSERT INTO membership_history (customer_cid, tier, dop, expired_at)
+        SELECT customer_cid, tier, dop, expires_at FROM memberships WHERE expires_at <= ?
+    """, (now_str,))
+    conn.execute("DELETE FROM memberships WHERE expires_at <= ?", (now_str,))
+
+
+# ---------- REFERENCE DATA CACHE ----------
+# Employees and hoods change a few times a week but are read on almost every
+# rerun, so they are loaded once per database into a process-wide cache that
+# every session shares. The helpers that write them call
+# invalidate_reference() after commit; the TTL only covers edits made by
+# another process.
+REF_CACHE_TTL_S = 300
+
+_ref_lock = threading.Lock()
+_ref_cache = {}     # db path -> (loaded monotonic, {"employees": {cid: (name, rank, hood)}, "hoods": {name: location}})
+_ref_gen = defaultdict(int)
+
+
+def invalidate_reference(path=None):
+    path = path or current_db_path()
+    with _ref_lock:
+        _ref_gen[path] += 1
+        _ref_cache.pop(path, None)
+
+
+def _reference():
+    path = current_db_path()
+    with _ref_lock:
+        hit, gen = _ref_cache.get(path), _ref_gen[path]
+    if hit and time.monotonic() - hit[0] < REF_CACHE_TTL_S:
+        return hit[1]
+    conn = connect()
+    try:
+        ref = {
+            "employees": {cid: (name, rank or "Trainee", hood)
+                          for cid, name, rank, hood in conn.execute("SELECT cid, name, rank, hood FROM employees")},
+            "hoods": dict(conn.execute("SELECT name, location FROM hoods")),
+        }
+    finally:
+        conn.close()
+    with _ref_lock:
+        if _ref_gen[path] == gen:   # a write landed while loading: serve this copy, don't keep it
+            _ref_cache[path] = (time.monotonic(), ref)
+    return ref
+
+
+def get_employee_directory():
+    """{cid: (name, rank, hood)} for every employee, from the reference cache."""
+    return dict(_reference()["employees"])
+
+
+# ---------- HELPERS ----------
+def get_employee_rank(cid):
+    emp = _reference()["employees"].get(cid)
+    return emp[1] if emp else "Trainee"
+
+
+def audit(action, table_name, row_id, actor, old_values=None, new_values=None):
+    write_txn("audit", lambda conn: _audit(conn, action, table_name, row_id, actor, old_values, new_values))
+
+
+def _audit(conn, action, table_name, row_id, actor, old_values=None, new_values=None):
+    """Audit inside the caller's transaction, so the entry commits with the change."""
+    conn.execute("""
+      INSERT INTO audit_log (action, table_name, row_id, actor, ts, old_values, new_values)
+      VALUES (?,?,?,?,?,?,?)
+    """, (
+        action, table_name, str(row_id), actor,
+        datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"),
+        json.dumps(old_values) if old_values is not None else None,
+        json.dumps(new_values) if new_values is not None else None
+    ))
+
+
+def add_loyalty_points(customer_cid, points, actor="?", note=None):
+    """Admin adjustment (positive or negative); a deduction never takes the balance below zero."""
+    def op(conn):
+        pts = points
+        if pts < 0:
+            pts = max(pts, -max(_loyalty_balance(conn, customer_cid), 0))
+        if pts:
+            _loyalty_entry(conn, customer_cid, "adjust", pts, actor=actor, note=note)
+        return pts
+    if not points:
+        return 0
+    return write_txn("add_loyalty_points", op)
+
+
+def _add_loyalty_points(conn, customer_cid, points, bill_id=None):
+    _loyalty_entry(conn, customer_cid, "earn", points, bill_id=bill_id)
+
+
+def _loyalty_entry(conn, customer_cid, kind, points, bill_id=None, actor=None, note=None):
+    """Append to the ledger and move the materialized balance, in the caller's transaction."""
+    conn.execute("""
+        INSERT INTO loyalty_ledger (customer_cid, kind, points, bill_id, ts, actor, note)
+        VALUES (?,?,?,?,?,?,?)
+    """, (customer_cid, kind, points, bill_id, datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"), actor, note))
+    # single UPSERT: no read-then-write window between two cashiers
+    conn.execute("""
+        INSERT INTO loyalty (customer_cid, points) VALUES (?, ?)
+        ON CONFLICT(customer_cid) DO UPDATE SET points = points + excluded.points
+    """, (customer_cid, points))
+
+
+def _loyalty_balance(conn, customer_cid):
+    row = conn.execute("SELECT points FROM loyalty WHERE customer_cid=?", (customer_cid,)).fetchone()
+    return row[0] if row else 0
+
+
+def redeemable_points(points, total):
+    """Points that can actually be spent on a bill of `total` (no change is given)."""
+    return max(0, min(int(points), int(total // LOYALTY_REDEEM_RS)))
+
+
+def snapshot_loyalty():
+    """
+    Roll the ledger forward into loyalty_snapshots for customers with new
+    entries; returns how many snapshots moved. Run nightly by maintenance.
+    """
+    def op(conn):
+        now = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+        return conn.execute("""
+          INSERT INTO loyalty_snapshots (customer_cid, ledger_id, points, taken_at)
+          SELECT l.customer_cid, MAX(l.id), COALESCE(s.points, 0) + SUM(l.points), ?
+          FROM loyalty_ledger l
+          LEFT JOIN loyalty_snapshots s ON s.customer_cid = l.customer_cid
+          WHERE l.id > COALESCE(s.ledger_id, 0)
+          GROUP BY l.customer_cid
+          ON CONFLICT(customer_cid) DO UPDATE SET
+            ledger_id = excluded.ledger_id, points = excluded.points, taken_at = excluded.taken_at
+        """, (now,)).rowcount
+    return write_txn("snapshot_loyalty", op)
+
+
+def get_ledger_balance(cid):
+    """Balance from the books (snapshot + later ledger deltas), to check the materialized one."""
+    conn = connect()
+    row = conn.execute("""
+        SELECT COALESCE((SELECT points FROM loyalty_snapshots WHERE customer_cid = ?), 0)
+             + COALESCE((SELECT SUM(points) FROM loyalty_ledger
+                         WHERE customer_cid = ?
+                           AND id > COALESCE((SELECT ledger_id FROM loyalty_snapshots WHERE customer_cid = ?), 0)), 0)
+    """, (cid, cid, cid)).fetchone()
+    conn.close()
+    return row[0]
+
+
+def reconcile_loyalty():
+    """Reset the materialized balances from snapshots + deltas; returns the number of rows corrected."""
+    def op(conn):
+        conn.execute("""
+          CREATE TEMP TABLE _ledger_bal AS
+          SELECT cid, SUM(pts) AS points FROM (
+            SELECT customer_cid AS cid, points AS pts FROM loyalty_snapshots
+            UNION ALL
+            SELECT l.customer_cid, l.points FROM loyalty_ledger l
+            LEFT JOIN loyalty_snapshots s ON s.customer_cid = l.customer_cid
+            WHERE l.id > COALESCE(s.ledger_id, 0)
+          ) GROUP BY cid
+        """)
+        try:
+            fixed = conn.execute("""
+              INSERT INTO loyalty (customer_cid, points)
+              SELECT b.cid, b.points FROM _ledger_bal b
+              LEFT JOIN loyalty l ON l.customer_cid = b.cid
+              WHERE l.points IS NOT b.points
+              ON CONFLICT(customer_cid) DO UPDATE SET points = excluded.points
+            """).rowcount
+        finally:
+            conn.execute("DROP TABLE _ledger_bal")
+        return fixed
+    return write_txn("reconcile_loyalty", op)
+
+
+def expire_loyalty(days=None):
+    """Expire whole balances idle for `days` (default LOYALTY_EXPIRE_DAYS, 0 = off); returns customers expired."""
+    days = LOYALTY_EXPIRE_DAYS if days is None else days
+    if days <= 0:
+        return 0
+
+    def op(conn):
+        cutoff = (datetime.now(IST) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        rows = conn.execute("""
+          SELECT l.customer_cid, l.points FROM loyalty l
+          WHERE l.points > 0
+            AND (SELECT MAX(ts) FROM loyalty_ledger g WHERE g.customer_cid = l.customer_cid) < ?
+        """, (cutoff,)).fetchall()
+        for cid, pts in rows:
+            _loyalty_entry(conn, cid, "expire", -pts, actor="system", note=f"idle {days} days")
+        return len(rows)
+    return write_txn("expire_loyalty", op)
+
+
+def get_loyalty_ledger(cid, limit=200):
+    conn = connect()
+    rows = conn.execute("""
+        SELECT id, ts, kind, points, bill_id, actor, note FROM loyalty_ledger
+        WHERE customer_cid = ? ORDER BY id DESC LIMIT ?
+    """, (cid, limit)).fetchall()
+    conn.close()
+    return rows
+
+
+def rebuild_bills_hourly(conn):
+    """Recompute the hourly rollup from scratch (migrations, bulk loads)."""
+    conn.execute("DELETE FROM bills_hourly")
+    conn.execute("""
+      INSERT INTO bills_hourly (bucket, employee_cid, billing_type, hood, bills, revenue, commission, tax)
+      SELECT substr(timestamp, 1, 13), COALESCE(employee_cid, ''), COALESCE(billing_type, ''),
+             COALESCE(hood, 'No Hood'),
+             COUNT(*), COALESCE(SUM(total_amount), 0), COALESCE(SUM(commission), 0), COALESCE(SUM(tax), 0)
+      FROM bills
+      GROUP BY 1, 2, 3, 4
+    """)
+
+
+def rebuild_customers(conn):
+    """Recompute the customers table from bills (migrations, bulk loads)."""
+    conn.execute("DELETE FROM customers")
+    conn.execute("""
+      INSERT INTO customers (cid, first_seen, last_seen, bill_count, lifetime_spend, ltv)
+      SELECT customer_cid, MIN(timestamp), MAX(timestamp), COUNT(*), COALESCE(SUM(total_amount), 0),
+             COALESCE(SUM(total_amount), 0)
+      FROM bills
+      WHERE customer_cid IS NOT NULL AND customer_cid != ''
+      GROUP BY customer_cid
+    """)
+
+
+def _customer_add_bill(conn, cust, ts, amt):
+    conn.execute("""
+        INSERT INTO customers (cid, first_seen, last_seen, bill_count, lifetime_spend, ltv) VALUES (?, ?, ?, 1, ?, ?)
+        ON CONFLICT(cid) DO UPDATE SET
+          first_seen = MIN(first_seen, excluded.first_seen),
+          last_seen = MAX(last_seen, excluded.last_seen),
+          bill_count = bill_count + 1,
+          lifetime_spend = lifetime_spend + excluded.lifetime_spend,
+          ltv = ltv + excluded.ltv
+    """, (cust, ts, ts, amt or 0, amt or 0))
+
+
+def _customer_remove_bills(conn, cust, bills, amt, min_ts, max_ts):
+    """
+    Take `bills` deleted bills (total `amt`, timestamps within min_ts..max_ts)
+    off their customer; first/last seen are re-read from bills only when they move.
+    """
+    row = conn.execute("SELECT first_seen, last_seen, bill_count FROM customers WHERE cid=?", (cust,)).fetchone()
+    if not row:
+        return
+    first, last, n = row
+    if n <= bills:
+        conn.execute("DELETE FROM customers WHERE cid=?", (cust,))
+        return
+    if min_ts <= first or max_ts >= last:
+        # idx_bills_cust_ts: two index probes
+        first, last = conn.execute(
+            "SELECT MIN(timestamp), MAX(timestamp) FROM bills WHERE customer_cid=?", (cust,)
+        ).fetchone()
+    conn.execute("""
+        UPDATE customers SET bill_count = bill_count - ?, lifetime_spend = lifetime_spend - ?,
+                             ltv = ltv - ?, first_seen = ?, last_seen = ?
+        WHERE cid = ?
+    """, (bills, amt or 0, amt or 0, first, last, cust))
+
+
+ROLLUP_UPSERT = """
+    INSERT INTO bills_hourly (bucket, employee_cid, billing_type, hood, bills, revenue, commission, tax)
+    VALUES (substr(?, 1, 13), COALESCE(?, ''), COALESCE(?, ''), COALESCE(?, 'No Hood'), ?, ?, ?, ?)
+    ON CONFLICT(bucket, employee_cid, billing_type, hood) DO UPDATE SET
+      bills = bills + excluded.bills,
+      revenue = revenue + excluded.revenue,
+      commission = commission + excluded.commission,
+      tax = tax + excluded.tax
+"""
+
+
+def _rollup_bill(conn, ts, emp, btype, hood, bills, revenue, commission, tax):
+    """Apply a bill (or its reversal, with negative deltas) to the hourly rollup."""
+    conn.execute(ROLLUP_UPSERT, (ts, emp, btype, hood, bills, revenue, commission, tax))
+
+
+NO_COMMISSION_TYPES = ("UPGRADES", "MEMBERSHIP")
+NO_COMMISSION_ITEMS = frozenset({"Harness", "NOS"})
+
+
+def is_no_commission(btype, det):
+    # Commission rules:
+    # - No commission/tax on UPGRADES and MEMBERSHIP
+    # - No commission/tax on ITEMS if ONLY Harness and/or NOS are present
+    # (rerate.no_commission_mask is the vectorized twin; keep them in step)
+    if btype in NO_COMMISSION_TYPES:
+        return True
+    if btype == "ITEMS":
+        no_commission_items = NO_COMMISSION_ITEMS
+        item_names = []
+        if det:
+            try:
+                # items come before any " | Redeemed ..." note
+                items = det.split(" | ")[0]
+                item_names = [i.strip().split("×")[0] for i in items.split(",") if i.strip()]
+            except Exception:
+                item_names = []
+        if item_names and all(name in no_commission_items for name in item_names):
+            return True
+    return False
+
+
+BILL_TYPES = ["ITEMS", "UPGRADES", "REPAIR", "CUSTOMIZATION"]
+REPAIR_TYPES = ["Normal Repair", "Advanced Repair"]
+
+
+def price_bill(btype, items=None, base=0.0, parts=0, repair_type="Normal Repair", tier=None):
+    """
+    Total and details text for a bill, priced exactly like the bill form.
+    items: {item name: qty} for ITEMS; base: the base amount for UPGRADES,
+    CUSTOMIZATION and normal repairs; parts: parts count for advanced repairs;
+    tier: the customer's active membership tier (for its discount).
+    """
+    total, det = 0.0, ""
+    if btype == "ITEMS":
+        sel = {i: q for i, q in (items or {}).items() if q}
+        unknown = [i for i in sel if i not in ITEM_PRICES]
+        if unknown:
+            raise ValueError(f"Unknown item(s): {', '.join(unknown)}")
+        total = sum(ITEM_PRICES[i] * q for i, q in sel.items())
+        det = ", ".join(f"{i}×{q}" for i, q in sel.items())
+    elif btype == "UPGRADES":
+        total = base * 1.5
+        det = f"Upgrade: ₹{base}"
+    elif btype == "REPAIR":
+        if repair_type == "Normal Repair":
+            total = base + LABOR
+            det = f"Normal Repair: ₹{base}+₹{LABOR}"
+        elif repair_type == "Advanced Repair":
+            total = parts * PART_COST
+            det = f"Advanced Repair: {parts}×₹{PART_COST}"
+        else:
+            raise ValueError(f"Unknown repair type: {repair_type}")
+    elif btype == "CUSTOMIZATION":
+        total = base * 2
+        det = f"Customization: ₹{base}×2"
+    else:
+        raise ValueError(f"Unknown billing type: {btype}")
+
+    if tier:
+        disc = MEMBERSHIP_DISCOUNTS.get(tier, {}).get(btype, 0)
+        if disc > 0:
+            total *= (1 - disc)
+            det += f" | {tier} discount {int(disc * 100)}%"
+    return total, det
+
+
+def save_bill(emp, cust, btype, det, amt, redeem_points=0):
+    """
+    Record a bill; returns its id. redeem_points are spent from the
+    customer's balance as a discount (LOYALTY_REDEEM_RS each) in the same
+    transaction; ValueError if the balance doesn't cover them.
+    """
+    return write_txn("save_bill", lambda conn: _save_bill(conn, emp, cust, btype, det, amt, redeem_points))
+
+
+def _save_bill(conn, emp, cust, btype, det, amt, redeem_points=0):
+    now_ist = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+    redeem_points = redeemable_points(redeem_points, amt) if cust else 0
+    if redeem_points:
+        balance = _loyalty_balance(conn, cust)
+        if balance < redeem_points:
+            raise ValueError(f"{cust} has {balance} loyalty points, cannot redeem {redeem_points}")
+        discount = redeem_points * LOYALTY_REDEEM_RS
+        amt -= discount
+    no_commission = is_no_commission(btype, det)
+    if redeem_points:
+        # no thousands separator: details are split on "," into items
+        det = f"{det} | Redeemed {redeem_points} pts -₹{discount:.2f}"
+    # hood is frozen onto the bill so later reassignments don't rewrite history
+    row = conn.execute("SELECT rank, hood FROM employees WHERE cid = ?", (emp,)).fetchone()
+    rank = row[0] if row else "Trainee"
+    hood = (row[1] if row else None) or "No Hood"
+
+    if no_commission:
+        commission = 0.0
+        tax = 0.0
+    else:
+        comm_rate = COMMISSION_RATES.get(rank, 0)
+        commission = amt * comm_rate
+        tax = commission * TAX_RATE
+
+    bill_id = conn.execute("""
+        INSERT INTO bills
+          (employee_cid, customer_cid, billing_type, details, total_amount, timestamp, commission, tax, hood)
+        VALUES (?,?,?,?,?,?,?,?,?)
+    """, (emp, cust, btype, det, amt, now_ist, commission, tax, hood)).lastrowid
+    _rollup_bill(conn, now_ist, emp, btype, hood, 1, amt, commission, tax)
+    if cust:
+        _customer_add_bill(conn, cust, now_ist, amt)
+    # running counters on the employee's open shift (same transaction as the bill)
+    conn.execute("""
+        UPDATE shifts SET bills_count = COALESCE(bills_count, 0) + 1,
+                          revenue = COALESCE(revenue, 0) + ?
+        WHERE employee_cid = ? AND end_ts IS NULL
+    """, (amt, emp))
+
+    if redeem_points:
+        _loyalty_entry(conn, cust, "redeem", -redeem_points, bill_id=bill_id)
+    # Loyalty on non-membership bills (on what was actually paid)
+    if btype != "MEMBERSHIP" and cust:
+        points = int(amt // LOYALTY_EARN_PER_RS)
+        if points > 0:
+            _add_loyalty_points(conn, cust, points, bill_id=bill_id)
+    return bill_id
+
+
+def add_employee(cid, name, rank="Trainee"):
+    def op(conn):
+        conn.execute("INSERT INTO employees (cid, name, rank) VALUES (?,?,?)", (cid, name, rank))
+    try:
+        write_txn("add_employee", op)
+        return True
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        invalidate_reference()
+
+
+def delete_employee(cid):
+    write_txn("delete_employee", lambda conn: conn.execute("DELETE FROM employees WHERE cid = ?", (cid,)))
+    invalidate_reference()
+
+
+def update_employee(cid, name=None, rank=None, hood=None, actor="?"):
+    def op(conn):
+        before = _employee_details(conn, cid)
+        if name is not None:
+            conn.execute("UPDATE employees SET name = ? WHERE cid = ?", (name, cid))
+        if rank is not None:
+            conn.execute("UPDATE employees SET rank = ? WHERE cid = ?", (rank, cid))
+        if hood is not None:
+            conn.execute("UPDATE employees SET hood = ? WHERE cid = ?", (hood, cid))
+        _audit(conn, "UPDATE_EMP", "employees", cid, actor, before, _employee_details(conn, cid))
+    write_txn("update_employee", op)
+    invalidate_reference()
+
+
+def _employee_details(conn, cid):
+    row = conn.execute("SELECT name, rank, hood FROM employees WHERE cid = ?", (cid,)).fetchone()
+    if row:
+        return {"name": row[0], "rank": row[1], "hood": row[2]}
+    return None
+
+
+def get_employee_details(cid):
+    emp = _reference()["employees"].get(cid)
+    return {"name": emp[0], "rank": emp[1], "hood": emp[2]} if emp else None
+
+
+def get_all_employee_cids():
+    return [(cid, emp[0]) for cid, emp in _reference()["employees"].items()]
+
+
+def add_membership(cust, tier):
+    now = datetime.now(IST)
+    write_txn("add_membership", lambda conn: conn.execute(
+        "INSERT OR REPLACE INTO memberships (customer_cid, tier, dop, expires_at) VALUES (?,?,?,?)",
+        (cust, tier, now.strftime("%Y-%m-%d %H:%M:%S"), membership_expiry(tier, now))
+    ))
+
+
+def get_membership(cust):
+    """The customer's membership if it hasn't expired yet (whether or not the purge has run)."""
+    conn = connect()
+    row = conn.execute(
+        "SELECT tier, dop, expires_at FROM memberships WHERE customer_cid = ? AND expires_at > ?",
+        (cust, datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"))
+    ).fetchone()
+    conn.close()
+    return {"tier": row[0], "dop": row[1], "expires_at": row[2]} if row else None
+
+
+def get_all_memberships():
+    """(customer_cid, tier, dop, expires_at), soonest to expire first."""
+    conn = connect()
+    rows = conn.execute("SELECT customer_cid, tier, dop, expires_at FROM memberships ORDER BY expires_at").fetchall()
+    conn.close()
+    return rows
+
+
+def get_expiring_memberships(hours=24):
+    """Active memberships expiring within `hours`, soonest first (range scan on expires_at)."""
+    now = datetime.now(IST)
+    conn = connect()
+    rows = conn.execute("""
+        SELECT customer_cid, tier, dop, expires_at FROM memberships
+        WHERE expires_at > ? AND expires_at <= ? ORDER BY expires_at
+    """, (now.strftime("%Y-%m-%d %H:%M:%S"), (now + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S"))).fetchall()
+    conn.close()
+    return rows
+
+
+def get_past_memberships():
+    conn = connect()
+    rows = conn.execute("""
+        SELECT customer_cid, tier, dop, expired_at
+        FROM membership_history
+        ORDER BY expired_at DESC
+    """).fetchall()
+    conn.close()
+    return rows
+
+
+def get_billing_summary_by_cid(cid):
+    conn = connect_report()
+    summary = {}
+    for bt in ["ITEMS", "UPGRADES", "REPAIR", "CUSTOMIZATION", "MEMBERSHIP"]:
+        amt = conn.execute(
+            "SELECT SUM(total_amount) FROM bills WHERE employee_cid=? AND billing_type=?",
+            (cid, bt)
+        ).fetchone()[0] or 0.0
+        summary[bt] = amt
+    total = conn.execute("SELECT SUM(total_amount) FROM bills WHERE employee_cid=?", (cid,)).fetchone()[0] or 0.0
+    conn.close()
+    return summary, total
+
+
+def get_employee_bills(cid):
+    conn = connect()
+    rows = conn.execute("""
+        SELECT id, customer_cid, billing_type, details,
+               total_amount, timestamp, commission, tax
+        FROM bills WHERE employee_cid=?
+        ORDER BY timestamp DESC
+    """, (cid,)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_employee_bills_page(cid, start_str=None, end_str=None, btype=None, after=None, limit=50):
+    """
+    One page of an employee's bills, newest first, keyset-paginated on
+    (timestamp, id) over idx_bills_emp_ts. `after` is the cursor returned with
+    the previous page; returns (rows, next_cursor or None).
+    """
+    sql = f"SELECT {_BILL_COLS} FROM bills WHERE employee_cid = ?"
+    params = [cid]
+    if start_str:
+        sql += " AND timestamp >= ?"
+        params.append(start_str)
+    if end_str:
+        sql += " AND timestamp <= ?"
+        params.append(end_str)
+    if btype:
+        sql += " AND billing_type = ?"
+        params.append(btype)
+    if after:
+        sql += " AND (timestamp, id) < (?, ?)"
+        params += list(after)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    conn = connect()
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    conn.close()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, ((rows[-1][6], rows[-1][0]) if more else None)
+
+
+def get_bill_by_id(bill_id):
+    conn = connect()
+    row = conn.execute("""
+        SELECT id, employee_cid, customer_cid, billing_type, details,
+               total_amount, timestamp, commission, tax, hood
+        FROM bills WHERE id=?
+    """, (bill_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def soft_delete_bill(bill_id, actor):
+    return write_txn("soft_delete_bill", lambda conn: _soft_delete_bill(conn, bill_id, actor))
+
+
+def _soft_delete_bill(conn, bill_id, actor):
+    return _soft_delete_bills(conn, [bill_id], actor) == 1
+
+
+def soft_delete_bills(bill_ids, actor):
+    """Soft-delete many bills in one transaction with one summarised audit entry; returns how many went."""
+    return write_txn("soft_delete_bills", lambda conn: _soft_delete_bills(conn, bill_ids, actor))
+
+
+_BILL_COLS = ("id, employee_cid, customer_cid, billing_type, details, total_amount, timestamp, "
+              "commission, tax, hood, settlement_id")
+_SELECTED = "id IN (SELECT id FROM temp._bill_ids)"
+
+
+def _select_bill_ids(conn, bill_ids):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _bill_ids (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp._bill_ids")
+    conn.executemany("INSERT OR IGNORE INTO temp._bill_ids (id) VALUES (?)", ((int(i),) for i in bill_ids))
+
+
+def _soft_delete_bills(conn, bill_ids, actor):
+    """
+    Set-based soft delete: the selected bills move to bills_deleted and every
+    side effect (settlement adjustments, hourly rollup, open-shift counters,
+    customers, loyalty) is reversed with one statement per table.
+    """
+    _select_bill_ids(conn, bill_ids)
+    rows = conn.execute(f"SELECT {_BILL_COLS} FROM bills WHERE {_SELECTED} ORDER BY id").fetchall()
+    if not rows:
+        return 0
+    now = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute(f"""
+      INSERT INTO bills_deleted ({_BILL_COLS}, deleted_by, deleted_at)
+      SELECT {_BILL_COLS}, ?, ? FROM bills WHERE {_SELECTED}
+    """, (actor, now))
+    # already paid out: the closed period stays as it was, the correction is recorded against it
+    conn.execute(f"""
+      INSERT INTO settlement_adjustments
+        (period_id, employee_cid, bill_id, reason, bills, gross, commission, tax, net_payout, created_at, actor)
+      SELECT settlement_id, employee_cid, id, 'DELETE_BILL', -1, -COALESCE(total_amount, 0),
+             -COALESCE(commission, 0), -COALESCE(tax, 0), -(COALESCE(commission, 0) - COALESCE(tax, 0)), ?, ?
+      FROM bills WHERE {_SELECTED} AND settlement_id IS NOT NULL
+    """, (now, actor))
+    conn.execute(f"""
+      INSERT INTO bills_hourly (bucket, employee_cid, billing_type, hood, bills, revenue, commission, tax)
+      SELECT substr(timestamp, 1, 13), COALESCE(employee_cid, ''), COALESCE(billing_type, ''),
+             COALESCE(hood, 'No Hood'), -COUNT(*), -COALESCE(SUM(total_amount), 0),
+             -COALESCE(SUM(commission), 0), -COALESCE(SUM(tax), 0)
+      FROM bills WHERE {_SELECTED}
+      GROUP BY 1, 2, 3, 4
+      ON CONFLICT(bucket, employee_cid, billing_type, hood) DO UPDATE SET
+        bills = bills + excluded.bills,
+        revenue = revenue + excluded.revenue,
+        commission = commission + excluded.commission,
+        tax = tax + excluded.tax
+    """)
+    # only bills made during the still-open shift count towards its running totals
+    conn.execute(f"""
+      UPDATE shifts SET
+        bills_count = MAX(COALESCE(bills_count, 0) - (
+          SELECT COUNT(*) FROM bills b
+          WHERE b.{_SELECTED} AND b.employee_cid = shifts.employee_cid AND b.timestamp >= shifts.start_ts), 0),
+        revenue = MAX(COALESCE(revenue, 0) - (
+          SELECT COALESCE(SUM(b.total_amount), 0) FROM bills b
+          WHERE b.{_SELECTED} AND b.employee_cid = shifts.employee_cid AND b.timestamp >= shifts.start_ts), 0)
+      WHERE end_ts IS NULL AND employee_cid IN (SELECT employee_cid FROM bills WHERE {_SELECTED})
+    """)
+    per_customer = conn.execute(f"""
+      SELECT customer_cid, COUNT(*), SUM(total_amount), MIN(timestamp), MAX(timestamp)
+      FROM bills WHERE {_SELECTED} AND customer_cid IS NOT NULL AND customer_cid != ''
+      GROUP BY customer_cid
+    """).fetchall()
+    conn.execute(f"DELETE FROM bills WHERE {_SELECTED}")
+    for cust, n, amt, min_ts, max_ts in per_customer:
+        _customer_remove_bills(conn, cust, n, amt, min_ts, max_ts)
+    # give back redeemed points and take back earned ones
+    for lcid, bid, pts in conn.execute("""
+        SELECT customer_cid, bill_id, SUM(points) FROM loyalty_ledger
+        WHERE bill_id IN (SELECT id FROM temp._bill_ids)
+        GROUP BY customer_cid, bill_id
+    """).fetchall():
+        if pts:
+            _loyalty_entry(conn, lcid, "adjust", -pts, bill_id=bid, actor=actor, note="bill deleted")
+
+    keys = [c.strip() for c in _BILL_COLS.split(",")]
+    if len(rows) == 1:
+        _audit(conn, "DELETE_BILL", "bills", rows[0][0], actor, old_values=dict(zip(keys, rows[0])), new_values=None)
+    else:
+        _audit(conn, "DELETE_BILLS", "bills", f"{len(rows)} bills", actor, old_values={
+            "ids": [r[0] for r in rows],
+            "bills": len(rows),
+            "total_amount": sum(r[5] or 0 for r in rows),
+            "commission": sum(r[7] or 0 for r in rows),
+            "tax": sum(r[8] or 0 for r in rows),
+            "employees": sorted({r[1] for r in rows if r[1]}),
+        }, new_values=None)
+    return len(rows)
+
+
+def restore_bills(bill_ids, actor):
+    """Undelete bills from bills_deleted in one transaction; returns how many were restored."""
+    return write_txn("restore_bills", lambda conn: _restore_bills(conn, bill_ids, actor))
+
+
+def _restore_bills(conn, bill_ids, actor):
+    """
+    Put soft-deleted bills back under their original ids (the latest deletion
+    of each, skipping ids that are live again) and re-apply what deleting them
+    reversed: rollup, open-shift counters, customers and loyalty.
+    ValueError, restoring nothing, if any id belongs to a closed settlement
+    period (already paid out; its deletion stays as an adjustment) or to a
+    period archived by reset_all_billings.
+    """
+    _select_bill_ids(conn, bill_ids)
+    settled = conn.execute(f"""
+      SELECT id, settlement_id FROM bills_deleted
+      WHERE {_SELECTED} AND settlement_id IS NOT NULL AND id NOT IN (SELECT id FROM bills)
+      GROUP BY id ORDER BY id
+    """).fetchall()
+    if settled:
+        raise ValueError("Bill(s) " + ", ".join(f"{i} (period #{p})" for i, p in settled)
+                         + " were settled in a closed period and can't be restored.")
+    # ids that are neither live nor deleted: only worth looking through the archives for those
+    if conn.execute("""
+      SELECT 1 FROM temp._bill_ids
+      WHERE id NOT IN (SELECT id FROM bills) AND id NOT IN (SELECT id FROM bills_deleted) LIMIT 1
+    """).fetchone():
+        for (archive,) in conn.execute("SELECT name FROM bill_archives ORDER BY created_at").fetchall():
+            for table in (archive, companion_archive(archive, "bills_deleted")):
+                if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+                    continue
+                ids = [r[0] for r in conn.execute(
+                    f'SELECT DISTINCT id FROM "{table}" WHERE {_SELECTED} ORDER BY id').fetchall()]
+                if ids:
+                    raise ValueError(f"Bill(s) {', '.join(map(str, ids))} belong to the period archived as "
+                                     f"{archive} by a reset and can't be restored.")
+    conn.execute("DROP TABLE IF EXISTS temp._restore")
+    conn.execute(f"""
+      CREATE TEMP TABLE _restore AS
+      SELECT {_BILL_COLS} FROM bills_deleted
+      WHERE rowid IN (SELECT MAX(rowid) FROM bills_deleted WHERE {_SELECTED} GROUP BY id)
+        AND id NOT IN (SELECT id FROM bills)
+    """)
+    rows = conn.execute(f"SELECT {_BILL_COLS} FROM temp._restore ORDER BY id").fetchall()
+    if not rows:
+        conn.execute("DROP TABLE temp._restore")
+        return 0
+    conn.execute(f"INSERT INTO bills ({_BILL_COLS}) SELECT {_BILL_COLS} FROM temp._restore")
+    conn.execute("DELETE FROM bills_deleted WHERE id IN (SELECT id FROM temp._restore)")
+    conn.execute("""
+      INSERT INTO bills_hourly (bucket, employee_cid, billing_type, hood, bills, revenue, commission, tax)
+      SELECT substr(timestamp, 1, 13), COALESCE(employee_cid, ''), COALESCE(billing_type, ''),
+             COALESCE(hood, 'No Hood'), COUNT(*), COALESCE(SUM(total_amount), 0),
+             COALESCE(SUM(commission), 0), COALESCE(SUM(tax), 0)
+      FROM temp._restore WHERE 1
+      GROUP BY 1, 2, 3, 4
+      ON CONFLICT(bucket, employee_cid, billing_type, hood) DO UPDATE SET
+        bills = bills + excluded.bills,
+        revenue = revenue + excluded.revenue,
+        commission = commission + excluded.commission,
+        tax = tax + excluded.tax
+    """)
+    conn.execute("""
+      UPDATE shifts SET
+        bills_count = COALESCE(bills_count, 0) + (
+          SELECT COUNT(*) FROM temp._restore r
+          WHERE r.employee_cid = shifts.employee_cid AND r.timestamp >= shifts.start_ts),
+        revenue = COALESCE(revenue, 0) + (
+          SELECT COALESCE(SUM(r.total_amount), 0) FROM temp._restore r
+          WHERE r.employee_cid = shifts.employee_cid AND r.timestamp >= shifts.start_ts)
+      WHERE end_ts IS NULL AND employee_cid IN (SELECT employee_cid FROM temp._restore)
+    """)
+    conn.execute("""
+      INSERT INTO customers (cid, first_seen, last_seen, bill_count, lifetime_spend, ltv)
+      SELECT customer_cid, MIN(timestamp), MAX(timestamp), COUNT(*), COALESCE(SUM(total_amount), 0),
+             COALESCE(SUM(total_amount), 0)
+      FROM temp._restore WHERE customer_cid IS NOT NULL AND customer_cid != ''
+      GROUP BY customer_cid
+      ON CONFLICT(cid) DO UPDATE SET
+        first_seen = MIN(first_seen, excluded.first_seen),
+        last_seen = MAX(last_seen, excluded.last_seen),
+        bill_count = bill_count + excluded.bill_count,
+        lifetime_spend = lifetime_spend + excluded.lifetime_spend,
+        ltv = ltv + excluded.ltv
+    """)
+    # back to what the bill originally earned / redeemed
+    for lcid, bid, pts in conn.execute("""
+        SELECT customer_cid, bill_id,
+               COALESCE(SUM(CASE WHEN kind IN ('earn', 'redeem') THEN points END), 0) - SUM(points)
+        FROM loyalty_ledger
+        WHERE bill_id IN (SELECT id FROM temp._restore)
+        GROUP BY customer_cid, bill_id
+    """).fetchall():
+        if pts:
+            _loyalty_entry(conn, lcid, "adjust", pts, bill_id=bid, actor=actor, note="bill restored")
+    conn.execute("DROP TABLE temp._restore")
+
+    keys = [c.strip() for c in _BILL_COLS.split(",")]
+    if len(rows) == 1:
+        _audit(conn, "RESTORE_BILL", "bills", rows[0][0], actor, old_values=None, new_values=dict(zip(keys, rows[0])))
+    else:
+        _audit(conn, "RESTORE_BILLS", "bills", f"{len(rows)} bills", actor, old_values=None, new_values={
+            "ids": [r[0] for r in rows],
+            "bills": len(rows),
+            "total_amount": sum(r[5] or 0 for r in rows),
+            "commission": sum(r[7] or 0 for r in rows),
+            "tax": sum(r[8] or 0 for r in rows),
+        })
+    return len(rows)
+
+
+def get_deleted_bills(bill_id=None, employee_cid=None, deleted_by=None, start_str=None, end_str=None, limit=200):
+    """Soft-deleted bills, most recently deleted first; every filter has its own index."""
+    sql = f"SELECT {_BILL_COLS}, deleted_by, deleted_at FROM bills_deleted WHERE 1"
+    params = []
+    for clause, val in [("id = ?", bill_id), ("employee_cid = ?", employee_cid), ("deleted_by = ?", deleted_by),
+                        ("deleted_at >= ?", start_str), ("deleted_at <= ?", end_str)]:
+        if val not in (None, ""):
+            sql += f" AND {clause}"
+            params.append(val)
+    sql += " ORDER BY deleted_at DESC LIMIT ?"
+    conn = connect()
+    rows = conn.execute(sql, params + [limit]).fetchall()
+    conn.close()
+    return rows
+
+
+def get_all_customers():
+    conn = connect()
+    rows = conn.execute("SELECT cid FROM customers ORDER BY cid").fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+def search_customers(prefix="", limit=25, offset=0):
+    """
+    Customers whose CID starts with `prefix` (case-sensitive), in CID order:
+    a range scan on the primary key, one page at a time. Returns
+    (rows, has_more); rows are (cid, first_seen, last_seen, bill_count, lifetime_spend).
+    """
+    sql = "SELECT cid, first_seen, last_seen, bill_count, lifetime_spend FROM customers"
+    params = []
+    if prefix:
+        sql += " WHERE cid >= ? AND cid < ?"
+        params += [prefix, prefix + "\U0010ffff"]
+    sql += " ORDER BY cid LIMIT ? OFFSET ?"
+    conn = connect()
+    rows = conn.execute(sql, params + [limit + 1, offset]).fetchall()
+    conn.close()
+    return rows[:limit], len(rows) > limit
+
+
+def get_customer_bills(cid):
+    conn = connect()
+    try:
+        rows = conn.execute("""
+            SELECT employee_cid, billing_type, details,
+                   total_amount, timestamp, commission, tax
+            FROM bills
+            WHERE customer_cid = ?
+            ORDER BY timestamp DESC
+        """, (cid,)).fetchall()
+        return rows
+    finally:
+        conn.close()
+
+
+CUSTOMER_SORTS = {"ltv": "c.ltv", "spend": "c.lifetime_spend", "bills": "c.bill_count",
+                  "last_seen": "c.last_seen", "points": "COALESCE(l.points, 0)"}
+
+
+def find_customers(segment=None, tier=None, min_points=0, sort="ltv", limit=100, offset=0):
+    """
+    Customers filtered by RFM segment, active membership tier ("None" = no
+    membership) and minimum loyalty points, best first. One query; the
+    segment filter and the default LTV order come from idx_customers_segment_ltv.
+    A membership past expires_at counts as none even before the purge runs.
+    """
+    now_str = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+    where, params = [], []
+    if segment:
+        where.append("c.segment = ?")
+        params.append(segment)
+    if tier == "None":
+        where.append("m.tier IS NULL")
+    elif tier:
+        where.append("m.tier = ?")
+        params.append(tier)
+    if min_points:
+        where.append("l.points >= ?")
+        params.append(min_points)
+    conn = connect_report()
+    rows = conn.execute(f"""
+        SELECT c.cid, c.segment, c.r_score, c.f_score, c.m_score, c.bill_count, c.lifetime_spend, c.ltv,
+               c.last_seen, m.tier, COALESCE(l.points, 0)
+        FROM customers c
+        LEFT JOIN memberships m ON m.customer_cid = c.cid AND m.expires_at > ?
+        LEFT JOIN loyalty l ON l.customer_cid = c.cid
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY {CUSTOMER_SORTS[sort]} DESC
+        LIMIT ? OFFSET ?
+    """, [now_str] + params + [limit, offset]).fetchall()
+    conn.close()
+    return rows
+
+
+def get_segment_summary():
+    """(segment, customers, lifetime_spend, ltv) for every segment."""
+    conn = connect_report()
+    rows = conn.execute("""
+        SELECT COALESCE(segment, 'New'), COUNT(*), COALESCE(SUM(lifetime_spend), 0), COALESCE(SUM(ltv), 0)
+        FROM customers GROUP BY 1 ORDER BY 4 DESC
+    """).fetchall()
+    conn.close()
+    return rows
+
+
+def get_total_billing():
+    conn = connect_report()
+    total = conn.execute("SELECT SUM(total_amount) FROM bills").fetchone()[0] or 0.0
+    conn.close()
+    return total
+
+
+def get_bill_count():
+    conn = connect_report()
+    cnt = conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0] or 0
+    conn.close()
+    return cnt
+
+
+def get_total_commission_and_tax():
+    conn = connect_report()
+    row = conn.execute("SELECT SUM(commission), SUM(tax) FROM bills").fetchone()
+    conn.close()
+    return (row[0] or 0.0, row[1] or 0.0)
+
+
+# ---------- HOODS HELPERS ----------
+def add_hood(name, location):
+    try:
+        write_txn("add_hood", lambda conn: conn.execute(
+            "INSERT INTO hoods (name, location) VALUES (?,?)", (name, location)))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        invalidate_reference()
+
+
+def update_hood(old_name, new_name, new_location, actor="?"):
+    write_txn("update_hood", lambda conn: _update_hood(conn, old_name, new_name, new_location, actor))
+    invalidate_reference()
+
+
+def _update_hood(conn, old_name, new_name, new_location, actor="?"):
+    c = conn.cursor()
+    c.execute("UPDATE hoods SET name=?, location=? WHERE name=?", (new_name, new_location, old_name))
+    c.execute("UPDATE employees SET hood=? WHERE hood=?", (new_name, old_name))
+    if new_name != old_name:
+        # a rename is the same hood, so carry its sales history over
+        c.execute("UPDATE bills SET hood=? WHERE hood=?", (new_name, old_name))
+        c.execute("""
+          INSERT INTO bills_hourly (bucket, employee_cid, billing_type, hood, bills, revenue, commission, tax)
+          SELECT bucket, employee_cid, billing_type, ?, bills, revenue, commission, tax
+          FROM bills_hourly WHERE hood=?
+          ON CONFLICT(bucket, employee_cid, billing_type, hood) DO UPDATE SET
+            bills = bills + excluded.bills,
+            revenue = revenue + excluded.revenue,
+            commission = commission + excluded.commission,
+            tax = tax + excluded.tax
+        """, (new_name, old_name))
+        c.execute("DELETE FROM bills_hourly WHERE hood=?", (old_name,))
+        # audited because it rewrites past sales (report caches key off the audit log)
+        _audit(conn, "RENAME_HOOD", "hoods", new_name, actor, old_values={"name": old_name})
+
+
+def delete_hood(name):
+    def op(conn):
+        conn.execute("DELETE FROM hoods WHERE name=?", (name,))
+        conn.execute("UPDATE employees SET hood='No Hood' WHERE hood=?", (name,))
+    write_txn("delete_hood", op)
+    invalidate_reference()
+
+
+def get_all_hoods():
+    return list(_reference()["hoods"].items())
+
+
+def assign_employees_to_hood(hood, cids):
+    write_txn("assign_employees_to_hood", lambda conn: conn.executemany(
+        "UPDATE employees SET hood=? WHERE cid=?", [(hood, cid) for cid in cids]))
+    invalidate_reference()
+
+
+def get_employees_by_hood(hood):
+    return [(cid, emp[0]) for cid, emp in _reference()["employees"].items() if emp[2] == hood]
+
+
+# ---------- BILL LOGS HELPER ----------
+def get_bill_logs(start_str=None, end_str=None):
+    conn = connect_report()
+    c = conn.cursor()
+    base_sql = """
+        SELECT
+            b.id, b.timestamp,
+            COALESCE(e.name, 'Unknown') AS emp_name,
+            b.employee_cid,
+            COALESCE(b.hood, e.hood, 'No Hood') AS hood,
+            b.customer_cid, b.billing_type, b.details,
+            b.total_amount, b.commission, b.tax
+        FROM bills b
+        LEFT JOIN employees e ON e.cid = b.employee_cid
+    """
+    params = ()
+    if start_str and end_str:
+        base_sql += " WHERE b.timestamp >= ? AND b.timestamp <= ?"
+        params = (start_str, end_str)
+    base_sql += " ORDER BY b.timestamp DESC"
+    rows = c.execute(base_sql, params).fetchall()
+    conn.close()
+    return rows
+
+
+# ---------- SHIFT HELPERS ----------
+def _ensure_shifts_schema(conn):
+    """
+    Ensure the 'shifts' table exists and contains all required columns.
+    Safe to call repeatedly; will migrate older tables forward.
+    """
+    cur = conn.cursor()
+    # Does the table exist?
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='shifts'")
+    exists = cur.fetchone() is not None
+
+    if not exists:
+        # Fresh create with full schema
+        cur.executescript("""
+            CREATE TABLE IF NOT EXISTS shifts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_cid TEXT,
+                start_ts TEXT,
+                end_ts TEXT,
+                duration_minutes INTEGER,
+                bills_count INTEGER,
+                revenue REAL
+            );
+        """)
+    else:
+        # Migrate missing columns on older DBs
+        cols = {row[1] for row in cur.execute("PRAGMA table_info('shifts')").fetchall()}
+        if "employee_cid" not in cols:
+            cur.execute("ALTER TABLE shifts ADD COLUMN employee_cid TEXT")
+        if "start_ts" not in cols:
+            cur.execute("ALTER TABLE shifts ADD COLUMN start_ts TEXT")
+        if "end_ts" not in cols:
+            cur.execute("ALTER TABLE shifts ADD COLUMN end_ts TEXT")
+        if "duration_minutes" not in cols:
+            cur.execute("ALTER TABLE shifts ADD COLUMN duration_minutes INTEGER")
+        if "bills_count" not in cols:
+            cur.execute("ALTER TABLE shifts ADD COLUMN bills_count INTEGER")
+        if "revenue" not in cols:
+            cur.execute("ALTER TABLE shifts ADD COLUMN revenue REAL")
+
+    # Create the index if missing (works on old SQLite too)
+    try:
+        cur.execute("CREATE INDEX idx_shifts_emp_active ON shifts(employee_cid, end_ts)")
+    except sqlite3.OperationalError:
+        # Index already exists (or older SQLite message) – ignore
+        pass
+
+    conn.commit()
+
+def start_shift(employee_cid, actor="?"):
+    if not (employee_cid and str(employee_cid).strip()):
+        return False, "Please enter your CID first."
+
+    # the open-shift check and the insert share one write transaction, so two
+    # quick clicks can't open two shifts (schema is ensured at boot)
+    def op(conn):
+        active = conn.execute(
+            "SELECT id FROM shifts WHERE employee_cid=? AND end_ts IS NULL",
+            (employee_cid,)
+        ).fetchone()
+        if active:
+            return False, "Shift already active."
+
+        conn.execute(
+            "INSERT INTO shifts (employee_cid, start_ts, bills_count, revenue) VALUES (?,?,0,0)",
+            (employee_cid, datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"))
+        )
+        _audit(conn, "SHIFT_START", "shifts", "-", actor,
+               new_values={"employee_cid": employee_cid})
+        return True, "Shift started."
+    return write_txn("start_shift", op)
+
+
+def end_shift(employee_cid, actor="?"):
+    if not (employee_cid and str(employee_cid).strip()):
+        return False, "Please enter your CID first."
+
+    def op(conn):
+        row = conn.execute(
+            "SELECT id, start_ts, bills_count, revenue FROM shifts WHERE employee_cid=? AND end_ts IS NULL",
+            (employee_cid,)
+        ).fetchone()
+        if not row:
+            return False, "No active shift."
+
+        # bills_count / revenue are kept up to date by save_bill and soft_delete_bill
+        sid, start_ts, bcount, revenue = row
+        bcount, revenue = (bcount or 0, revenue or 0.0)
+        now = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+
+        dt_start = datetime.strptime(start_ts, "%Y-%m-%d %H:%M:%S")
+        dt_end = datetime.strptime(now, "%Y-%m-%d %H:%M:%S")
+        duration = int((dt_end - dt_start).total_seconds() // 60)
+
+        conn.execute("""
+            UPDATE shifts SET end_ts=?, duration_minutes=?, bills_count=?, revenue=?
+            WHERE id=?
+        """, (now, duration, bcount, revenue, sid))
+        _audit(conn, "SHIFT_END", "shifts", sid, actor,
+               old_values={"start_ts": start_ts},
+               new_values={"end_ts": now, "bills": bcount, "revenue": revenue})
+        return True, "Shift ended."
+    return write_txn("end_shift", op)
+
+
+# ---------- ADMIN VIEW QUERIES ----------
+def _archive_swap(conn, table, archive):
+    """Rename `table` to `archive` and put an empty copy (same schema, indexes, id sequence) in its place."""
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()[0]
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL", (table,)
+    ).fetchall()
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()
+
+    conn.execute(f'ALTER TABLE {table} RENAME TO "{archive}"')
+    # indexes follow the renamed table; the archive is a snapshot, so it doesn't need them
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    conn.execute(table_sql)
+    for _, sql in indexes:
+        conn.execute(sql)
+    if seq:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, seq[0]))
+
+
+# archived alongside bills on a reset: their rows point at the archived bills
+ARCHIVED_WITH_BILLS = ("bills_deleted", "loyalty_ledger")
+
+
+def companion_archive(archive, table):
+    """Name `table` was archived under together with bills archive `archive`."""
+    return archive.replace("bills_archive_", f"{table}_archive_", 1)
+
+
+def reset_all_billings(actor="?"):
+    """
+    Archive-and-swap: the live bills table is renamed to bills_archive_<ts> and
+    an empty one with the same schema and indexes takes its place, in one short
+    transaction (no row-by-row DELETE). Ids keep counting from where they were.
+    Soft-deleted bills and the loyalty ledger (whose rows point at those
+    bills) are archived the same way as bills_deleted_archive_<ts> and
+    loyalty_ledger_archive_<ts>, so nothing from before the reset can be
+    restored into the new period. Everything derived from bills or the
+    ledger (hourly rollup, customers, balances, snapshots, open-shift
+    counters) starts again from zero.
+    Returns the archive table name, or None when there was nothing to reset.
+    """
+    def op(conn):
+        n, revenue = conn.execute("SELECT COALESCE(SUM(bills), 0), COALESCE(SUM(revenue), 0) FROM bills_hourly").fetchone()
+        if not n and not conn.execute("SELECT 1 FROM bills LIMIT 1").fetchone() \
+                and not any(conn.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone() for t in ARCHIVED_WITH_BILLS):
+            return None
+        archive = "bills_archive_" + datetime.now(IST).strftime("%Y%m%d_%H%M%S")
+        names = [archive] + [companion_archive(archive, t) for t in ARCHIVED_WITH_BILLS]
+        if conn.execute(f"SELECT 1 FROM sqlite_master WHERE name IN ({','.join('?' * len(names))})",
+                        names).fetchone():
+            archive += f"_{int(time.time() * 1000) % 1000:03d}"
+        points = conn.execute("SELECT COALESCE(SUM(points), 0) FROM loyalty").fetchone()[0]
+
+        _archive_swap(conn, "bills", archive)
+        for table in ARCHIVED_WITH_BILLS:
+            _archive_swap(conn, table, companion_archive(archive, table))
+        conn.execute("DELETE FROM bills_hourly")
+        rebuild_customers(conn)
+        conn.execute("DELETE FROM loyalty")
+        conn.execute("DELETE FROM loyalty_snapshots")
+        conn.execute("UPDATE shifts SET bills_count = 0, revenue = 0 WHERE end_ts IS NULL")
+        conn.execute("""
+          INSERT INTO bill_archives (name, created_at, created_by, bills, revenue) VALUES (?,?,?,?,?)
+        """, (archive, datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"), actor, n, revenue))
+        _audit(conn, "RESET_BILLINGS", "bills", archive, actor,
+               old_values={"bills": n, "revenue": revenue, "loyalty_points": points},
+               new_values={"archive": archive,
+                           **{f"{t}_archive": companion_archive(archive, t) for t in ARCHIVED_WITH_BILLS}})
+        return archive
+    return write_txn("reset_all_billings", op)
+
+
+def get_bill_archives():
+    conn = connect()
+    rows = conn.execute(
+        "SELECT name, created_at, created_by, bills, revenue FROM bill_archives ORDER BY created_at DESC"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def drop_bill_archive(name, actor="?"):
+    def op(conn):
+        row = conn.execute("SELECT bills, revenue FROM bill_archives WHERE name=?", (name,)).fetchone()
+        if not row:
+            return False
+        conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+        for table in ARCHIVED_WITH_BILLS:
+            conn.execute(f'DROP TABLE IF EXISTS "{companion_archive(name, table)}"')
+        conn.execute("DELETE FROM bill_archives WHERE name=?", (name,))
+        _audit(conn, "DROP_ARCHIVE", "bill_archives", name, actor, old_values={"bills": row[0], "revenue": row[1]})
+        return True
+    return write_txn("drop_bill_archive", op)
+
+
+def get_live_stats(now):
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
+    last_hour = (now - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = connect()
+    cur = conn.cursor()
+    stats = {
+        "today_count": cur.execute("SELECT COUNT(*) FROM bills WHERE timestamp>=?",
+                                   (today_start,)).fetchone()[0] or 0,
+        "today_amount": cur.execute("SELECT COALESCE(SUM(total_amount),0) FROM bills WHERE timestamp>=?",
+                                    (today_start,)).fetchone()[0] or 0.0,
+        "hr_count": cur.execute("SELECT COUNT(*) FROM bills WHERE timestamp>=?",
+                                (last_hour,)).fetchone()[0] or 0,
+        "hr_amount": cur.execute("SELECT COALESCE(SUM(total_amount),0) FROM bills WHERE timestamp>=?",
+                                 (last_hour,)).fetchone()[0] or 0.0,
+        "top_types": cur.execute("""
+            SELECT billing_type, COUNT(*), COALESCE(SUM(total_amount),0)
+            FROM bills WHERE timestamp>=?
+            GROUP BY billing_type ORDER BY 3 DESC
+        """, (today_start,)).fetchall(),
+        "active_shifts": cur.execute("""
+            SELECT employee_cid, start_ts, COALESCE(bills_count, 0), COALESCE(revenue, 0)
+            FROM shifts WHERE end_ts IS NULL
+        """).fetchall(),
+    }
+    conn.close()
+    return stats
+
+
+def delete_membership(cid):
+    write_txn("delete_membership", lambda conn: conn.execute(
+        "DELETE FROM memberships WHERE customer_cid = ?", (cid,)))
+
+
+def get_bills_stamp():
+    """
+    Cheap change marker for results derived from bills: new bills bump
+    MAX(id), and deletes, restores and re-rates are audited.
+    """
+    conn = connect_report()
+    row = conn.execute("SELECT (SELECT MAX(id) FROM bills), (SELECT MAX(id) FROM audit_log)").fetchone()
+    conn.close()
+    return tuple(row)
+
+
+def get_employee_rankings(metric):
+    """
+    All-time revenue per employee ("Total Sales" or one billing type), every
+    employee included (0.0 without sales): one grouped pass over bills_hourly.
+    """
+    where, params = "", []
+    if metric != "Total Sales":
+        where, params = "WHERE billing_type = ?", [metric]
+    conn = connect_report()
+    rows = conn.execute(f"""
+      SELECT e.cid, e.name, COALESCE(h.revenue, 0)
+      FROM employees e
+      LEFT JOIN (SELECT employee_cid, SUM(revenue) AS revenue FROM bills_hourly {where} GROUP BY employee_cid) h
+        ON h.employee_cid = e.cid
+      ORDER BY e.rowid
+    """, params).fetchall()
+    conn.close()
+    return [{"Employee": f"{name} ({cid})", metric: float(val)} for cid, name, val in rows]
+
+
+def get_employee_sales_since(cutoff_str):
+    results = []
+    conn = connect_report()
+    for cid, name in get_all_employee_cids():
+        q = ("SELECT SUM(total_amount) FROM bills "
+             "WHERE employee_cid=? AND timestamp>=?")
+        total = conn.execute(q, (cid, cutoff_str)).fetchone()[0] or 0.0
+        results.append((f"{name} ({cid})", total))
+    conn.close()
+    return results
+
+
+def get_hood_war(start_str, end_str):
+    # revenue is attributed to the hood recorded on each bill at sale time
+    conn = connect_report()
+    rows = conn.execute("""
+      SELECT hood, COALESCE(SUM(revenue),0) AS revenue
+      FROM (
+        SELECT hood, revenue FROM bills_hourly
+        WHERE bucket >= substr(?, 1, 13) AND bucket <= substr(?, 1, 13)
+        UNION ALL
+        SELECT name, 0 FROM hoods
+      )
+      GROUP BY hood
+      ORDER BY revenue DESC
+    """, (start_str, end_str)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_top_loyalty(limit=100):
+    conn = connect_report()
+    rows = conn.execute(
+        "SELECT customer_cid, points FROM loyalty ORDER BY points DESC LIMIT ?", (limit,)
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def get_loyalty_points(cid):
+    conn = connect()
+    row = conn.execute("SELECT points FROM loyalty WHERE customer_cid=?", (cid,)).fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+def get_employee_shifts(cid, start_str, end_str):
+    # only that employee's shifts, latest first
+    conn = connect()
+    rows = conn.execute(
+        """
+        SELECT s.id,
+               s.employee_cid,
+               COALESCE(e.name, 'Unknown') AS employee_name,
+               s.start_ts, s.end_ts,
+               s.duration_minutes, s.bills_count, s.revenue
+        FROM shifts s
+        LEFT JOIN employees e ON e.cid = s.employee_cid
+        WHERE s.employee_cid = ?
+          AND s.start_ts >= ?
+          AND s.start_ts <= ?
+        ORDER BY COALESCE(s.end_ts, s.start_ts) DESC
+        """,
+        (cid, start_str, end_str)
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def get_live_shifts():
+    conn = connect()
+    rows = conn.execute(
+        """
+        SELECT s.employee_cid, COALESCE(e.name, 'Unknown') AS employee_name, s.start_ts,
+               COALESCE(s.bills_count, 0), COALESCE(s.revenue, 0)
+        FROM shifts s
+        LEFT JOIN employees e ON e.cid = s.employee_cid
+        WHERE s.end_ts IS NULL
+        ORDER BY s.start_ts ASC
+        """
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def get_audit_log(limit=500):
+    conn = connect()
+    rows = conn.execute("""
+      SELECT action, table_name, row_id, actor, ts, old_values, new_values
+      FROM audit_log ORDER BY ts DESC LIMIT ?
+    """, (limit,)).fetchall()
+    conn.close()
+    return rows
+
+
+# ---------- REPORTING (CLI / API) ----------
+# Range reports read the hourly rollup, so they are exact for hour-aligned
+# ranges (whole days, as the CLI uses) and never scan bills.
+def get_payroll(start_str, end_str):
+    """Per-employee bills, gross, commission, tax and net payout in the range."""
+    conn = connect_report()
+    rows = conn.execute("""
+      SELECT h.employee_cid, COALESCE(e.name, 'Unknown'), COALESCE(e.rank, ''), COALESCE(e.hood, 'No Hood'),
+             SUM(h.bills), SUM(h.revenue), SUM(h.commission), SUM(h.tax),
+             SUM(h.commission) - SUM(h.tax)
+      FROM bills_hourly h
+      LEFT JOIN employees e ON e.cid = h.employee_cid
+      WHERE h.bucket >= substr(?, 1, 13) AND h.bucket <= substr(?, 1, 13)
+      GROUP BY h.employee_cid
+      HAVING SUM(h.bills) != 0
+      ORDER BY 9 DESC
+    """, (start_str, end_str)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_daily_close(day_str):
+    """Totals for one day (YYYY-MM-DD): overall, by billing type and by hood, plus shift activity."""
+    lo, hi = f"{day_str} 00", f"{day_str} 23"
+    conn = connect_report()
+    cur = conn.cursor()
+    totals = cur.execute("""
+      SELECT COALESCE(SUM(bills), 0), COALESCE(SUM(revenue), 0), COALESCE(SUM(commission), 0), COALESCE(SUM(tax), 0)
+      FROM bills_hourly WHERE bucket BETWEEN ? AND ?
+    """, (lo, hi)).fetchone()
+    by_type = cur.execute("""
+      SELECT billing_type, SUM(bills), SUM(revenue) FROM bills_hourly
+      WHERE bucket BETWEEN ? AND ? GROUP BY billing_type ORDER BY 3 DESC
+    """, (lo, hi)).fetchall()
+    by_hood = cur.execute("""
+      SELECT hood, SUM(bills), SUM(revenue) FROM bills_hourly
+      WHERE bucket BETWEEN ? AND ? GROUP BY hood ORDER BY 3 DESC
+    """, (lo, hi)).fetchall()
+    shifts = cur.execute("""
+      SELECT COUNT(*), COALESCE(SUM(duration_minutes), 0) FROM shifts
+      WHERE end_ts >= ? AND end_ts < date(?, '+1 day')
+    """, (day_str, day_str)).fetchone()
+    deleted = cur.execute("""
+      SELECT COUNT(*), COALESCE(SUM(total_amount), 0) FROM bills_deleted
+      WHERE deleted_at >= ? AND deleted_at < date(?, '+1 day')
+    """, (day_str, day_str)).fetchone()
+    conn.close()
+    return {
+        "day": day_str,
+        "bills": totals[0], "revenue": totals[1], "commission": totals[2], "tax": totals[3],
+        "by_type": by_type,
+        "by_hood": by_hood,
+        "shifts_closed": shifts[0], "shift_minutes": shifts[1],
+        "bills_deleted": deleted[0], "deleted_amount": deleted[1],
+    }
+
+
+def iter_bills(start_str, end_str, batch=5000):
+    """Stream bills in the range (timestamp order) without loading them all."""
+    conn = connect_report()
+    try:
+        cur = conn.execute("""
+          SELECT id, employee_cid, customer_cid, billing_type, details, total_amount,
+                 timestamp, commission, tax, hood
+          FROM bills WHERE timestamp >= ? AND timestamp <= ?
+          ORDER BY timestamp
+        """, (start_str, end_str))
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+# ---------- SETTLEMENTS ----------
+def close_settlement(end_str, actor="?"):
+    """
+    Settle every unsettled bill up to end_str: lock the bills to a new period
+    and write per-employee totals in one aggregate pass. Returns the period
+    id, or None when there was nothing to settle.
+    """
+    def op(conn):
+        first = conn.execute(
+            "SELECT MIN(timestamp) FROM bills WHERE settlement_id IS NULL AND timestamp <= ?", (end_str,)
+        ).fetchone()[0]
+        if first is None:
+            return None
+        now = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+        pid = conn.execute(
+            "INSERT INTO settlement_periods (period_start, period_end, closed_at, closed_by) VALUES (?,?,?,?)",
+            (first, end_str, now, actor)
+        ).lastrowid
+        conn.execute("UPDATE bills SET settlement_id = ? WHERE settlement_id IS NULL AND timestamp <= ?",
+                     (pid, end_str))
+        conn.execute("""
+          INSERT INTO settlements (period_id, employee_cid, bills, gross, commission, tax, net_payout)
+          SELECT ?, COALESCE(employee_cid, ''), COUNT(*), COALESCE(SUM(total_amount), 0),
+                 COALESCE(SUM(commission), 0), COALESCE(SUM(tax), 0),
+                 COALESCE(SUM(commission), 0) - COALESCE(SUM(tax), 0)
+          FROM bills WHERE settlement_id = ?
+          GROUP BY COALESCE(employee_cid, '')
+        """, (pid, pid))
+        conn.execute("""
+          UPDATE settlement_periods SET
+            (bills, gross, commission, tax, net_payout) = (
+              SELECT COALESCE(SUM(bills), 0), COALESCE(SUM(gross), 0), COALESCE(SUM(commission), 0),
+                     COALESCE(SUM(tax), 0), COALESCE(SUM(net_payout), 0)
+              FROM settlements WHERE period_id = ?)
+          WHERE id = ?
+        """, (pid, pid))
+        totals = conn.execute(
+            "SELECT period_start, period_end, bills, gross, net_payout FROM settlement_periods WHERE id = ?", (pid,)
+        ).fetchone()
+        _audit(conn, "CLOSE_SETTLEMENT", "settlement_periods", pid, actor, new_values=dict(zip(
+            ["period_start", "period_end", "bills", "gross", "net_payout"], totals)))
+        return pid
+    return write_txn("close_settlement", op)
+
+
+def get_settlement_periods(limit=100):
+    """Closed periods, newest first, with their adjustment totals."""
+    conn = connect()
+    rows = conn.execute("""
+      SELECT p.id, p.period_start, p.period_end, p.closed_at, p.closed_by,
+             p.bills, p.gross, p.commission, p.tax, p.net_payout,
+             COALESCE(a.n, 0), COALESCE(a.net, 0)
+      FROM settlement_periods p
+      LEFT JOIN (
+        SELECT period_id, COUNT(*) AS n, SUM(net_payout) AS net
+        FROM settlement_adjustments GROUP BY period_id
+      ) a ON a.period_id = p.id
+      ORDER BY p.id DESC LIMIT ?
+    """, (limit,)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_settlement(period_id):
+    """Per-employee settled totals for a period, plus adjustments recorded since."""
+    conn = connect()
+    rows = conn.execute("""
+      SELECT s.employee_cid, COALESCE(e.name, 'Unknown'), s.bills, s.gross, s.commission, s.tax, s.net_payout,
+             COALESCE(a.net, 0), s.net_payout + COALESCE(a.net, 0)
+      FROM settlements s
+      LEFT JOIN employees e ON e.cid = s.employee_cid
+      LEFT JOIN (
+        SELECT employee_cid, SUM(net_payout) AS net
+        FROM settlement_adjustments WHERE period_id = ? GROUP BY employee_cid
+      ) a ON a.employee_cid = s.employee_cid
+      WHERE s.period_id = ?
+      ORDER BY s.net_payout DESC
+    """, (period_id, period_id)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_settlement_adjustments(period_id):
+    conn = connect()
+    rows = conn.execute("""
+      SELECT id, employee_cid, bill_id, reason, gross, commission, tax, net_payout, created_at, actor
+      FROM settlement_adjustments WHERE period_id = ? ORDER BY id
+    """, (period_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_unsettled_summary(end_str):
+    """Bills/gross/net that close_settlement(end_str) would settle."""
+    conn = connect()
+    row = conn.execute("""
+      SELECT COUNT(*), COALESCE(SUM(total_amount), 0), COALESCE(SUM(commission) - SUM(tax), 0), MIN(timestamp)
+      FROM bills WHERE settlement_id IS NULL AND timestamp <= ?
+    """, (end_str,)).fetchone()
+    conn.close()
+    return row
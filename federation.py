@@ -0,0 +1,147 @@
+"""
+Cross-garage reports over every location's database (db.LOCATIONS).
+
+open_federation() attaches each garage's file read-only to one in-memory
+connection (schemas g0, g1, ...). Each report aggregates every garage's
+bills_hourly inside its own schema, glues the per-garage results together
+with UNION ALL (tagged with the garage name) and lets SQLite do the final
+grouping, so a group-wide total is one statement. SQLite attaches at most
+MAX_ATTACHED databases per connection.
+
+    python federation.py --from 2026-10-12 --to 2026-10-18
+"""
+import argparse
+import os
+import sqlite3
+import urllib.parse
+from datetime import datetime, timedelta
+
+import db
+import perf
+
+MAX_ATTACHED = 10       # SQLITE_MAX_ATTACHED default
+BUCKET_RANGE = "h.bucket >= substr(?, 1, 13) AND h.bucket <= substr(?, 1, 13)"
+
+
+def open_federation(locations=None):
+    """
+    In-memory connection with each garage attached read-only; returns
+    (conn, [(location, schema), ...]). Garages whose file doesn't exist yet
+    (nobody has logged in there) are left out.
+    """
+    names = list(locations or db.LOCATIONS)
+    if len(names) > MAX_ATTACHED:
+        raise ValueError(f"at most {MAX_ATTACHED} locations can be reported together, got {len(names)}")
+    conn = sqlite3.connect(":memory:", uri=True, factory=perf.connection_factory())
+    shards = []
+    for i, name in enumerate(names):
+        path = os.path.abspath(db.location_path(name))
+        if not os.path.exists(path):
+            continue
+        schema = f"g{i}"
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{urllib.parse.quote(path)}?mode=ro",))
+        if conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name='bills_hourly'").fetchone():
+            shards.append((name, schema))
+        else:
+            conn.execute(f"DETACH DATABASE {schema}")
+    return conn, shards
+
+
+def _union(shards, part, params):
+    """part is one garage's SELECT with {s} for its schema; returns (sql, params) of the UNION ALL."""
+    sql = "\nUNION ALL\n".join(part.format(s=s) for _, s in shards)
+    return sql, [p for name, _ in shards for p in (name, *params)]
+
+
+def _run(locations, build):
+    conn, shards = open_federation(locations)
+    try:
+        if not shards:
+            return []
+        sql, params = build(shards)
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+# ---------- REPORTS ----------
+def group_totals(start_str, end_str, locations=None):
+    """(location, bills, revenue, commission, tax) per garage, biggest first."""
+    def build(shards):
+        inner, params = _union(shards, f"""
+          SELECT ? AS location, COALESCE(SUM(h.bills), 0) AS bills, COALESCE(SUM(h.revenue), 0) AS revenue,
+                 COALESCE(SUM(h.commission), 0) AS commission, COALESCE(SUM(h.tax), 0) AS tax
+          FROM {{s}}.bills_hourly h WHERE {BUCKET_RANGE}
+        """, (start_str, end_str))
+        return f"SELECT location, bills, revenue, commission, tax FROM ({inner}) ORDER BY revenue DESC", params
+    return _run(locations, build)
+
+
+def group_leaderboard(start_str, end_str, limit=25, locations=None):
+    """
+    Employees across every garage by revenue: (employee_cid, name,
+    locations, bills, revenue, commission). Someone billing at two garages
+    is one row with both garages listed.
+    """
+    def build(shards):
+        inner, params = _union(shards, f"""
+          SELECT ? AS location, h.employee_cid, MAX(e.name) AS name, SUM(h.bills) AS bills,
+                 SUM(h.revenue) AS revenue, SUM(h.commission) AS commission
+          FROM {{s}}.bills_hourly h LEFT JOIN {{s}}.employees e ON e.cid = h.employee_cid
+          WHERE {BUCKET_RANGE}
+          GROUP BY h.employee_cid
+        """, (start_str, end_str))
+        return f"""
+          SELECT employee_cid, COALESCE(MAX(name), 'Unknown'), group_concat(location, ', '),
+                 SUM(bills), SUM(revenue), SUM(commission)
+          FROM ({inner})
+          GROUP BY employee_cid
+          HAVING SUM(bills) != 0
+          ORDER BY 5 DESC
+          LIMIT ?
+        """, params + [limit]
+    return _run(locations, build)
+
+
+def group_hood_war(start_str, end_str, by_location=False, locations=None):
+    """
+    Hood revenue across every garage: (hood, revenue), or (location, hood,
+    revenue) with by_location. Hoods with no sales still show with 0.
+    """
+    def build(shards):
+        inner, params = _union(shards, f"""
+          SELECT ? AS location, hood, SUM(revenue) AS revenue FROM (
+            SELECT h.hood, h.revenue FROM {{s}}.bills_hourly h WHERE {BUCKET_RANGE}
+            UNION ALL
+            SELECT name, 0 FROM {{s}}.hoods
+          )
+          GROUP BY hood
+        """, (start_str, end_str))
+        if by_location:
+            return f"SELECT location, hood, revenue FROM ({inner}) ORDER BY location, revenue DESC", params
+        return f"SELECT hood, SUM(revenue) FROM ({inner}) GROUP BY hood ORDER BY 2 DESC", params
+    return _run(locations, build)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Group-wide totals, leaderboard and Hood War across every garage.")
+    p.add_argument("--from", dest="from_", help="first day YYYY-MM-DD (default: 7 days before --to)")
+    p.add_argument("--to", help="last day YYYY-MM-DD (default: today)")
+    p.add_argument("--limit", type=int, default=10)
+    args = p.parse_args()
+    end = args.to or datetime.now(db.IST).strftime("%Y-%m-%d")
+    start = args.from_ or (datetime.strptime(end, "%Y-%m-%d") - timedelta(days=6)).strftime("%Y-%m-%d")
+    start_str, end_str = f"{start} 00:00:00", f"{end} 23:59:59"
+    print(f"{start} .. {end}, locations: {', '.join(db.LOCATIONS)}\n")
+    for loc, bills, revenue, commission, tax in group_totals(start_str, end_str):
+        print(f"  {loc:<20} {bills:>9,} bills  revenue {revenue:>16,.2f}  commission {commission:>14,.2f}")
+    print()
+    for cid, name, locs, bills, revenue, _ in group_leaderboard(start_str, end_str, args.limit):
+        print(f"  {name} ({cid}) [{locs}]: {revenue:,.2f} from {bills:,} bills")
+    print()
+    for hood, revenue in group_hood_war(start_str, end_str):
+        print(f"  {hood or 'No Hood':<20} {revenue:>16,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Concurrent multi-session load test for the write and read paths.
+
+    python loadtest.py --cashiers 12 --readers 4 --duration 30
+    python loadtest.py --db bench_data/bench_100000_s42.db --cashiers 24 --json load.json
+
+Cashier threads mimic the bill form: save_bill most of the time, plus
+add_membership (billed like the membership form) and start/end shift.
+Reader threads run the Live Stats, Bill Logs and Employee Rankings query
+sets. Streamlit serves every session from threads in one process, so
+threads against one SQLite file are a faithful model.
+
+Reports throughput, p50/p95/p99 latency and lock errors per operation.
+The target database is a copy; the source is never modified.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import db
+import synth_data
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lat = defaultdict(list)
+        self.lock_errors = defaultdict(int)
+        self.other_errors = defaultdict(int)
+        self.samples = {}
+
+    def record(self, op, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except sqlite3.OperationalError as e:
+            msg = str(e).lower()
+            with self.lock:
+                if "locked" in msg or "busy" in msg:
+                    self.lock_errors[op] += 1
+                else:
+                    self.other_errors[op] += 1
+                    self.samples.setdefault(op, repr(e))
+            return
+        except Exception as e:
+            with self.lock:
+                self.other_errors[op] += 1
+                self.samples.setdefault(op, repr(e))
+            return
+        ms = (time.perf_counter() - t0) * 1000
+        with self.lock:
+            self.lat[op].append(ms)
+
+
+def _pct(sorted_vals, p):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100 * (len(sorted_vals) - 1)))))
+    return round(sorted_vals[k], 3)
+
+
+# ---------- WORKERS ----------
+def cashier(idx, emp_cid, stop, stats, seed):
+    rng = random.Random(seed + idx)
+    on_shift = False
+    while not stop.is_set():
+        r = rng.random()
+        cust = f"LOAD{rng.randint(0, 5000):05d}"
+        if r < 0.75:
+            amt = float(rng.choice([950, 1200, 2400, 4000, 6000]))
+            stats.record("save_bill", lambda: db.save_bill(
+                emp_cid, cust, "REPAIR", f"Normal Repair: ₹{amt - db.LABOR}+₹{db.LABOR}", amt))
+        elif r < 0.85:
+            tier = rng.choice(list(db.MEMBERSHIP_PRICES))
+
+            def membership():
+                db.add_membership(cust, tier)
+                db.save_bill(emp_cid, cust, "MEMBERSHIP", f"{tier} Membership", db.MEMBERSHIP_PRICES[tier])
+            stats.record("add_membership", membership)
+        else:
+            op = "end_shift" if on_shift else "start_shift"
+            fn = db.end_shift if on_shift else db.start_shift
+            stats.record(op, lambda: fn(emp_cid, actor="loadtest"))
+            on_shift = not on_shift
+        time.sleep(rng.uniform(0, 0.005))
+
+
+def reader(idx, stop, stats, seed):
+    rng = random.Random(seed * 31 + idx)
+    while not stop.is_set():
+        now = datetime.now(db.IST)
+        r = rng.random()
+        if r < 0.4:
+            stats.record("live_stats", lambda: db.get_live_stats(now))
+        elif r < 0.8:
+            start = (now.replace(hour=0, minute=0, second=0) if rng.random() < 0.7
+                     else now - timedelta(days=7)).strftime(TS_FMT)
+            stats.record("bill_logs", lambda: db.get_bill_logs(start, now.strftime(TS_FMT)))
+        else:
+            metric = rng.choice(["Total Sales", "ITEMS", "REPAIR"])
+            stats.record("rankings", lambda: db.get_employee_rankings(metric))
+        time.sleep(rng.uniform(0, 0.02))
+
+
+# ---------- RUN ----------
+def prepare(source, workdir, bills, seed):
+    target = os.path.join(workdir, "loadtest.db")
+    if source:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(source + suffix):
+                shutil.copyfile(source + suffix, target + suffix)
+    else:
+        synth_data.generate(target, seed=seed, bills=bills,
+                            employees=max(20, bills // 2000), customers=max(500, bills // 20))
+    return target
+
+
+def run(target, cashiers, readers, duration, seed):
+    prev_path, db.DB_PATH = db.DB_PATH, target
+    try:
+        db.init_db()
+        conn = sqlite3.connect(target)
+        emps = [r[0] for r in conn.execute("SELECT cid FROM employees ORDER BY cid").fetchall()]
+        # close any open shifts so start/end alternate cleanly
+        conn.execute("UPDATE shifts SET end_ts = start_ts WHERE end_ts IS NULL")
+        conn.commit()
+        conn.close()
+        if len(emps) < cashiers:
+            raise SystemExit(f"need at least {cashiers} employees, database has {len(emps)}")
+
+        stats, stop = Stats(), threading.Event()
+        threads = [threading.Thread(target=cashier, args=(i, emps[i], stop, stats, seed), daemon=True)
+                   for i in range(cashiers)]
+        threads += [threading.Thread(target=reader, args=(i, stop, stats, seed), daemon=True)
+                    for i in range(readers)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(duration)
+        stop.set()
+        for t in threads:
+            t.join(timeout=60)
+        elapsed = time.perf_counter() - t0
+    finally:
+        db.DB_PATH = prev_path
+    return stats, elapsed
+
+
+def report(stats, elapsed, cfg):
+    ops = sorted(set(stats.lat) | set(stats.lock_errors) | set(stats.other_errors))
+    rows = []
+    for op in ops:
+        lat = sorted(stats.lat.get(op, []))
+        rows.append({
+            "op": op,
+            "ok": len(lat),
+            "ops_per_s": round(len(lat) / elapsed, 2) if elapsed else None,
+            "p50_ms": _pct(lat, 50),
+            "p95_ms": _pct(lat, 95),
+            "p99_ms": _pct(lat, 99),
+            "max_ms": round(lat[-1], 3) if lat else None,
+            "lock_errors": stats.lock_errors.get(op, 0),
+            "other_errors": stats.other_errors.get(op, 0),
+        })
+    return {
+        "meta": {**cfg, "elapsed_s": round(elapsed, 3), "sqlite": sqlite3.sqlite_version,
+                 "created_at": datetime.now(db.IST).strftime(TS_FMT)},
+        "totals": {
+            "ok": sum(r["ok"] for r in rows),
+            "ops_per_s": round(sum(r["ok"] for r in rows) / elapsed, 2) if elapsed else None,
+            "lock_errors": sum(r["lock_errors"] for r in rows),
+            "other_errors": sum(r["other_errors"] for r in rows),
+        },
+        "ops": rows,
+        "error_samples": stats.samples,
+    }
+
+
+def print_report(rep):
+    print(f"\n{'op':<16}{'ok':>8}{'ops/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'locked':>8}{'other':>7}")
+    for r in rep["ops"]:
+        def f(v):
+            return f"{v:>9.1f}" if v is not None else f"{'-':>9}"
+        print(f"{r['op']:<16}{r['ok']:>8}{f(r['ops_per_s'])}{f(r['p50_ms'])}{f(r['p95_ms'])}"
+              f"{f(r['p99_ms'])}{f(r['max_ms'])}{r['lock_errors']:>8}{r['other_errors']:>7}")
+    t = rep["totals"]
+    print(f"\ntotal {t['ok']} ops in {rep['meta']['elapsed_s']}s ({t['ops_per_s']}/s), "
+          f"{t['lock_errors']} lock errors, {t['other_errors']} other errors")
+    for op, sample in rep["error_samples"].items():
+        print(f"  {op}: {sample}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Concurrent cashier/dashboard load test.")
+    p.add_argument("--db", help="source database to copy (default: generate one)")
+    p.add_argument("--bills", type=int, default=50_000, help="bills to generate when --db is not given")
+    p.add_argument("--cashiers", type=int, default=12)
+    p.add_argument("--readers", type=int, default=4)
+    p.add_argument("--duration", type=float, default=20.0, help="seconds")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--json", help="write the report here as JSON")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="exoticbill_load_") as workdir:
+        target = prepare(args.db, workdir, args.bills, args.seed)
+        cfg = {"cashiers": args.cashiers, "readers": args.readers,
+               "duration_s": args.duration, "seed": args.seed, "source": args.db or f"synthetic:{args.bills}"}
+        stats, elapsed = run(target, args.cashiers, args.readers, args.duration, args.seed)
+        rep = report(stats, elapsed, cfg)
+    print_report(rep)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Database housekeeping: planner statistics, WAL checkpoints and incremental
+vacuum, run in a low-traffic window with bounded work per run.
+
+    python maintenance.py                 # run the tasks once now
+    python maintenance.py --enable-incremental-vacuum
+
+The app starts a scheduler thread at boot (start_scheduler). It wakes every
+MAINT_CHECK_S and runs once per day inside MAINT_WINDOW (IST hours, e.g.
+"3-6"), and only when the shop is quiet (few bills in the last few
+minutes). Each run's timings and before/after database size are stored in
+maintenance_runs and shown under Maintenance.
+
+Incremental vacuum only works on files created with auto_vacuum=INCREMENTAL
+(db.init_db sets it on new files). An older database reports "none" and the
+vacuum task skips it until it is switched once with
+--enable-incremental-vacuum, which rewrites the whole file with a full
+VACUUM; run that off-hours, it holds the write lock throughout.
+
+Other modules add nightly jobs with register_task(name, fn); fn(conn)
+returns a short detail string. With several garages (db.LOCATIONS) the
+scheduler checks and maintains each location's database separately.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import db
+
+MAINT_WINDOW = os.environ.get("EXOTICBILL_MAINT_WINDOW", "3-6")     # IST hours [start, end)
+MAINT_CHECK_S = 15 * 60
+MAINT_QUIET_MINUTES = 10
+MAINT_QUIET_MAX_BILLS = 3
+MAINT_MIN_GAP_H = 20                 # at most one scheduled run per night
+ANALYSIS_LIMIT = 2000                # rows sampled per index by ANALYZE / optimize
+VACUUM_PAGES_PER_RUN = 4096          # incremental_vacuum budget (16 MB at 4 KB pages)
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+_tasks = []
+_run_lock = threading.Lock()
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def register_task(name, fn):
+    """Add a job to every maintenance run (after the built-in ones)."""
+    if all(n != name for n, _ in _tasks):
+        _tasks.append((name, fn))
+
+
+# ---------- MEASUREMENTS ----------
+def db_size(conn):
+    page_size, pages, free = (conn.execute(f"PRAGMA {p}").fetchone()[0]
+                              for p in ("page_size", "page_count", "freelist_count"))
+    wal = db.current_db_path() + "-wal"
+    return {
+        "bytes": page_size * pages,
+        "free_bytes": page_size * free,
+        "wal_bytes": os.path.getsize(wal) if os.path.exists(wal) else 0,
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0]),
+    }
+
+
+def is_quiet(conn, now=None):
+    now = now or datetime.now(db.IST)
+    since = (now - timedelta(minutes=MAINT_QUIET_MINUTES)).strftime(TS_FMT)
+    recent = conn.execute("SELECT COUNT(*) FROM bills WHERE timestamp >= ?", (since,)).fetchone()[0]
+    return recent <= MAINT_QUIET_MAX_BILLS
+
+
+def in_window(now=None):
+    now = now or datetime.now(db.IST)
+    start, _, end = MAINT_WINDOW.partition("-")
+    start, end = int(start), int(end or start)
+    return start <= now.hour < end if start <= end else (now.hour >= start or now.hour < end)
+
+
+# ---------- TASKS ----------
+def _optimize(conn):
+    conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone():
+        conn.execute("ANALYZE")
+        return "first ANALYZE"
+    # 0x10002: also check tables the current connection hasn't queried
+    conn.execute("PRAGMA optimize=0x10002")
+    return "optimize"
+
+
+def _checkpoint(conn):
+    busy, log, done = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    if busy == 0 and log == done and log > 0:
+        # fully copied back and nobody mid-read: shrink the -wal file too
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return f"{done}/{log} frames, truncated"
+    return f"{done}/{log} frames"
+
+
+def _incremental_vacuum(conn):
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return f"skipped: auto_vacuum is not incremental ({free} free pages)"
+    pages = min(free, VACUUM_PAGES_PER_RUN)
+    if pages:
+        # executescript steps the pragma to completion; execute() frees only one page
+        conn.executescript(f"PRAGMA incremental_vacuum({pages});")
+    return f"released {pages} of {free} free pages"
+
+
+def _loyalty(conn):
+    expired = db.expire_loyalty()
+    return f"{db.snapshot_loyalty():,} snapshots rolled forward, {expired:,} balances expired"
+
+
+BUILTIN_TASKS = [("loyalty", _loyalty), ("optimize", _optimize), ("incremental_vacuum", _incremental_vacuum),
+                 ("checkpoint", _checkpoint)]
+
+
+# ---------- RUNS ----------
+def run_maintenance(trigger="manual", actor="?"):
+    """Run every task once; returns the stored report dict."""
+    with _run_lock:
+        conn = db.connect(timeout=db.WRITE_BUSY_TIMEOUT * 5, isolation_level=None)
+        try:
+            started = datetime.now(db.IST).strftime(TS_FMT)
+            before = db_size(conn)
+            tasks = []
+            for name, fn in BUILTIN_TASKS + _tasks:
+                t0 = time.perf_counter()
+                try:
+                    detail, ok = fn(conn), True
+                except Exception as e:
+                    detail, ok = repr(e), False
+                tasks.append({"task": name, "ok": ok, "ms": round((time.perf_counter() - t0) * 1000, 1),
+                              "detail": detail})
+            after = db_size(conn)
+            report = {"started_at": started, "finished_at": datetime.now(db.IST).strftime(TS_FMT),
+                      "trigger": trigger, "actor": actor, "before": before, "after": after, "tasks": tasks}
+        finally:
+            conn.close()
+    db.write_txn("maintenance_run", lambda c: c.execute("""
+        INSERT INTO maintenance_runs (started_at, finished_at, trigger, actor, size_before, size_after, report)
+        VALUES (?,?,?,?,?,?,?)
+    """, (report["started_at"], report["finished_at"], trigger, actor,
+          before["bytes"], after["bytes"], json.dumps(report))))
+    return report
+
+
+def get_maintenance_runs(limit=20):
+    conn = db.connect()
+    rows = conn.execute("SELECT report FROM maintenance_runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    conn.close()
+    return [json.loads(r[0]) for r in rows]
+
+
+def last_run_at(conn):
+    row = conn.execute("SELECT MAX(started_at) FROM maintenance_runs WHERE trigger='scheduled'").fetchone()
+    return row[0]
+
+
+def enable_incremental_vacuum():
+    """One-off switch of an existing database to incremental auto_vacuum (runs a full VACUUM)."""
+    conn = db.connect(timeout=db.WRITE_BUSY_TIMEOUT * 5, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+# ---------- SCHEDULER ----------
+def maybe_run(now=None):
+    """Scheduled entry point: run only in the window, when quiet, once per night."""
+    now = now or datetime.now(db.IST)
+    if not in_window(now):
+        return None
+    conn = db.connect()
+    try:
+        last = last_run_at(conn)
+        if last and now.replace(tzinfo=None) - datetime.strptime(last, TS_FMT) < timedelta(hours=MAINT_MIN_GAP_H):
+            return None
+        if not is_quiet(conn, now):
+            return None
+    finally:
+        conn.close()
+    return run_maintenance(trigger="scheduled", actor="scheduler")
+
+
+def _loop():
+    while True:
+        time.sleep(MAINT_CHECK_S)
+        for name in db.LOCATIONS:
+            try:
+                with db.location(name):
+                    maybe_run()
+            except Exception:
+                pass
+
+
+def start_scheduler():
+    """Start the maintenance thread once per process (safe to call on every rerun)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_loop, name="exoticbill-maintenance", daemon=True)
+            _scheduler.start()
+    return _scheduler
+
+
+def main():
+    p = argparse.ArgumentParser(description="Run ExoticBill database maintenance.")
+    p.add_argument("--db", help="database file (default: EXOTICBILL_DB or auto_exotic_billing.db)")
+    p.add_argument("--location", choices=list(db.LOCATIONS), help="garage from EXOTICBILL_LOCATIONS")
+    p.add_argument("--enable-incremental-vacuum", action="store_true",
+                   help="switch an existing database to incremental auto_vacuum (full VACUUM, takes a while)")
+    args = p.parse_args()
+    if args.db:
+        db.DB_PATH = args.db
+    if args.location:
+        db.use_location(args.location)
+    db.init_db()
+    import segments  # noqa: F401  (registers the nightly customer_segments task)
+    if args.enable_incremental_vacuum:
+        t0 = time.perf_counter()
+        changed = enable_incremental_vacuum()
+        print(f"{'switched' if changed else 'already incremental'} in {time.perf_counter() - t0:.1f}s")
+    rep = run_maintenance(trigger="cli", actor="cli")
+    mb = 1024 * 1024
+    print(f"size {rep['before']['bytes'] / mb:,.1f} MB -> {rep['after']['bytes'] / mb:,.1f} MB, "
+          f"free {rep['before']['free_bytes'] / mb:,.1f} -> {rep['after']['free_bytes'] / mb:,.1f} MB, "
+          f"wal {rep['before']['wal_bytes'] / mb:,.1f} -> {rep['after']['wal_bytes'] / mb:,.1f} MB")
+    for t in rep["tasks"]:
+        print(f"  {t['task']:<20} {t['ms']:>9.1f} ms  {'ok ' if t['ok'] else 'ERR'} {t['detail']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Per-rerun query tracing.
+
+db.connect() hands out TracedConnection objects while a trace is active in
+the current thread/context. Every statement is recorded with its text, wall
+time (executing it plus fetching its rows), row count and the page section
+it ran in; sections themselves are timed with mark()/section(). finish()
+closes the trace and appends it to a rotating JSONL log (perf_trace.jsonl)
+for offline analysis. A rerun cut short by st.rerun()/st.stop() never
+reaches finish(), so start_trace() closes whatever trace is still open.
+"""
+import contextvars
+import json
+import logging
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from zoneinfo import ZoneInfo
+
+IST = ZoneInfo("Asia/Kolkata")
+LOG_PATH = "perf_trace.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+N_PLUS_ONE_MIN = 5      # same statement shape this many times in one section => N+1
+SQL_LOG_CHARS = 500
+
+_current = contextvars.ContextVar("exoticbill_trace", default=None)
+_logger = None
+
+
+class Trace:
+    def __init__(self, label="", actor=""):
+        self.label = label
+        self.actor = actor
+        self.started = time.perf_counter()
+        self.ts = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+        self.queries = []
+        self.sections = []          # [name, start, end]
+        self.total_ms = None
+
+    @property
+    def section_name(self):
+        if self.sections and self.sections[-1][2] is None:
+            return self.sections[-1][0]
+        return ""
+
+    def mark(self, name):
+        """Close the running section (if any) and start timing `name`."""
+        self.end_section()
+        self.sections.append([name, time.perf_counter(), None])
+
+    def end_section(self):
+        if self.sections and self.sections[-1][2] is None:
+            self.sections[-1][2] = time.perf_counter()
+
+    def close(self):
+        self.end_section()
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self):
+        return {
+            "ts": self.ts,
+            "label": self.label,
+            "actor": self.actor,
+            "total_ms": round(self.total_ms or 0.0, 3),
+            "query_count": len(self.queries),
+            "query_ms": round(sum(q["ms"] for q in self.queries), 3),
+            "sections": [
+                {"name": n, "ms": round(((e or time.perf_counter()) - s) * 1000, 3)}
+                for n, s, e in self.sections
+            ],
+            "queries": [dict(q, sql=q["sql"][:SQL_LOG_CHARS]) for q in self.queries],
+        }
+
+
+# ---------- TRACED SQLITE OBJECTS ----------
+class TracedCursor(sqlite3.Cursor):
+    _record = None
+
+    def _run(self, method, sql, *args):
+        trace = _current.get()
+        t0 = time.perf_counter()
+        try:
+            return method(self, sql, *args)
+        finally:
+            if trace is not None:
+                self._record = {
+                    "sql": " ".join(sql.split()),
+                    "ms": round((time.perf_counter() - t0) * 1000, 3),
+                    "rows": max(self.rowcount, 0),
+                    "section": trace.section_name,
+                }
+                trace.queries.append(self._record)
+
+    def execute(self, sql, params=()):
+        return self._run(sqlite3.Cursor.execute, sql, params)
+
+    def executemany(self, sql, seq):
+        return self._run(sqlite3.Cursor.executemany, sql, seq)
+
+    def executescript(self, script):
+        return self._run(sqlite3.Cursor.executescript, script)
+
+    def _fetch(self, method, *args):
+        """Run a fetch; its rows and time go to the statement that produced them."""
+        if self._record is None:
+            return method(*args)
+        t0 = time.perf_counter()
+        rows = None
+        try:
+            rows = method(*args)
+            return rows
+        finally:
+            self._record["ms"] = round(self._record["ms"] + (time.perf_counter() - t0) * 1000, 3)
+            if isinstance(rows, list):
+                self._record["rows"] += len(rows)
+            elif rows is not None:
+                self._record["rows"] += 1
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        return self._fetch(super().__next__)
+
+
+class TracedConnection(sqlite3.Connection):
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def connection_factory():
+    """Connection class db.connect() should use right now."""
+    return TracedConnection if _current.get() is not None else sqlite3.Connection
+
+
+# ---------- TRACE LIFECYCLE ----------
+def start_trace(label="", actor=""):
+    finish()        # left open by a rerun that ended early; don't let it swallow this one's queries
+    trace = Trace(label, actor)
+    _current.set(trace)
+    return trace
+
+
+def current():
+    return _current.get()
+
+
+def mark(name):
+    trace = _current.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+@contextmanager
+def section(name):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    outer = trace.section_name
+    trace.mark(name)
+    try:
+        yield
+    finally:
+        if outer:
+            trace.mark(outer)
+        else:
+            trace.end_section()
+
+
+def finish(log=True):
+    """Stop tracing for this context; returns the closed Trace (or None)."""
+    trace = _current.get()
+    if trace is None:
+        return None
+    _current.set(None)
+    trace.close()
+    if log:
+        _log(trace)
+    return trace
+
+
+def _log(trace):
+    global _logger
+    try:
+        if _logger is None:
+            _logger = logging.getLogger("exoticbill.perf")
+            _logger.setLevel(logging.INFO)
+            _logger.propagate = False
+            handler = RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler)
+        _logger.info(json.dumps(trace.to_dict(), ensure_ascii=False))
+    except OSError:
+        pass
+
+
+# ---------- ANALYSIS ----------
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def shape(sql):
+    """Statement text with literals folded, so parameter variants group together."""
+    return _LITERALS.sub("?", sql)
+
+
+def slowest(trace, n=15):
+    return sorted(trace.queries, key=lambda q: q["ms"], reverse=True)[:n]
+
+
+def n_plus_one(trace, min_count=N_PLUS_ONE_MIN):
+    """Statement shapes repeated >= min_count times within one section."""
+    groups = defaultdict(lambda: {"count": 0, "ms": 0.0, "rows": 0})
+    for q in trace.queries:
+        g = groups[(q["section"], shape(q["sql"]))]
+        g["count"] += 1
+        g["ms"] += q["ms"]
+        g["rows"] += q["rows"]
+    hits = [
+        {"section": sec, "sql": sql, **g, "ms": round(g["ms"], 3)}
+        for (sec, sql), g in groups.items() if g["count"] >= min_count
+    ]
+    return sorted(hits, key=lambda h: h["ms"], reverse=True)
+
+
+def section_summary(trace):
+    per = defaultdict(lambda: {"wall_ms": 0.0, "queries": 0, "query_ms": 0.0})
+    for sec in trace.to_dict()["sections"]:
+        per[sec["name"]]["wall_ms"] += sec["ms"]
+    for q in trace.queries:
+        per[q["section"]]["queries"] += 1
+        per[q["section"]]["query_ms"] += q["ms"]
+    return [
+        {"section": name or "(none)", "wall_ms": round(p["wall_ms"], 3),
+         "queries": p["queries"], "query_ms": round(p["query_ms"], 3)}
+        for name, p in per.items()
+    ]
@@ -0,0 +1,169 @@
+"""
+Bulk commission/tax re-rating for bills already saved.
+
+Commission is frozen onto each bill at save time with the employee's rank
+then. After a rate change or a rank fix, rerate_bills() recomputes
+commission and tax for a date range (optionally a set of employees) with the
+employees' current ranks and the given (or current) rates, using the same
+no-commission rules as save_bill. Bills are processed in NumPy/pandas chunks
+inside one write transaction; settled bills are left alone. Dry runs return
+the diff without writing.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+import db
+
+CHUNK = 50_000
+SAMPLE_ROWS = 50
+
+
+def no_commission_mask(btypes, details):
+    """Vectorized db.is_no_commission over aligned billing types / details."""
+    btypes = pd.Series(btypes, dtype="object").reset_index(drop=True)
+    details = pd.Series(details, dtype="object").reset_index(drop=True)
+    mask = btypes.isin(db.NO_COMMISSION_TYPES)
+    items = btypes.eq("ITEMS")
+    if items.any():
+        lines = details[items].fillna("").astype(str).str.split(" | ", n=1, regex=False).str[0]
+        names = lines.str.split(",").explode().str.strip()
+        names = names[names != ""].str.split("×").str[0]
+        only = names.isin(db.NO_COMMISSION_ITEMS).groupby(level=0).all()
+        mask.loc[only.index[only.to_numpy()]] = True
+    return mask.to_numpy()
+
+
+def check_rates(rates, tax_rate):
+    """
+    rates as {rank: float} and tax_rate as a float; ValueError unless each is
+    a finite number in [0, 1] (a cleared editor cell arrives as NaN/None).
+    """
+    def fraction(name, v):
+        try:
+            v = float(v)
+        except (TypeError, ValueError):
+            v = math.nan
+        if not (math.isfinite(v) and 0.0 <= v <= 1.0):
+            raise ValueError(f"{name} must be a number between 0 and 1")
+        return v
+    return {rank: fraction(f"rate for {rank}", v) for rank, v in rates.items()}, fraction("tax rate", tax_rate)
+
+
+def _scan_sql(employee_cids):
+    sql = """
+      SELECT b.id, b.employee_cid, b.billing_type, b.details, b.total_amount,
+             COALESCE(b.commission, 0), COALESCE(b.tax, 0), b.timestamp, b.hood,
+             CASE WHEN e.cid IS NULL THEN 'Trainee' ELSE e.rank END
+      FROM bills b
+      LEFT JOIN employees e ON e.cid = b.employee_cid
+      WHERE b.timestamp >= ? AND b.timestamp <= ? AND b.settlement_id IS NULL
+    """
+    if employee_cids:
+        sql += f" AND b.employee_cid IN ({','.join('?' * len(employee_cids))})"
+    return sql
+
+
+def _rerate_chunk(df, rates, tax_rate):
+    rate = df["rank"].map(rates).fillna(0.0).astype(float).to_numpy()
+    amount = df["total_amount"].fillna(0.0).astype(float).to_numpy()
+    free = no_commission_mask(df["billing_type"], df["details"])
+    commission = np.where(free, 0.0, amount * rate)
+    tax = commission * tax_rate
+    df = df.assign(new_commission=commission, new_tax=tax)
+    changed = (np.abs(commission - df["commission"].to_numpy()) > 1e-9) | \
+              (np.abs(tax - df["tax"].to_numpy()) > 1e-9)
+    return df, changed
+
+
+def rerate_bills(start_str, end_str, employee_cids=None, rates=None, tax_rate=None, dry_run=True, actor="?"):
+    """
+    Recompute commission/tax for unsettled bills in [start_str, end_str].
+
+    rates: {rank: rate} (default db.COMMISSION_RATES); tax_rate: default db.TAX_RATE.
+    Rates outside [0, 1] (or not numbers) raise ValueError before anything is read.
+    Returns a report dict: scanned/changed/skipped_settled counts, commission and
+    tax totals before and after, per_employee deltas (DataFrame) and a sample of
+    the largest per-bill changes. With dry_run=False the changes, the hourly
+    rollup and one summarised audit entry are committed together.
+    """
+    rates, tax_rate = check_rates(db.COMMISSION_RATES if rates is None else rates,
+                                  db.TAX_RATE if tax_rate is None else tax_rate)
+    employee_cids = list(employee_cids or [])
+    cols = ["id", "employee_cid", "billing_type", "details", "total_amount",
+            "commission", "tax", "timestamp", "hood", "rank"]
+
+    def op(conn):
+        params = [start_str, end_str] + employee_cids
+        skipped = conn.execute(
+            "SELECT COUNT(*) FROM bills WHERE timestamp >= ? AND timestamp <= ? AND settlement_id IS NOT NULL"
+            + (f" AND employee_cid IN ({','.join('?' * len(employee_cids))})" if employee_cids else ""),
+            params
+        ).fetchone()[0]
+        totals = {"scanned": 0, "changed": 0, "commission_before": 0.0, "commission_after": 0.0,
+                  "tax_before": 0.0, "tax_after": 0.0}
+        per_emp, samples = [], []
+        cur = conn.execute(_scan_sql(employee_cids), params)
+        while True:
+            rows = cur.fetchmany(CHUNK)
+            if not rows:
+                break
+            df, changed = _rerate_chunk(pd.DataFrame.from_records(rows, columns=cols), rates, tax_rate)
+            totals["scanned"] += len(df)
+            totals["changed"] += int(changed.sum())
+            totals["commission_before"] += float(df["commission"].sum())
+            totals["commission_after"] += float(df["new_commission"].sum())
+            totals["tax_before"] += float(df["tax"].sum())
+            totals["tax_after"] += float(df["new_tax"].sum())
+            diff = df[changed].assign(
+                commission_delta=lambda d: d["new_commission"] - d["commission"],
+                tax_delta=lambda d: d["new_tax"] - d["tax"],
+            )
+            if diff.empty:
+                continue
+            per_emp.append(diff.groupby("employee_cid").agg(
+                bills=("id", "size"), commission_delta=("commission_delta", "sum"), tax_delta=("tax_delta", "sum")))
+            samples.append(diff.reindex(diff["commission_delta"].abs().sort_values(ascending=False).index)
+                           .head(SAMPLE_ROWS))
+            if dry_run:
+                continue
+            # separate cursor: the scan cursor above is still being read
+            conn.cursor().executemany(
+                "UPDATE bills SET commission = ?, tax = ? WHERE id = ?",
+                zip(diff["new_commission"].tolist(), diff["new_tax"].tolist(), diff["id"].tolist()))
+            roll = diff.assign(bucket=diff["timestamp"].str[:13]).groupby(
+                ["bucket", "employee_cid", "billing_type", "hood"], dropna=False
+            )[["commission_delta", "tax_delta"]].sum().reset_index()
+            conn.cursor().executemany(db.ROLLUP_UPSERT, (
+                (r.bucket, None if pd.isna(r.employee_cid) else r.employee_cid,
+                 None if pd.isna(r.billing_type) else r.billing_type, None if pd.isna(r.hood) else r.hood,
+                 0, 0.0, float(r.commission_delta), float(r.tax_delta))
+                for r in roll.itertuples(index=False)))
+
+        per_employee = (pd.concat(per_emp).groupby(level=0).sum().reset_index()
+                        .sort_values("commission_delta", key=abs, ascending=False)
+                        if per_emp else pd.DataFrame(columns=["employee_cid", "bills", "commission_delta", "tax_delta"]))
+        sample = (pd.concat(samples).sort_values("commission_delta", key=abs, ascending=False).head(SAMPLE_ROWS)
+                  [["id", "employee_cid", "rank", "billing_type", "total_amount", "commission", "new_commission",
+                    "tax", "new_tax"]] if samples else pd.DataFrame())
+        report = {
+            "start": start_str, "end": end_str, "employees": employee_cids or "all",
+            "dry_run": dry_run, "skipped_settled": skipped, **totals,
+            "per_employee": per_employee, "sample": sample,
+        }
+        if not dry_run and totals["changed"]:
+            summary = {k: report[k] for k in ("start", "end", "employees", "scanned", "changed", "skipped_settled")}
+            db._audit(conn, "RERATE_BILLS", "bills", f"{start_str}..{end_str}", actor,
+                      old_values={**summary, "commission": totals["commission_before"], "tax": totals["tax_before"]},
+                      new_values={"commission": totals["commission_after"], "tax": totals["tax_after"],
+                                  "rates": rates, "tax_rate": tax_rate})
+        return report
+
+    if dry_run:
+        conn = db.connect()
+        try:
+            return op(conn)
+        finally:
+            conn.close()
+    return db.write_txn("rerate_bills", op)
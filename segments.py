@@ -0,0 +1,112 @@
+"""
+Customer RFM segments and lifetime value.
+
+The customers table already carries recency (last_seen), frequency
+(bill_count) and monetary value (lifetime_spend), kept current by save_bill
+and soft_delete_bill, and ltv moves with every bill's amount. This module
+does the part that needs the whole population: quintile R/F/M scores, a
+segment per customer and the projected part of lifetime value, computed
+with pandas/NumPy in one pass. It runs nightly as a maintenance task, or on
+demand:
+
+    python segments.py
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import db
+import maintenance
+
+LTV_HORIZON_DAYS = 365       # how far ahead lifetime value projects
+CHURN_DAYS = 60              # retention halves roughly every CHURN_DAYS * ln 2 days of silence
+MIN_TENURE_DAYS = 30         # floor for the purchase-rate denominator
+NEW_DAYS = 30
+SEGMENTS = ["Champions", "Loyal", "New", "Potential", "At Risk", "Can't Lose", "Hibernating", "Lost",
+            "Needs Attention"]
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+def _quintile(values, ascending=True):
+    """1..5 score by rank (ties broken by order), 5 = best."""
+    pct = pd.Series(values).rank(method="first", ascending=ascending, pct=True).to_numpy()
+    return np.ceil(pct * 5).clip(1, 5).astype(int)
+
+
+def score(df, now):
+    """
+    Add r/f/m scores, segment and projected LTV to a frame of customers
+    (cid, first_seen, last_seen, bill_count, lifetime_spend).
+    """
+    now = pd.Timestamp(now.replace(tzinfo=None))
+    first = pd.to_datetime(df["first_seen"], format=TS_FMT, errors="coerce")
+    last = pd.to_datetime(df["last_seen"], format=TS_FMT, errors="coerce")
+    recency = ((now - last).dt.total_seconds() / 86400).fillna(LTV_HORIZON_DAYS).clip(lower=0).to_numpy()
+    tenure = ((now - first).dt.total_seconds() / 86400).fillna(0).clip(lower=0).to_numpy()
+    bills = df["bill_count"].fillna(0).to_numpy(dtype=float)
+    spend = df["lifetime_spend"].fillna(0).to_numpy(dtype=float)
+
+    r = _quintile(recency, ascending=False)    # more recent = higher
+    f = _quintile(bills)
+    m = _quintile(spend)
+    segment = np.select(
+        [
+            (r >= 4) & (f >= 4) & (m >= 4),
+            (r >= 3) & (f >= 4),
+            (tenure <= NEW_DAYS) & (bills <= 2),
+            (r >= 4),
+            (r <= 2) & (f >= 4) & (m >= 4),
+            (r <= 2) & (f >= 3),
+            (r == 1) & (f <= 2),
+            (r == 2) & (f <= 2),
+        ],
+        ["Champions", "Loyal", "New", "Potential", "Can't Lose", "At Risk", "Lost", "Hibernating"],
+        default="Needs Attention",
+    )
+    # expected future spend: average ticket x visit rate x horizon, discounted by how long they've been away
+    avg_ticket = np.divide(spend, bills, out=np.zeros_like(spend), where=bills > 0)
+    rate = bills / np.maximum(tenure, MIN_TENURE_DAYS)
+    projected = avg_ticket * rate * LTV_HORIZON_DAYS * np.exp(-recency / CHURN_DAYS)
+    return df.assign(r_score=r, f_score=f, m_score=m, segment=segment, projected=projected.round(2))
+
+
+def refresh_segments(now=None):
+    """Re-score every customer; returns the number of customers scored."""
+    now = now or datetime.now(db.IST)
+    conn = db.connect()
+    try:
+        df = pd.read_sql_query(
+            "SELECT cid, first_seen, last_seen, bill_count, lifetime_spend FROM customers", conn)
+    finally:
+        conn.close()
+    if df.empty:
+        return 0
+    df = score(df, now)
+    stamp = now.strftime(TS_FMT)
+    # ltv is rebuilt from the row's current lifetime_spend, so bills saved since the read aren't lost
+    rows = list(zip(df["r_score"].tolist(), df["f_score"].tolist(), df["m_score"].tolist(), df["segment"].tolist(),
+               df["projected"].tolist(), [stamp] * len(df), df["cid"].tolist()))
+    db.write_txn("refresh_segments", lambda c: c.executemany("""
+        UPDATE customers SET r_score = ?, f_score = ?, m_score = ?, segment = ?,
+                             ltv = lifetime_spend + ?, scored_at = ?
+        WHERE cid = ?
+    """, rows))
+    return len(df)
+
+
+def _task(conn):
+    return f"scored {refresh_segments():,} customers"
+
+
+maintenance.register_task("customer_segments", _task)
+
+
+if __name__ == "__main__":
+    db.init_db()
+    t0 = time.perf_counter()
+    n = refresh_segments()
+    print(f"scored {n:,} customers in {time.perf_counter() - t0:.2f}s")
+    for seg, cnt, spend, ltv in db.get_segment_summary():
+        print(f"  {seg:<16} {cnt:>8,}  spend {spend:>16,.2f}  ltv {ltv:>16,.2f}")
@@ -0,0 +1,212 @@
+"""
+Shift analytics: staff coverage per weekday/hour, concurrent-shift counts and
+revenue per staffed hour.
+
+Everything is computed with a vectorized interval sweep over the shift
+start/end timestamps (NumPy/pandas) instead of a Python loop per shift, and
+results are cached per date range until the underlying shifts/bills change.
+"""
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+import db
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+HOUR_S = 3600
+
+_CACHE_SIZE = 32
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+
+# ---------- LOADING ----------
+def _to_epoch(ts):
+    """Naive IST timestamp strings -> int64 seconds (NaT -> -1)."""
+    parsed = pd.to_datetime(pd.Series(ts, dtype="object"), format=TS_FMT, errors="coerce")
+    out = parsed.to_numpy(dtype="datetime64[s]").astype("int64")
+    out[parsed.isna().to_numpy()] = -1
+    return out
+
+
+def _load_intervals(conn, start_str, end_str, now_str):
+    """Shifts overlapping [start, end], clipped to the range; open shifts run until now."""
+    rows = conn.execute("""
+        SELECT start_ts, COALESCE(end_ts, ?) FROM shifts
+        WHERE start_ts <= ? AND (end_ts IS NULL OR end_ts >= ?)
+    """, (now_str, end_str, start_str)).fetchall()
+    if not rows:
+        return np.empty(0, dtype="int64"), np.empty(0, dtype="int64")
+    starts_raw, ends_raw = zip(*rows)
+    lo, hi = _to_epoch([start_str, end_str])
+    starts = np.clip(_to_epoch(starts_raw), lo, hi)
+    ends = np.clip(_to_epoch(ends_raw), lo, hi)
+    keep = (starts >= 0) & (ends > starts)
+    return starts[keep], ends[keep]
+
+
+def _load_revenue(conn, start_str, end_str):
+    # read the hourly rollup (one row per hour/employee/type) instead of scanning bills
+    rows = conn.execute("""
+        SELECT bucket, SUM(bills), SUM(revenue) FROM bills_hourly
+        WHERE bucket >= substr(?, 1, 13) AND bucket <= substr(?, 1, 13)
+        GROUP BY bucket
+    """, (start_str, end_str)).fetchall()
+    df = pd.DataFrame(rows, columns=["bucket", "bills", "revenue"])
+    hr = pd.to_datetime(df["bucket"], format="%Y-%m-%d %H", errors="coerce")
+    df = df.assign(dow=hr.dt.dayofweek, hour=hr.dt.hour).dropna(subset=["dow"])
+    return df.groupby(["dow", "hour"], as_index=False)[["bills", "revenue"]].sum().astype(
+        {"dow": "int64", "hour": "int64"}
+    )
+
+
+# ---------- INTERVAL SWEEP ----------
+def sweep(starts, ends):
+    """
+    Turn intervals into a step function of concurrent shifts.
+    Returns (event_times, level_after_event, cumulative_staff_seconds_at_event).
+    Ends sort before starts at the same instant so back-to-back shifts don't overlap.
+    """
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(len(starts), "int64"), -np.ones(len(ends), "int64")])
+    order = np.lexsort((deltas, times))
+    t = times[order]
+    level = np.cumsum(deltas[order])
+    integral = np.concatenate([[0], np.cumsum(level[:-1] * np.diff(t))]) if len(t) else np.empty(0, "int64")
+    return t, level, integral
+
+
+def _integral_at(x, t, level, integral):
+    """Staff-seconds accumulated from the first event up to each x."""
+    k = np.searchsorted(t, x, side="right") - 1
+    kc = np.clip(k, 0, None)
+    val = integral[kc] + level[kc] * (x - t[kc])
+    return np.where(k < 0, 0, val)
+
+
+def hourly_coverage(starts, ends, range_lo, range_hi):
+    """Staff-hours and peak concurrency for every clock hour in [range_lo, range_hi)."""
+    first = range_lo - range_lo % HOUR_S
+    edges = np.arange(first, range_hi + HOUR_S, HOUR_S, dtype="int64")
+    bins = pd.DataFrame({"bin_start": pd.to_datetime(edges[:-1], unit="s")})
+    if len(starts) == 0:
+        bins["staff_hours"] = 0.0
+        bins["peak"] = 0
+        return bins
+
+    t, level, integral = sweep(starts, ends)
+    cum = _integral_at(edges, t, level, integral)
+    bins["staff_hours"] = np.diff(cum) / HOUR_S
+
+    # peak = level entering the bin, raised by any event inside it
+    k = np.searchsorted(t, edges[:-1], side="right") - 1
+    peak = np.where(k < 0, 0, level[np.clip(k, 0, None)])
+    inside = np.searchsorted(edges, t, side="right") - 1
+    ok = (inside >= 0) & (inside < len(peak))
+    np.maximum.at(peak, inside[ok], level[ok])
+    bins["peak"] = peak
+    return bins
+
+
+# ---------- PUBLIC API ----------
+def _fingerprint(conn, start_str, end_str, now_str):
+    # O(1) change detection: new bills/shifts bump max ids, deletes and shift ends are audited
+    row = conn.execute("""
+        SELECT (SELECT MAX(id) FROM bills), (SELECT MAX(id) FROM shifts), (SELECT MAX(id) FROM audit_log)
+    """).fetchone()
+    # open shifts keep growing, so a range reaching "now" is only good for the current minute
+    live = now_str[:16] if end_str >= now_str else None
+    return tuple(row) + (live,)
+
+
+def compute_shift_analytics(conn, start_str, end_str, now_str):
+    """Uncached computation; see get_shift_analytics for the returned structure."""
+    starts, ends = _load_intervals(conn, start_str, end_str, now_str)
+    lo, hi = _to_epoch([start_str, min(end_str, now_str)])
+    hi = max(hi, lo)
+    bins = hourly_coverage(starts, ends, lo, hi)
+    bins["dow"] = bins["bin_start"].dt.dayofweek
+    bins["hour"] = bins["bin_start"].dt.hour
+
+    cells = bins.groupby(["dow", "hour"]).agg(
+        staff_hours=("staff_hours", "sum"),
+        avg_staff=("staff_hours", "mean"),
+        peak=("peak", "max"),
+    ).reset_index()
+    cells = cells.merge(_load_revenue(conn, start_str, end_str), on=["dow", "hour"], how="outer").fillna(0)
+    cells["rev_per_staff_hour"] = np.where(
+        cells["staff_hours"] > 0, cells["revenue"] / cells["staff_hours"].where(cells["staff_hours"] > 0, 1), 0.0
+    )
+
+    def heatmap(col):
+        grid = cells.pivot(index="dow", columns="hour", values=col)
+        grid = grid.reindex(index=range(7), columns=range(24)).fillna(0)
+        grid.index = DAY_NAMES
+        return grid
+
+    by_hour = cells.groupby("hour").agg(
+        staff_hours=("staff_hours", "sum"),
+        peak=("peak", "max"),
+        revenue=("revenue", "sum"),
+    ).reindex(range(24), fill_value=0)
+    by_hour["rev_per_staff_hour"] = np.where(
+        by_hour["staff_hours"] > 0, by_hour["revenue"] / by_hour["staff_hours"].where(by_hour["staff_hours"] > 0, 1), 0.0
+    )
+
+    total_staff_hours = float(bins["staff_hours"].sum())
+    total_revenue = float(cells["revenue"].sum())
+    return {
+        "shifts": int(len(starts)),
+        "staff_hours": total_staff_hours,
+        "peak_concurrent": int(bins["peak"].max()) if len(bins) else 0,
+        "revenue": total_revenue,
+        "rev_per_staff_hour": total_revenue / total_staff_hours if total_staff_hours else 0.0,
+        "avg_staff": heatmap("avg_staff"),
+        "peak": heatmap("peak"),
+        "rev_per_staff_hour_grid": heatmap("rev_per_staff_hour"),
+        "by_hour": by_hour,
+        "timeline": bins[["bin_start", "staff_hours", "peak"]],
+    }
+
+
+def get_shift_analytics(start_str, end_str, db_path=None, now=None):
+    """
+    Coverage/overlap analytics for shifts between start_str and end_str (IST strings).
+
+    Returns a dict with totals (shifts, staff_hours, peak_concurrent, revenue,
+    rev_per_staff_hour), 7x24 weekday/hour grids (avg_staff, peak,
+    rev_per_staff_hour_grid), a per-hour-of-day summary (by_hour) and the
+    hourly timeline. Cached per (db, range) until shifts or bills change.
+    """
+    now_str = (now or datetime.now(db.IST)).strftime(TS_FMT)
+    if db_path:
+        conn = sqlite3.connect(db_path)
+    else:
+        db_path, conn = db.current_db_path(), db.connect_report()
+    try:
+        fp = _fingerprint(conn, start_str, end_str, now_str)
+        key = (db_path, start_str, end_str)
+        with _cache_lock:
+            hit = _cache.get(key)
+            if hit and hit[0] == fp:
+                _cache.move_to_end(key)
+                return hit[1]
+        result = compute_shift_analytics(conn, start_str, end_str, now_str)
+    finally:
+        conn.close()
+    with _cache_lock:
+        _cache[key] = (fp, result)
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
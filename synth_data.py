@@ -0,0 +1,226 @@
+"""
+Seeded synthetic ExoticBill database for load and benchmark runs.
+
+    python synth_data.py bench.db --bills 1000000 --employees 200 --seed 7
+
+Generates employees, hoods, customers, memberships (active and expired),
+shifts and bills with a realistic billing-type mix, evening-heavy timestamps
+and commission/tax computed with the same rules as save_bill. Derived tables
+(hourly rollup, customers, open-shift counters, loyalty ledger) are rebuilt at the end.
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import db
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+# share of bills per type, and per-type amount ranges (before discounts)
+TYPE_MIX = {
+    "ITEMS": 0.34,
+    "REPAIR": 0.30,
+    "CUSTOMIZATION": 0.14,
+    "UPGRADES": 0.14,
+    "MEMBERSHIP": 0.08,
+}
+# relative traffic per hour of day (IST): quiet mornings, evening peak
+HOURLY_PROFILE = np.array([
+    3, 2, 1, 1, 1, 1, 1, 2, 3, 4, 5, 6,
+    6, 6, 6, 7, 8, 10, 12, 14, 14, 12, 8, 5,
+], dtype=float)
+RANK_MIX = {
+    "Trainee": 0.30, "Mechanic": 0.30, "Senior Mechanic": 0.15, "Lead Upgrade Specialist": 0.08,
+    "Stock Manager": 0.07, "Manager": 0.08, "CEO": 0.02,
+}
+
+DEFAULTS = {
+    "employees": 50,
+    "hoods": 6,
+    "customers": 5000,
+    "memberships": 500,
+    "shifts": 5000,
+    "bills": 100_000,
+    "days": 90,
+}
+
+
+def _weighted(rng, mix, n):
+    keys = list(mix)
+    p = np.array([mix[k] for k in keys], dtype=float)
+    return np.array(keys, dtype=object)[rng.choice(len(keys), size=n, p=p / p.sum())]
+
+
+def _timestamps(rng, n, start, days):
+    """n sorted timestamps over `days`, shaped by HOURLY_PROFILE."""
+    day = rng.integers(0, days, size=n)
+    hour = rng.choice(24, size=n, p=HOURLY_PROFILE / HOURLY_PROFILE.sum())
+    sec = rng.integers(0, 3600, size=n)
+    offs = np.sort(day * 86400 + hour * 3600 + sec)
+    base = np.datetime64(start.strftime("%Y-%m-%dT%H:%M:%S"))
+    stamps = (base + offs.astype("timedelta64[s]")).astype(str)
+    return np.char.replace(stamps.astype("U19"), "T", " ")
+
+
+def _bill_lines(rng, btypes, tiers):
+    """Details text and amount per bill, following the app's pricing."""
+    n = len(btypes)
+    details = np.empty(n, dtype=object)
+    amounts = np.zeros(n)
+    item_names = list(db.ITEM_PRICES)
+    for i in range(n):
+        bt = btypes[i]
+        if bt == "ITEMS":
+            k = rng.integers(1, 4)
+            picks = rng.choice(len(item_names), size=k, replace=False)
+            qty = rng.integers(1, 4, size=k)
+            details[i] = ", ".join(f"{item_names[p]}×{q}" for p, q in zip(picks, qty))
+            amounts[i] = sum(db.ITEM_PRICES[item_names[p]] * q for p, q in zip(picks, qty))
+        elif bt == "UPGRADES":
+            base = float(rng.integers(10, 200) * 100)
+            details[i], amounts[i] = f"Upgrade: ₹{base}", base * 1.5
+        elif bt == "REPAIR":
+            if rng.random() < 0.7:
+                base = float(rng.integers(1, 20) * 50)
+                details[i], amounts[i] = f"Normal Repair: ₹{base}+₹{db.LABOR}", base + db.LABOR
+            else:
+                parts = int(rng.integers(1, 12))
+                details[i], amounts[i] = f"Advanced Repair: {parts}×₹{db.PART_COST}", parts * db.PART_COST
+        elif bt == "CUSTOMIZATION":
+            base = float(rng.integers(5, 100) * 100)
+            details[i], amounts[i] = f"Customization: ₹{base}×2", base * 2
+        else:
+            tier = rng.choice(list(db.MEMBERSHIP_PRICES))
+            details[i], amounts[i] = f"{tier} Membership", db.MEMBERSHIP_PRICES[tier]
+        disc = db.MEMBERSHIP_DISCOUNTS.get(tiers[i], {}).get(bt, 0) if tiers[i] else 0
+        if disc > 0:
+            amounts[i] *= (1 - disc)
+            details[i] += f" | {tiers[i]} discount {int(disc * 100)}%"
+    return details, amounts
+
+
+def generate(path, seed=42, now=None, **counts):
+    """Create a fresh synthetic database at `path`; returns the counts used."""
+    cfg = {**DEFAULTS, **{k: v for k, v in counts.items() if v is not None}}
+    rng = np.random.default_rng(seed)
+    now = (now or datetime.now(db.IST)).replace(tzinfo=None, microsecond=0)
+    start = (now - timedelta(days=cfg["days"])).replace(hour=0, minute=0, second=0)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    prev_path, db.DB_PATH = db.DB_PATH, path
+    try:
+        db.init_db()
+        conn = db.connect()
+
+        hoods = [f"Hood {i + 1}" for i in range(cfg["hoods"])]
+        conn.executemany("INSERT INTO hoods (name, location) VALUES (?,?)",
+                         [(h, f"Block {i + 1}") for i, h in enumerate(hoods)])
+
+        emp_cids = [f"EMP{i:05d}" for i in range(cfg["employees"])]
+        ranks = _weighted(rng, RANK_MIX, len(emp_cids))
+        emp_hoods = np.array(hoods + ["No Hood"], dtype=object)[rng.integers(0, len(hoods) + 1, len(emp_cids))]
+        conn.executemany("INSERT INTO employees (cid, name, rank, hood) VALUES (?,?,?,?)",
+                         [(c, f"Employee {i}", r, h) for i, (c, r, h) in enumerate(zip(emp_cids, ranks, emp_hoods))])
+
+        cust_cids = np.array([f"CUS{i:07d}" for i in range(cfg["customers"])], dtype=object)
+
+        # memberships: dop within the last 10 days, so roughly a third are already expired
+        n_mem = min(cfg["memberships"], len(cust_cids))
+        mem_cids = rng.choice(cust_cids, size=n_mem, replace=False)
+        mem_tiers = rng.choice(list(db.MEMBERSHIP_DISCOUNTS), size=n_mem)
+        mem_dops = [(now - timedelta(seconds=int(s))).strftime(TS_FMT) for s in rng.integers(0, 10 * 86400, n_mem)]
+        mem_exp = [db.membership_expiry(t, datetime.strptime(d, TS_FMT)) for t, d in zip(mem_tiers, mem_dops)]
+        conn.executemany("INSERT INTO memberships (customer_cid, tier, dop, expires_at) VALUES (?,?,?,?)",
+                         list(zip(mem_cids, mem_tiers, mem_dops, mem_exp)))
+        tier_of = dict(zip(mem_cids, mem_tiers))
+
+        # shifts: closed shifts spread over the window, plus one open shift for ~10% of staff
+        n_sh = cfg["shifts"]
+        sh_emp = rng.choice(emp_cids, size=n_sh)
+        sh_start = _timestamps(rng, n_sh, start, max(cfg["days"] - 1, 1))
+        sh_len = rng.integers(30, 8 * 60, size=n_sh)
+        sh_rows = []
+        for e, s, m in zip(sh_emp, sh_start, sh_len):
+            end = (datetime.strptime(s, TS_FMT) + timedelta(minutes=int(m))).strftime(TS_FMT)
+            sh_rows.append((e, s, end, int(m), 0, 0.0))
+        conn.executemany("""
+            INSERT INTO shifts (employee_cid, start_ts, end_ts, duration_minutes, bills_count, revenue)
+            VALUES (?,?,?,?,?,?)
+        """, sh_rows)
+        open_emps = rng.choice(emp_cids, size=max(1, len(emp_cids) // 10), replace=False)
+        conn.executemany("INSERT INTO shifts (employee_cid, start_ts) VALUES (?,?)",
+                         [(e, (now - timedelta(minutes=int(rng.integers(5, 300)))).strftime(TS_FMT))
+                          for e in open_emps])
+
+        # bills, in chunks so millions of rows stay memory-friendly
+        rank_of = dict(zip(emp_cids, ranks))
+        hood_of = dict(zip(emp_cids, emp_hoods))
+        remaining, chunk = cfg["bills"], 200_000
+        while remaining > 0:
+            n = min(chunk, remaining)
+            remaining -= n
+            emps = rng.choice(emp_cids, size=n)
+            custs = rng.choice(cust_cids, size=n)
+            btypes = _weighted(rng, TYPE_MIX, n)
+            tiers = [tier_of.get(c) for c in custs]
+            details, amounts = _bill_lines(rng, btypes, tiers)
+            stamps = _timestamps(rng, n, start, cfg["days"])
+            rows = []
+            for e, c, bt, d, a, ts in zip(emps, custs, btypes, details, amounts, stamps):
+                if db.is_no_commission(bt, d):
+                    comm = tax = 0.0
+                else:
+                    comm = a * db.COMMISSION_RATES.get(rank_of[e], 0)
+                    tax = comm * db.TAX_RATE
+                rows.append((e, c, bt, d, float(a), ts, comm, tax, hood_of[e]))
+            conn.executemany("""
+                INSERT INTO bills
+                  (employee_cid, customer_cid, billing_type, details, total_amount, timestamp, commission, tax, hood)
+                VALUES (?,?,?,?,?,?,?,?,?)
+            """, rows)
+
+        # derived state
+        db.rebuild_bills_hourly(conn)
+        db.rebuild_customers(conn)
+        conn.execute("""
+            INSERT INTO loyalty_ledger (customer_cid, kind, points, bill_id, ts)
+            SELECT customer_cid, 'earn', CAST(total_amount / ? AS INTEGER), id, timestamp FROM bills
+            WHERE billing_type != 'MEMBERSHIP' AND total_amount >= ?
+        """, (db.LOYALTY_EARN_PER_RS, db.LOYALTY_EARN_PER_RS))
+        conn.execute("""
+            INSERT INTO loyalty (customer_cid, points)
+            SELECT customer_cid, SUM(points) FROM loyalty_ledger GROUP BY customer_cid
+        """)
+        conn.execute("""
+            UPDATE shifts SET
+              bills_count = (SELECT COUNT(*) FROM bills b
+                             WHERE b.employee_cid = shifts.employee_cid AND b.timestamp >= shifts.start_ts),
+              revenue = (SELECT COALESCE(SUM(b.total_amount), 0) FROM bills b
+                         WHERE b.employee_cid = shifts.employee_cid AND b.timestamp >= shifts.start_ts)
+            WHERE end_ts IS NULL
+        """)
+        conn.commit()
+        conn.close()
+        db.invalidate_reference(path)     # employees/hoods were written behind the helpers' backs
+    finally:
+        db.DB_PATH = prev_path
+    return cfg
+
+
+def main():
+    p = argparse.ArgumentParser(description="Generate a seeded synthetic ExoticBill database.")
+    p.add_argument("path", help="output database file (overwritten)")
+    p.add_argument("--seed", type=int, default=42)
+    for k, v in DEFAULTS.items():
+        p.add_argument(f"--{k}", type=int, default=v)
+    args = p.parse_args()
+    cfg = generate(args.path, seed=args.seed, **{k: getattr(args, k) for k in DEFAULTS})
+    print(f"Wrote {args.path}: " + ", ".join(f"{k}={v:,}" for k, v in cfg.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """A migrated, empty database at a temp path for the duration of the test."""
+    path = str(tmp_path / "exotic.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    yield path
+    db.invalidate_reference(path)
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+import api
+import db
+
+
+def _dispatch(method, target, body=None):
+    """(status, payload) for one request through the router, as handle() would answer it."""
+    async def run():
+        a = api.Api()
+        a.writer.start()
+        try:
+            return await a.dispatch(method, target, {}, json.dumps(body).encode() if body is not None else b"")
+        except api.ApiError as e:
+            return e.status, {"error": str(e)}
+    return asyncio.run(run())
+
+
+def _raw(request, whole=False):
+    """Send raw bytes to a live handler; returns the status line (or the whole response)."""
+    async def run():
+        a = api.Api()
+        server = await asyncio.start_server(a.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            await writer.drain()
+            status = await (reader.read() if whole else reader.readline())
+            writer.close()
+            return status.decode()
+    return asyncio.run(run())
+
+
+BILL = {"employee_cid": "E1", "customer_cid": "C1"}
+
+
+@pytest.mark.parametrize("body, message", [
+    (dict(BILL, billing_type="ITEMS", items=["Harness"]), "items must be an object"),
+    (dict(BILL, billing_type="ITEMS", items="Harness"), "items must be an object"),
+    (dict(BILL, billing_type="ITEMS", items={"Harness": "two"}), "quantity of Harness must be an integer"),
+    (dict(BILL, billing_type="ITEMS", items={"Harness": -1}), "can't be negative"),
+    (dict(BILL, billing_type="UPGRADES", base="lots"), "base must be a number"),
+    (dict(BILL, billing_type="UPGRADES", base="nan"), "base must be a number"),
+    (dict(BILL, billing_type="UPGRADES", base=[100]), "base must be a number"),
+    (dict(BILL, billing_type="REPAIR", repair_type="Advanced Repair", parts="3.5"), "parts must be an integer"),
+    (dict(BILL, billing_type="REPAIR", repair_type="Advanced Repair", parts={"n": 3}), "parts must be an integer"),
+    (dict(BILL, billing_type="UPGRADES", base=100, redeem_points="some"), "redeem_points must be an integer"),
+    (dict(BILL, billing_type="REPAIR", repair_type="Turbo Repair", parts=3), "repair_type must be one of"),
+])
+def test_bad_bill_fields_are_400(fresh_db, body, message):
+    status, payload = _dispatch("POST", "/bills", body)
+    assert status == 400
+    assert message in payload["error"]
+
+
+def test_valid_bill_still_created(fresh_db):
+    db.add_employee("E1", "Ravi", "Mechanic")
+    status, payload = _dispatch("POST", "/bills", dict(BILL, billing_type="ITEMS", items={"Harness": "2"}))
+    assert status == 201
+    assert payload["details"] == "Harness×2"
+
+
+@pytest.mark.parametrize("limit", ["ten", "2.5", "1e400"])
+def test_bad_limit_is_400(fresh_db, limit):
+    status, payload = _dispatch("GET", f"/loyalty/top?limit={limit}")
+    assert status == 400
+    assert payload["error"] == "limit must be an integer"
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1.5"])
+def test_bad_content_length_is_400(fresh_db, length):
+    status = _raw(f"POST /bills HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode())
+    assert status.startswith("HTTP/1.1 400 ")
+
+
+def test_unexpected_errors_are_logged_not_leaked(fresh_db, monkeypatch, caplog):
+    def boom(now):
+        raise RuntimeError("no such table: bills_secret")
+    monkeypatch.setattr(db, "get_live_stats", boom)
+    response = _raw(b"GET /stats/live HTTP/1.1\r\nConnection: close\r\n\r\n", whole=True)
+    assert response.startswith("HTTP/1.1 500 ")
+    assert response.endswith('{"error": "internal error"}')
+    assert "bills_secret" in caplog.text
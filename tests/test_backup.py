@@ -0,0 +1,66 @@
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+import backup
+import db
+
+
+@pytest.fixture
+def backups(fresh_db, tmp_path, monkeypatch):
+    folder = tmp_path / "backups"
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(folder))
+    return folder
+
+
+def _bills(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_snapshot_is_a_complete_checked_copy(backups, compress, tmp_path):
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    name = backup.create_backup(compress=compress)
+    assert name.endswith(".db.gz" if compress else ".db")
+    assert [n for n, _, _ in backup.list_backups()] == [name]
+    assert not [n for n in os.listdir(backups) if n.startswith(".")]     # no temp files left
+    path = backups / name
+    if compress:
+        raw = tmp_path / "unzipped.db"
+        raw.write_bytes(gzip.decompress(path.read_bytes()))
+        path = raw
+    assert _bills(str(path)) == 1
+    assert backup.get_status()["last_file"] == name
+
+
+def test_rotate_keeps_newest_plain_snapshots_and_all_labelled(backups):
+    backups.mkdir()
+    plain = [f"exoticbill_20261001_0000{i}.db.gz" for i in range(5)]
+    for name in plain + ["exoticbill_20261001_000000_prerestore.db.gz", "notes.txt"]:
+        (backups / name).write_bytes(b"")
+    backup.rotate(keep=2)
+    assert sorted(os.listdir(backups)) == sorted(plain[-2:] + ["exoticbill_20261001_000000_prerestore.db.gz",
+                                                               "notes.txt"])
+
+
+def test_restore_round_trip(backups):
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    name = backup.create_backup()
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.add_employee("E2", "Asha", "Mechanic")
+
+    safety = backup.restore_backup(name, actor="admin")
+
+    assert "prerestore" in safety and (backups / safety).exists()
+    assert _bills(db.current_db_path()) == 1
+    assert db.get_employee_details("E2") is None        # reference cache was dropped
+    assert db.get_audit_log(1)[0][:2] == ("RESTORE_BACKUP", "database")
+    with pytest.raises(FileNotFoundError):
+        backup.restore_backup("exoticbill_missing.db")
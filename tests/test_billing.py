@@ -0,0 +1,26 @@
+import db
+import rerate
+
+
+def test_no_commission_items_stay_commission_free_with_large_redemption(fresh_db):
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.add_loyalty_points("C1", 1500)
+    bill_id = db.save_bill("E1", "C1", "ITEMS", "Harness×2, NOS×1", 3000.0, redeem_points=1500)
+
+    conn = db.connect()
+    details, total, commission, tax = conn.execute(
+        "SELECT details, total_amount, commission, tax FROM bills WHERE id = ?", (bill_id,)
+    ).fetchone()
+    conn.close()
+    assert total == 1500.0
+    assert (commission, tax) == (0.0, 0.0)
+    assert details == "Harness×2, NOS×1 | Redeemed 1500 pts -₹1500.00"
+    assert db.is_no_commission("ITEMS", details)
+    assert rerate.no_commission_mask(["ITEMS"], [details]).tolist() == [True]
+
+
+def test_older_redemption_notes_with_thousands_separator_are_ignored():
+    details = "Harness×2 | Redeemed 1500 pts -₹1,500.00"
+    assert db.is_no_commission("ITEMS", details)
+    assert rerate.no_commission_mask(["ITEMS"], [details]).tolist() == [True]
+    assert not db.is_no_commission("ITEMS", "Harness×1, Spoiler×1 | Redeemed 1500 pts -₹1,500.00")
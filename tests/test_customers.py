@@ -0,0 +1,38 @@
+import db
+
+
+def _customers():
+    conn = db.connect()
+    try:
+        return conn.execute(
+            "SELECT cid, first_seen, last_seen, bill_count, lifetime_spend, ltv FROM customers ORDER BY cid"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_save_bill_keeps_customers_in_step_with_a_rebuild(fresh_db):
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.save_bill("E1", "C1", "UPGRADES", "Turbo", 4000.0)
+    db.save_bill("E1", "C2", "REPAIR", "Engine", 800.0)
+    db.save_bill("E1", "", "REPAIR", "Walk-in", 300.0)
+    live = _customers()
+    assert [(r[0], r[3], r[4], r[5]) for r in live] == [("C1", 2, 6500.0, 6500.0), ("C2", 1, 800.0, 800.0)]
+    assert live[0][1] <= live[0][2]
+
+    db.write_txn("rebuild", db.rebuild_customers)
+    assert _customers() == live
+
+
+def test_search_customers_pages_through_a_prefix(fresh_db):
+    for cid in ["C10", "C11", "C12", "C2", "D1"]:
+        db.save_bill("E1", cid, "REPAIR", "Engine", 100.0)
+
+    rows, more = db.search_customers("C1", limit=2)
+    assert [r[0] for r in rows] == ["C10", "C11"] and more
+    rows, more = db.search_customers("C1", limit=2, offset=2)
+    assert [r[0] for r in rows] == ["C12"] and not more
+    rows, more = db.search_customers()
+    assert [r[0] for r in rows] == ["C10", "C11", "C12", "C2", "D1"] and not more
+    assert db.search_customers("c") == ([], False)
+    assert rows[0][3:] == (1, 100.0)
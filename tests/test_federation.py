@@ -0,0 +1,57 @@
+import pytest
+
+import db
+import federation
+
+START, END = "0000-01-01 00:00:00", "9999-12-31 23:59:59"
+
+
+@pytest.fixture
+def garages(tmp_path, monkeypatch):
+    paths = {name: str(tmp_path / f"{name.lower()}.db") for name in ("North", "South", "West")}
+    monkeypatch.setattr(db, "LOCATIONS", paths)
+    for name, employees, bills in [
+        ("North", [("E1", "Ravi", "Reds")], [("E1", 1000.0), ("E1", 500.0)]),
+        ("South", [("E1", "Ravi", "Blues"), ("E2", "Asha", "Blues")], [("E1", 200.0), ("E2", 3000.0)]),
+    ]:
+        with db.location(name):
+            db.init_db()
+            db.add_hood(employees[0][2], name)
+            db.add_hood("Greens", name)
+            for cid, emp_name, hood in employees:
+                db.add_employee(cid, emp_name, "Mechanic")
+                db.assign_employees_to_hood(hood, [cid])
+            for cid, amt in bills:
+                db.save_bill(cid, "C1", "REPAIR", "Engine", amt)
+    # West has never been opened: no file, left out of every report
+    yield paths
+    for path in paths.values():
+        db.invalidate_reference(path)
+
+
+def test_open_federation_skips_garages_without_a_database(garages):
+    conn, shards = federation.open_federation()
+    conn.close()
+    assert shards == [("North", "g0"), ("South", "g1")]
+    with pytest.raises(ValueError):
+        federation.open_federation([f"L{i}" for i in range(federation.MAX_ATTACHED + 1)])
+
+
+def test_group_totals_per_garage(garages):
+    rows = federation.group_totals(START, END)
+    assert [(r[0], r[1], r[2]) for r in rows] == [("South", 2, 3200.0), ("North", 2, 1500.0)]
+    assert federation.group_totals(START, END, locations=["West"]) == []
+    assert federation.group_totals("2000-01-01 00:00:00", "2000-01-01 23:59:59")[0][1:3] == (0, 0)
+
+
+def test_leaderboard_merges_an_employee_across_garages(garages):
+    rows = federation.group_leaderboard(START, END)
+    assert [(r[0], r[1], r[3], r[4]) for r in rows] == [("E2", "Asha", 1, 3000.0), ("E1", "Ravi", 3, 1700.0)]
+    assert sorted(rows[1][2].split(", ")) == ["North", "South"]
+    assert len(federation.group_leaderboard(START, END, limit=1)) == 1
+
+
+def test_hood_war_across_garages(garages):
+    assert federation.group_hood_war(START, END) == [("Blues", 3200.0), ("Reds", 1500.0), ("Greens", 0)]
+    by_loc = federation.group_hood_war(START, END, by_location=True)
+    assert ("North", "Greens", 0) in by_loc and ("South", "Blues", 3200.0) in by_loc
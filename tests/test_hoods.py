@@ -0,0 +1,59 @@
+import db
+
+ALL = ("0000-01-01 00:00:00", "9999-12-31 23:59:59")
+
+
+def _bill_hoods(conn):
+    return dict(conn.execute("SELECT id, hood FROM bills").fetchall())
+
+
+def test_hood_is_frozen_onto_bills(fresh_db):
+    db.add_hood("Vagos", "Grove")
+    db.add_hood("Ballas", "Davis")
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.update_employee("E1", hood="Vagos")
+    db.add_employee("E2", "Asha", "Mechanic")          # no hood yet
+    first = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    no_hood = db.save_bill("E2", "C1", "ITEMS", "Spoiler×1", 2500.0)
+
+    db.assign_employees_to_hood("Ballas", ["E1"])
+    second = db.save_bill("E1", "C1", "UPGRADES", "Upgrade: ₹100", 150.0)
+
+    conn = db.connect()
+    assert _bill_hoods(conn) == {first: "Vagos", no_hood: "No Hood", second: "Ballas"}
+    conn.close()
+    assert dict(db.get_hood_war(*ALL)) == {"Vagos": 2500.0, "Ballas": 150.0, "No Hood": 2500.0}
+
+
+def test_rename_carries_history_and_merges_rollup(fresh_db):
+    db.add_hood("Vagos", "Grove")
+    db.add_hood("Families", "Grove")
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.update_employee("E1", hood="Vagos")
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.assign_employees_to_hood("Families", ["E1"])
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+
+    # renaming onto a name already in the rollup adds the rows together instead of clashing
+    db.delete_hood("Families")
+    db.update_hood("Vagos", "Families", "Grove", actor="admin")
+
+    conn = db.connect()
+    try:
+        assert set(_bill_hoods(conn).values()) == {"Families"}
+        assert conn.execute("SELECT hood, SUM(bills), SUM(revenue) FROM bills_hourly GROUP BY hood").fetchall() \
+            == [("Families", 2, 5000.0)]
+        assert conn.execute("SELECT action FROM audit_log ORDER BY id DESC LIMIT 1").fetchone() == ("RENAME_HOOD",)
+    finally:
+        conn.close()
+    assert dict(db.get_hood_war(*ALL)) == {"Families": 5000.0}
+
+
+def test_location_change_alone_leaves_bills_alone(fresh_db):
+    db.add_hood("Vagos", "Grove")
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.update_employee("E1", hood="Vagos")
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.update_hood("Vagos", "Vagos", "Sandy Shores", actor="admin")
+    assert dict(db.get_all_hoods()) == {"Vagos": "Sandy Shores"}
+    assert dict(db.get_hood_war(*ALL)) == {"Vagos": 2500.0}
@@ -0,0 +1,69 @@
+import pytest
+
+import db
+
+
+def _balance(cid):
+    conn = db.connect()
+    try:
+        return db._loyalty_balance(conn, cid)
+    finally:
+        conn.close()
+
+
+def test_earn_redeem_and_adjust_go_through_the_ledger(fresh_db):
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)                    # +25
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0, redeem_points=10)  # -10, +24
+    assert db.add_loyalty_points("C1", 5, actor="admin", note="goodwill") == 5
+    # a deduction is capped at the balance
+    assert db.add_loyalty_points("C1", -1000, actor="admin") == -44
+    assert _balance("C1") == 0
+
+    kinds = [(r[2], r[3]) for r in reversed(db.get_loyalty_ledger("C1"))]
+    assert kinds == [("earn", 25), ("redeem", -10), ("earn", 24), ("adjust", 5), ("adjust", -44)]
+    assert db.get_ledger_balance("C1") == 0
+
+
+def test_redeeming_more_than_the_balance_saves_nothing(fresh_db):
+    db.add_loyalty_points("C1", 50)
+    with pytest.raises(ValueError):
+        db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0, redeem_points=60)
+    conn = db.connect()
+    assert conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0] == 0
+    conn.close()
+    assert _balance("C1") == 50
+
+
+def test_snapshots_roll_forward_and_reconcile_fixes_drift(fresh_db):
+    db.add_loyalty_points("C1", 40)
+    db.add_loyalty_points("C2", 10)
+    assert db.snapshot_loyalty() == 2
+    assert db.snapshot_loyalty() == 0
+    db.add_loyalty_points("C1", 5)
+    assert db.snapshot_loyalty() == 1
+    db.add_loyalty_points("C1", 1)
+    assert db.get_ledger_balance("C1") == 46
+
+    # the materialized balance drifts from the books; reconcile puts it back
+    conn = db.connect()
+    conn.execute("UPDATE loyalty SET points = 999 WHERE customer_cid = 'C1'")
+    conn.commit()
+    conn.close()
+    assert db.reconcile_loyalty() == 1
+    assert _balance("C1") == 46
+    assert db.reconcile_loyalty() == 0
+
+
+def test_expire_clears_only_idle_balances(fresh_db):
+    db.add_loyalty_points("C1", 30)
+    db.add_loyalty_points("C2", 20)
+    conn = db.connect()
+    conn.execute("UPDATE loyalty_ledger SET ts = '2020-01-01 10:00:00' WHERE customer_cid = 'C1'")
+    conn.commit()
+    conn.close()
+
+    assert db.expire_loyalty(days=0) == 0
+    assert db.expire_loyalty(days=90) == 1
+    assert (_balance("C1"), _balance("C2")) == (0, 20)
+    assert db.get_loyalty_ledger("C1")[0][2:4] == ("expire", -30)
+    assert db.expire_loyalty(days=90) == 0
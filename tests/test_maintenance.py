@@ -0,0 +1,39 @@
+import sqlite3
+
+import db
+import maintenance
+
+
+def _auto_vacuum(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_new_database_is_created_incremental(fresh_db):
+    assert _auto_vacuum(fresh_db) == 2
+    conn = sqlite3.connect(fresh_db)
+    assert maintenance._incremental_vacuum(conn).startswith("released")
+    conn.close()
+
+
+def test_existing_database_is_left_alone_until_enabled(tmp_path, monkeypatch):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE legacy (x)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    db.init_db()
+    assert _auto_vacuum(path) == 0
+    conn = sqlite3.connect(path)
+    assert maintenance._incremental_vacuum(conn).startswith("skipped")
+    conn.close()
+
+    assert maintenance.enable_incremental_vacuum() is True
+    assert _auto_vacuum(path) == 2
+    assert maintenance.enable_incremental_vacuum() is False
+    db.invalidate_reference(path)
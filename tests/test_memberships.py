@@ -0,0 +1,49 @@
+import sqlite3
+
+import db
+
+
+def _expire(cid):
+    conn = db.connect()
+    conn.execute("UPDATE memberships SET expires_at = '2020-01-08 10:00:00' WHERE customer_cid = ?", (cid,))
+    conn.commit()
+    conn.close()
+
+
+def test_purge_does_not_take_the_write_lock_when_nothing_expired(fresh_db):
+    db.add_membership("C1", "Tier1")
+    holder = sqlite3.connect(fresh_db, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        assert db.purge_expired_memberships() is False
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert db.get_membership("C1")["tier"] == "Tier1"
+
+
+def test_purge_moves_expired_memberships_to_history(fresh_db):
+    db.add_membership("C1", "Tier1")
+    db.add_membership("C2", "Tier2")
+    _expire("C1")
+    assert db.purge_expired_memberships() is True
+    assert [r[0] for r in db.get_all_memberships()] == ["C2"]
+    conn = db.connect()
+    hist = conn.execute("SELECT customer_cid, tier, expired_at FROM membership_history").fetchall()
+    conn.close()
+    assert hist == [("C1", "Tier1", "2020-01-08 10:00:00")]
+    assert db.purge_expired_memberships() is False
+
+
+def test_expired_membership_counts_as_none_before_the_purge(fresh_db):
+    db.save_bill("E1", "C1", "REPAIR", "Engine", 800.0)
+    db.save_bill("E1", "C2", "REPAIR", "Engine", 500.0)
+    db.add_membership("C1", "Tier1")
+    db.add_membership("C2", "Tier2")
+    _expire("C1")
+
+    assert db.get_membership("C1") is None
+    tiers = {r[0]: r[9] for r in db.find_customers()}
+    assert tiers == {"C1": None, "C2": "Tier2"}
+    assert [r[0] for r in db.find_customers(tier="None")] == ["C1"]
+    assert db.find_customers(tier="Tier1") == []
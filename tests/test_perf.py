@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+import perf
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    out = []
+    monkeypatch.setattr(perf, "_log", out.append)
+    yield out
+    perf.finish(log=False)
+
+
+def _conn():
+    conn = sqlite3.connect(":memory:", factory=perf.connection_factory())
+    conn.execute("CREATE TABLE t (x)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(50)])
+    return conn
+
+
+def test_statements_record_rows_and_sections(logged):
+    perf.start_trace("page", "admin")
+    perf.mark("Boot")
+    conn = _conn()
+    with perf.section("Sales"):
+        cur = conn.execute("SELECT x FROM t WHERE x < ?", (10,))
+        assert cur.fetchone() == (0,)
+        assert len(cur.fetchmany(3)) == 3
+        assert sum(1 for _ in cur) == 6
+    trace = perf.finish(log=False)
+    select = trace.queries[-1]
+    assert select["sql"] == "SELECT x FROM t WHERE x < ?"
+    assert select["rows"] == 10
+    assert select["section"] == "Sales"
+    assert trace.queries[0]["section"] == "Boot"
+    summary = {s["section"]: s["queries"] for s in perf.section_summary(trace)}
+    assert summary == {"Boot": 2, "Sales": 1}
+
+
+def test_fetch_time_counts_towards_the_statement(logged, monkeypatch):
+    clock = iter(range(0, 1000, 1))
+    monkeypatch.setattr(perf.time, "perf_counter", lambda: next(clock))
+    perf.start_trace()
+    conn = _conn()
+    cur = conn.execute("SELECT x FROM t")      # 1 s to execute
+    cur.fetchall()                              # +1 s to fetch
+    trace = perf.finish(log=False)
+    assert trace.queries[-1]["ms"] == 2000.0
+
+
+def test_untraced_connections_are_plain():
+    assert perf.current() is None
+    assert perf.connection_factory() is sqlite3.Connection
+
+
+def test_new_trace_closes_one_left_open(logged):
+    first = perf.start_trace("cut short")      # e.g. the rerun ended in st.rerun()
+    _conn().execute("SELECT 1").fetchall()
+    second = perf.start_trace("next")
+    assert logged == [first]
+    assert first.total_ms is not None
+    _conn().execute("SELECT 2").fetchall()
+    assert perf.finish(log=False) is second
+    assert all("SELECT 2" not in q["sql"] for q in first.queries)
+    assert perf.finish() is None
@@ -0,0 +1,38 @@
+import sqlite3
+
+import db
+
+
+def test_rankings_cover_every_employee_in_one_query(fresh_db, monkeypatch):
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.add_employee("E2", "Asha", "Mechanic")
+    db.add_employee("E3", "Noor", "Trainee")
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.save_bill("E1", "C1", "REPAIR", "Engine", 800.0)
+    db.save_bill("E2", "C2", "REPAIR", "Engine", 500.0)
+    gone = db.save_bill("E2", "C2", "REPAIR", "Engine", 900.0)
+    db.soft_delete_bill(gone, actor="admin")
+
+    statements = []
+    connect_report = db.connect_report
+
+    def traced():
+        conn = connect_report()
+        conn.set_trace_callback(statements.append)
+        return conn
+    monkeypatch.setattr(db, "connect_report", traced)
+
+    assert db.get_employee_rankings("Total Sales") == [
+        {"Employee": "Ravi (E1)", "Total Sales": 3300.0},
+        {"Employee": "Asha (E2)", "Total Sales": 500.0},
+        {"Employee": "Noor (E3)", "Total Sales": 0.0},
+    ]
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+    assert [r["REPAIR"] for r in db.get_employee_rankings("REPAIR")] == [800.0, 500.0, 0.0]
+    assert [r["MEMBERSHIP"] for r in db.get_employee_rankings("MEMBERSHIP")] == [0.0, 0.0, 0.0]
+
+    # same numbers as summing the raw bills
+    conn = sqlite3.connect(fresh_db)
+    raw = dict(conn.execute("SELECT employee_cid, SUM(total_amount) FROM bills GROUP BY 1").fetchall())
+    conn.close()
+    assert raw == {"E1": 3300.0, "E2": 500.0}
@@ -0,0 +1,77 @@
+import math
+
+import pytest
+
+import cli
+import db
+import rerate
+
+RANGE = ("0000-01-01 00:00:00", "9999-12-31 23:59:59")
+
+
+def _commission(conn):
+    return dict(conn.execute("SELECT id, commission FROM bills").fetchall())
+
+
+def _rollup(conn):
+    return conn.execute("SELECT SUM(commission), SUM(tax) FROM bills_hourly").fetchone()
+
+
+@pytest.fixture
+def bills(fresh_db):
+    db.add_employee("E1", "Ravi", "Mechanic")       # 15%
+    settled = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 1000.0)
+    db.close_settlement(RANGE[1], actor="admin")
+    open_bill = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 1000.0)
+    free = db.save_bill("E1", "C1", "ITEMS", "Harness×1", 1000.0)   # no-commission items
+    return settled, open_bill, free
+
+
+def test_dry_run_reports_without_writing(bills):
+    rep = rerate.rerate_bills(*RANGE, rates={"Mechanic": 0.2}, tax_rate=0.1)
+    assert (rep["scanned"], rep["changed"], rep["skipped_settled"]) == (2, 1, 1)
+    assert (rep["commission_before"], rep["commission_after"]) == (150.0, 200.0)
+    conn = db.connect()
+    assert _commission(conn)[bills[1]] == 150.0
+    conn.close()
+
+
+def test_apply_skips_settled_bills_and_moves_the_rollup(bills):
+    settled, open_bill, free = bills
+    rep = rerate.rerate_bills(*RANGE, rates={"Mechanic": 0.2}, tax_rate=0.1, dry_run=False, actor="admin")
+    assert rep["changed"] == 1
+    conn = db.connect()
+    try:
+        assert _commission(conn) == {settled: 150.0, open_bill: 200.0, free: 0.0}
+        assert _rollup(conn) == (350.0, 7.5 + 20.0)
+        assert conn.execute("SELECT action FROM audit_log ORDER BY id DESC LIMIT 1").fetchone() == ("RERATE_BILLS",)
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("rates, tax", [
+    ({"Mechanic": math.nan}, 0.05),
+    ({"Mechanic": None}, 0.05),
+    ({"Mechanic": 1.5}, 0.05),
+    ({"Mechanic": "abc"}, 0.05),
+    ({"Mechanic": 0.2}, -0.1),
+])
+def test_bad_rates_are_rejected_before_anything_is_written(bills, rates, tax):
+    with pytest.raises(ValueError, match="between 0 and 1"):
+        rerate.rerate_bills(*RANGE, rates=rates, tax_rate=tax, dry_run=False)
+    conn = db.connect()
+    assert _commission(conn)[bills[1]] == 150.0
+    conn.close()
+
+
+@pytest.mark.parametrize("argv", [
+    ["rerate", "--rate", "Mechanic=abc"],
+    ["rerate", "--rate", "Mechanic"],
+    ["rerate", "--rate", "Boss=0.1"],
+    ["rerate", "--tax-rate", "nan"],
+])
+def test_cli_rejects_bad_rate_arguments(argv, capsys):
+    with pytest.raises(SystemExit) as exc:
+        cli.main(argv)
+    assert exc.value.code == 2
+    assert "error: argument" in capsys.readouterr().err
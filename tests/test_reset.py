@@ -0,0 +1,84 @@
+import pytest
+
+import db
+
+
+def _count(conn, table):
+    return conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+
+def test_reset_archives_ledger_and_zeroes_balances(fresh_db):
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.save_bill("E1", "C2", "ITEMS", "Harness×1", 800.0)
+    db.add_loyalty_points("C2", 40, actor="admin")
+    db.snapshot_loyalty()
+    before = {c: db.get_loyalty_points(c) for c in ("C1", "C2")}
+    assert before == {"C1": 25, "C2": 48}
+
+    archive = db.reset_all_billings(actor="admin")
+
+    ledger_archive = db.companion_archive(archive, "loyalty_ledger")
+    assert ledger_archive.startswith("loyalty_ledger_archive_")
+    conn = db.connect()
+    try:
+        for table in ("bills", "bills_hourly", "customers", "loyalty", "loyalty_ledger", "loyalty_snapshots"):
+            assert _count(conn, table) == 0, table
+        assert _count(conn, archive) == 2
+        assert _count(conn, ledger_archive) == 3
+        archived_bill_ids = {r[0] for r in conn.execute(f'SELECT id FROM "{archive}"')}
+        ledger_bill_ids = {r[0] for r in conn.execute(f'SELECT bill_id FROM "{ledger_archive}" WHERE bill_id IS NOT NULL')}
+        assert ledger_bill_ids == archived_bill_ids
+    finally:
+        conn.close()
+    assert {c: db.get_loyalty_points(c) for c in ("C1", "C2")} == {"C1": 0, "C2": 0}
+    assert db.get_loyalty_ledger("C2") == []
+
+    # new activity starts from zero and doesn't reuse ids
+    bill_id = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 300.0)
+    assert bill_id > max(archived_bill_ids)
+    assert db.get_loyalty_points("C1") == 3
+
+    assert db.drop_bill_archive(archive, actor="admin")
+    conn = db.connect()
+    try:
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name IN (?, ?)", (archive, ledger_archive)).fetchone()
+    finally:
+        conn.close()
+
+
+def test_reset_with_nothing_to_archive(fresh_db):
+    assert db.reset_all_billings(actor="admin") is None
+
+
+def test_bills_deleted_before_a_reset_cannot_come_back(fresh_db):
+    db.add_employee("E1", "Ravi", "Mechanic")
+    gone = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 500.0)
+    assert db.soft_delete_bill(gone, actor="admin")
+
+    archive = db.reset_all_billings(actor="admin")
+
+    deleted_archive = db.companion_archive(archive, "bills_deleted")
+    assert db.get_deleted_bills() == []
+    conn = db.connect()
+    try:
+        assert conn.execute(f'SELECT id FROM "{deleted_archive}"').fetchall() == [(gone,)]
+    finally:
+        conn.close()
+    with pytest.raises(ValueError, match="archived"):
+        db.restore_bills([gone], actor="admin")
+    conn = db.connect()
+    try:
+        for table in ("bills", "bills_hourly", "customers", "loyalty"):
+            assert _count(conn, table) == 0, table
+    finally:
+        conn.close()
+    assert db.get_loyalty_points("C1") == 0
+
+    assert db.drop_bill_archive(archive, actor="admin")
+    conn = db.connect()
+    try:
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (deleted_archive,)).fetchone()
+    finally:
+        conn.close()
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pandas as pd
+
+import db
+import segments
+
+NOW = datetime(2026, 6, 1, 12, 0, 0)
+
+
+def test_score_separates_champions_from_lost_customers():
+    # ten customers: the first five recent, frequent and big spenders, the rest long gone
+    rows = []
+    for i in range(10):
+        good = i < 5
+        rows.append({
+            "cid": f"C{i}",
+            "first_seen": "2025-01-01 10:00:00",
+            "last_seen": "2026-05-31 10:00:00" if good else f"2025-{11 - i:02d}-01 10:00:00",
+            "bill_count": 20 + i if good else 10 - i,
+            "lifetime_spend": 50000.0 + i if good else 500.0 + i,
+        })
+    df = segments.score(pd.DataFrame(rows), NOW)
+    assert set(df["r_score"]) <= set(range(1, 6))
+    best = df[df["cid"].isin(["C3", "C4"])]
+    assert (best["segment"] == "Champions").all()
+    assert (df.loc[df["cid"] == "C9", "segment"] == "Lost").all()
+    # a customer last seen over a year ago is projected to spend almost nothing more
+    assert df.loc[df["cid"] == "C9", "projected"].iloc[0] < 1
+    assert df.loc[df["cid"] == "C4", "projected"].iloc[0] > 1000
+
+
+def test_new_customer_with_no_history_scores_without_errors():
+    df = segments.score(pd.DataFrame([{"cid": "C1", "first_seen": None, "last_seen": None,
+                                       "bill_count": 0, "lifetime_spend": 0.0}]), NOW)
+    assert df["projected"].tolist() == [0.0]
+
+
+def test_refresh_segments_writes_scores_and_ltv(fresh_db):
+    assert segments.refresh_segments() == 0
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.save_bill("E1", "C2", "REPAIR", "Engine", 800.0)
+    assert segments.refresh_segments() == 2
+
+    conn = db.connect()
+    rows = conn.execute(
+        "SELECT cid, segment, lifetime_spend, ltv, scored_at FROM customers ORDER BY cid").fetchall()
+    conn.close()
+    for cid, segment, spend, ltv, scored_at in rows:
+        assert segment in segments.SEGMENTS
+        assert ltv >= spend
+        assert scored_at is not None
+    assert [r[0] for r in db.find_customers()] == ["C1", "C2"]
+    assert {r[0] for r in db.get_segment_summary()} <= set(segments.SEGMENTS)
@@ -0,0 +1,46 @@
+import pytest
+
+import db
+
+END = "9999-12-31 23:59:59"
+
+
+@pytest.fixture
+def staff(fresh_db):
+    db.add_employee("E1", "Ravi", "Mechanic")       # 15%
+    db.add_employee("E2", "Asha", "Manager")        # 25%
+
+
+def test_close_locks_bills_and_totals_per_employee(staff):
+    assert db.close_settlement(END, actor="admin") is None      # nothing to settle
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 1000.0)
+    db.save_bill("E1", "C2", "ITEMS", "Spoiler×1", 1000.0)
+    db.save_bill("E2", "C1", "ITEMS", "Spoiler×1", 2000.0)
+    assert db.get_unsettled_summary(END)[:2] == (3, 4000.0)
+
+    pid = db.close_settlement(END, actor="admin")
+    assert db.get_unsettled_summary(END)[0] == 0
+    rows = {r[0]: r for r in db.get_settlement(pid)}
+    assert rows["E1"][2:7] == (2, 2000.0, 300.0, 15.0, 285.0)
+    assert rows["E2"][2:7] == (1, 2000.0, 500.0, 25.0, 475.0)
+    (period,) = db.get_settlement_periods()
+    assert period[0] == pid and period[5:10] == (3, 4000.0, 800.0, 40.0, 760.0)
+
+    # later bills wait for the next period
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 1000.0)
+    assert db.get_unsettled_summary(END)[:2] == (1, 1000.0)
+    assert db.close_settlement(END, actor="admin") == pid + 1
+
+
+def test_deleting_a_settled_bill_records_an_adjustment(staff):
+    bill = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 1000.0)
+    db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 1000.0)
+    pid = db.close_settlement(END, actor="admin")
+
+    assert db.soft_delete_bill(bill, actor="admin")
+    (adj,) = db.get_settlement_adjustments(pid)
+    assert adj[1:8] == ("E1", bill, "DELETE_BILL", -1000.0, -150.0, -7.5, -142.5)
+    # the closed period itself is untouched; the adjustment shows next to it
+    (row,) = db.get_settlement(pid)
+    assert row[2:] == (2, 2000.0, 300.0, 15.0, 285.0, -142.5, 142.5)
+    assert db.get_settlement_periods()[0][10:] == (1, -142.5)
@@ -0,0 +1,65 @@
+import sqlite3
+
+import db
+
+
+def _live(cid):
+    return {e: (n, r) for e, _, _, n, r in db.get_live_shifts()}.get(cid)
+
+
+def test_open_shift_counters_follow_bills(fresh_db):
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.add_employee("E2", "Asha", "Mechanic")
+    assert db.start_shift("E1") == (True, "Shift started.")
+    assert _live("E1") == (0, 0.0)
+
+    first = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    db.save_bill("E1", "C2", "UPGRADES", "Upgrade: ₹100", 150.0)
+    db.save_bill("E2", "C1", "ITEMS", "Spoiler×1", 2500.0)        # no open shift for E2
+    assert _live("E1") == (2, 2650.0)
+
+    assert db.soft_delete_bill(first, actor="admin")
+    assert _live("E1") == (1, 150.0)
+
+    assert db.end_shift("E1") == (True, "Shift ended.")
+    assert _live("E1") is None
+    (row,) = db.get_employee_shifts("E1", "0000", "9999")
+    assert row[6:] == (1, 150.0)
+
+
+def test_backfill_runs_once_on_older_databases(tmp_path, monkeypatch):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE shifts (id INTEGER PRIMARY KEY AUTOINCREMENT, employee_cid TEXT, start_ts TEXT,
+                    end_ts TEXT, duration_minutes INTEGER, bills_count INTEGER, revenue REAL)""")
+    conn.execute("""CREATE TABLE bills (id INTEGER PRIMARY KEY AUTOINCREMENT, employee_cid TEXT, customer_cid TEXT,
+                    billing_type TEXT, details TEXT, total_amount REAL, timestamp TEXT, commission REAL, tax REAL)""")
+    conn.execute("INSERT INTO shifts (employee_cid, start_ts) VALUES ('E1', '2026-10-01 10:00:00')")
+    conn.executemany("INSERT INTO bills (employee_cid, total_amount, timestamp) VALUES ('E1', ?, ?)",
+                     [(100.0, "2026-10-01 09:00:00"), (200.0, "2026-10-01 11:00:00"), (300.0, "2026-10-01 12:00:00")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db, "DB_PATH", path)
+
+    db.init_db()
+    assert _live("E1") == (2, 500.0)
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] >= 1
+    conn.close()
+    db.invalidate_reference(path)
+
+
+def test_second_init_db_does_not_write(fresh_db):
+    db.start_shift("E1")
+    watcher = sqlite3.connect(fresh_db)
+    version = watcher.execute("PRAGMA data_version").fetchone()[0]
+    # another connection holds the write lock: a writing init_db would wait and fail
+    holder = sqlite3.connect(fresh_db, isolation_level=None, timeout=0.1)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        db.init_db()
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert watcher.execute("PRAGMA data_version").fetchone()[0] == version
+    watcher.close()
@@ -0,0 +1,101 @@
+import pytest
+
+import db
+
+ROLLUP = """SELECT bucket, employee_cid, billing_type, hood, bills, revenue, commission, tax
+            FROM bills_hourly WHERE bills != 0 ORDER BY 1, 2, 3, 4"""
+CUSTOMERS = "SELECT cid, first_seen, last_seen, bill_count, lifetime_spend FROM customers ORDER BY cid"
+
+
+def _rows(sql):
+    conn = db.connect()
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def _rebuilt(fn, sql):
+    """What a from-scratch rebuild gives, without touching the live tables."""
+    conn = db.connect()
+    try:
+        conn.execute("SAVEPOINT rebuilt")
+        fn(conn)
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.execute("ROLLBACK TO rebuilt")
+        conn.close()
+
+
+def _state():
+    return {
+        "rollup": _rows(ROLLUP),
+        "customers": _rows(CUSTOMERS),
+        "loyalty": _rows("SELECT customer_cid, points FROM loyalty WHERE points != 0 ORDER BY 1"),
+        "shift": {e: (n, r) for e, _, _, n, r in db.get_live_shifts()},
+    }
+
+
+def _bills():
+    db.add_employee("E1", "Ravi", "Mechanic")
+    db.start_shift("E1")
+    db.add_loyalty_points("C1", 20)
+    keep = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0)
+    redeemed = db.save_bill("E1", "C1", "ITEMS", "Spoiler×1", 2500.0, redeem_points=20)
+    other = db.save_bill("E1", "C2", "REPAIR", "Engine", 800.0)
+    return keep, redeemed, other
+
+
+def test_bulk_soft_delete_reverses_every_side_effect(fresh_db):
+    keep, redeemed, other = _bills()
+    assert _state()["shift"]["E1"] == (3, 5780.0)
+
+    assert db.soft_delete_bills([redeemed, other, 999], actor="admin") == 2
+    after = _state()
+    assert after["rollup"] == _rebuilt(db.rebuild_bills_hourly, ROLLUP)
+    assert after["customers"] == _rebuilt(db.rebuild_customers, CUSTOMERS)
+    assert [c[0] for c in after["customers"]] == ["C1"]
+    # the 20 redeemed points come back, the 24 earned on the deleted bill go
+    assert after["loyalty"] == [("C1", 25 + 20)]
+    assert after["shift"]["E1"] == (1, 2500.0)
+    assert sorted(r[0] for r in db.get_deleted_bills()) == [redeemed, other]
+    assert _rows("SELECT action FROM audit_log ORDER BY id DESC LIMIT 1") == [("DELETE_BILLS",)]
+
+    assert db.soft_delete_bills([redeemed], actor="admin") == 0
+    assert [r[0] for r in _rows("SELECT id FROM bills")] == [keep]
+
+
+def test_restore_puts_everything_back(fresh_db):
+    keep, redeemed, other = _bills()
+    before = _state()
+    db.soft_delete_bills([redeemed, other], actor="admin")
+
+    assert db.restore_bills([redeemed, other, keep, 999], actor="admin") == 2
+    assert _state() == before
+    assert db.get_deleted_bills() == []
+    assert _rows("SELECT action FROM audit_log ORDER BY id DESC LIMIT 1") == [("RESTORE_BILLS",)]
+    assert db.restore_bills([redeemed], actor="admin") == 0
+
+
+def test_restore_refuses_bills_from_a_closed_settlement(fresh_db):
+    keep, redeemed, other = _bills()
+    pid = db.close_settlement("9999-12-31 23:59:59", actor="admin")
+    db.soft_delete_bills([redeemed, other], actor="admin")
+    after_delete = _state()
+
+    with pytest.raises(ValueError, match=f"{redeemed} \\(period #{pid}\\)"):
+        db.restore_bills([other, redeemed], actor="admin")
+    assert _state() == after_delete
+    assert len(db.get_deleted_bills()) == 2
+    assert [a[3] for a in db.get_settlement_adjustments(pid)] == ["DELETE_BILL", "DELETE_BILL"]
+
+
+def test_restore_refuses_bills_from_a_reset_period(fresh_db):
+    keep, redeemed, other = _bills()
+    db.soft_delete_bills([other], actor="admin")
+    archive = db.reset_all_billings(actor="admin")
+
+    for bill in (other, keep):
+        with pytest.raises(ValueError, match=archive):
+            db.restore_bills([bill], actor="admin")
+    assert _rows("SELECT COUNT(*) FROM bills") == [(0,)]
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+
+import db
+import timeseries
+
+NOW = datetime(2026, 10, 19, 12, 0, 0)      # a Monday; everything below is closed
+
+
+@pytest.fixture
+def bills(fresh_db):
+    timeseries.clear_cache()
+    conn = db.connect()
+    conn.executemany("""
+        INSERT INTO bills (employee_cid, customer_cid, billing_type, details, total_amount, timestamp,
+                           commission, tax, hood)
+        VALUES (?, 'C1', ?, 'x', ?, ?, ?, 0, ?)
+    """, [
+        ("E1", "REPAIR", 100.0, "2026-10-05 09:15:00", 10.0, "Reds"),    # Mon, week 1
+        ("E1", "ITEMS", 200.0, "2026-10-05 09:45:00", 20.0, "Reds"),
+        ("E2", "REPAIR", 400.0, "2026-10-07 18:00:00", 40.0, "Blues"),   # Wed, week 1
+        ("E2", "REPAIR", 800.0, "2026-11-02 10:00:00", 80.0, "Blues"),   # next month
+    ])
+    conn.commit()
+    conn.close()
+    db.write_txn("rebuild", db.rebuild_bills_hourly)
+    yield
+    timeseries.clear_cache()
+
+
+def test_empty_buckets_come_back_as_zeros(bills):
+    rows = timeseries.revenue_series("2026-10-05 00:00:00", "2026-10-08 23:59:59", "day", now=NOW)
+    assert rows == [("2026-10-05 00:00:00", 2, 300.0, 30.0), ("2026-10-06 00:00:00", 0, 0.0, 0.0),
+                    ("2026-10-07 00:00:00", 1, 400.0, 40.0), ("2026-10-08 00:00:00", 0, 0.0, 0.0)]
+    hours = timeseries.revenue_series("2026-10-05 08:30:00", "2026-10-05 10:00:00", "hour", now=NOW)
+    assert [(r[0], r[1]) for r in hours] == [("2026-10-05 08:00:00", 0), ("2026-10-05 09:00:00", 2),
+                                             ("2026-10-05 10:00:00", 0)]
+
+
+def test_week_and_month_buckets_widen_the_range(bills):
+    weeks = timeseries.revenue_series("2026-10-07 00:00:00", "2026-10-13 00:00:00", "week", now=NOW)
+    assert weeks == [("2026-10-05 00:00:00", 3, 700.0, 70.0), ("2026-10-12 00:00:00", 0, 0.0, 0.0)]
+    months = timeseries.revenue_series("2026-10-20 00:00:00", "2026-11-02 00:00:00", "month", now=NOW)
+    assert months == [("2026-10-01 00:00:00", 3, 700.0, 70.0), ("2026-11-01 00:00:00", 1, 800.0, 80.0)]
+
+
+def test_split_and_filters(bills):
+    rows = timeseries.revenue_series("2026-10-05 00:00:00", "2026-10-06 23:59:59", "day", by="employee_cid",
+                                     now=NOW)
+    assert rows == [("2026-10-05 00:00:00", "E1", 2, 300.0, 30.0), ("2026-10-06 00:00:00", "E1", 0, 0.0, 0.0)]
+    rows = timeseries.revenue_series("2026-10-01 00:00:00", "2026-10-31 23:59:59", "month", by="hood", now=NOW)
+    assert [(r[1], r[3]) for r in rows] == [("Blues", 400.0), ("Reds", 300.0)]
+    rows = timeseries.revenue_series("2026-10-01 00:00:00", "2026-10-31 23:59:59", "month",
+                                     billing_type="REPAIR", hood="Reds", now=NOW)
+    assert rows == [("2026-10-01 00:00:00", 1, 100.0, 10.0)]
+    with pytest.raises(ValueError):
+        timeseries.revenue_series("2026-10-01 00:00:00", "2026-10-31 23:59:59", "year")
+    with pytest.raises(ValueError):
+        timeseries.revenue_series("2026-10-01 00:00:00", "2026-10-31 23:59:59", by="customer_cid")
+
+
+def test_closed_buckets_are_cached_until_the_next_audit_entry(bills):
+    args = ("2026-10-05 00:00:00", "2026-10-07 23:59:59", "day")
+    assert timeseries.revenue_series(*args, now=NOW)[0][1:3] == (2, 300.0)
+
+    # an unaudited change to a closed bucket is not re-read...
+    conn = db.connect()
+    conn.execute("UPDATE bills_hourly SET revenue = revenue + 1 WHERE billing_type = 'ITEMS'")
+    conn.commit()
+    (bill_id,) = conn.execute("SELECT id FROM bills WHERE total_amount = 100").fetchone()
+    conn.close()
+    assert timeseries.revenue_series(*args, now=NOW)[0][1:3] == (2, 300.0)
+
+    # ...but deleting a bill is audited and drops the cache
+    assert db.soft_delete_bill(bill_id, actor="admin")
+    assert timeseries.revenue_series(*args, now=NOW)[0][1:3] == (1, 201.0)
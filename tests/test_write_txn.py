@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(db, "WRITE_BUSY_TIMEOUT", 0.01)
+    monkeypatch.setattr(db, "WRITE_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(db, "WRITE_BACKOFF_MAX", 0.02)
+    db.reset_contention_stats()
+    yield
+    db.reset_contention_stats()
+
+
+def _stats(op):
+    return next(r for r in db.get_contention_stats() if r["op"] == op)
+
+
+def test_commits_and_returns_result(fresh_db, fast_retries):
+    assert db.write_txn("t", lambda conn: conn.execute("INSERT INTO hoods (name) VALUES ('A')").lastrowid) == 1
+    assert [h for h, _ in db.get_all_hoods()] == ["A"]
+    assert (_stats("t")["calls"], _stats("t")["retries"]) == (1, 0)
+
+
+def test_error_rolls_back(fresh_db, fast_retries):
+    def op(conn):
+        conn.execute("INSERT INTO hoods (name) VALUES ('A')")
+        raise ValueError("no")
+    with pytest.raises(ValueError):
+        db.write_txn("t", op)
+    conn = db.connect()
+    assert conn.execute("SELECT COUNT(*) FROM hoods").fetchone() == (0,)
+    conn.close()
+
+
+def test_retries_until_the_lock_is_released(fresh_db, fast_retries):
+    holder = sqlite3.connect(fresh_db, isolation_level=None, check_same_thread=False)
+    holder.execute("BEGIN IMMEDIATE")
+    calls = []
+
+    def op(conn):
+        calls.append(1)
+        conn.execute("INSERT INTO hoods (name) VALUES ('A')")
+        return "done"
+
+    release = threading.Timer(0.1, lambda: holder.execute("COMMIT"))
+    release.start()
+    try:
+        assert db.write_txn("t", op, retries=100) == "done"
+    finally:
+        release.join()
+        holder.close()
+    assert len(calls) == 1              # fn only runs once the write lock is held
+    assert _stats("t")["retries"] > 0
+
+
+def test_gives_up_with_write_busy_error(fresh_db, fast_retries):
+    holder = sqlite3.connect(fresh_db, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(db.WriteBusyError, match="gave up after 3 attempts"):
+            db.write_txn("t", lambda conn: None, retries=2)
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert _stats("t")["failed"] == 1
+    assert _stats("t")["retries"] == 2
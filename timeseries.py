@@ -0,0 +1,158 @@
+"""
+Revenue over time: bills, revenue and commission per hour/day/week/month.
+
+Buckets are computed in SQL from the bills_hourly rollup (never from raw
+bills), for any combination of employee / hood / billing type filters and
+optionally split by one of them. Every bucket in the range is returned,
+empty ones as zeros, so charts don't skip gaps. Ranges are widened to whole
+buckets (weeks start on Monday).
+
+Closed buckets are cached per (db, grain, filters, split) and never queried
+again; only the open tail (the bucket "now" is in, plus anything not seen
+yet) goes to SQLite. Writes that rewrite past sales (deletes, restores,
+re-rating, hood renames, resets) are audited, so a new audit entry drops the
+cached buckets.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+
+import db
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+GRAINS = ("hour", "day", "week", "month")
+SPLITS = ("employee_cid", "hood", "billing_type")
+CLOSE_GRACE = timedelta(minutes=5)      # a bill stamped 10:59:59 may commit just after 11:00
+
+# bills_hourly.bucket is "YYYY-MM-DD HH"; each expression yields that prefix of the bucket start
+_SQL_BUCKET = {
+    "hour": "bucket",
+    "day": "substr(bucket, 1, 10)",
+    "week": "date(substr(bucket, 1, 10), '-6 days', 'weekday 1')",
+    "month": "substr(bucket, 1, 7)",
+}
+_LABEL_LEN = {"hour": 13, "day": 10, "week": 10, "month": 7}
+
+_CACHE_SIZE = 64
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+
+# ---------- BUCKETS ----------
+def bucket_start(ts, grain):
+    if grain == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if grain == "day":
+        return day
+    if grain == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_bucket(start, grain):
+    if grain == "hour":
+        return start + timedelta(hours=1)
+    if grain == "day":
+        return start + timedelta(days=1)
+    if grain == "week":
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def buckets(start, end, grain):
+    """Start of every bucket overlapping [start, end]."""
+    out, b = [], bucket_start(start, grain)
+    while b <= end:
+        out.append(b)
+        b = next_bucket(b, grain)
+    return out
+
+
+# ---------- QUERY ----------
+def _filters(employee_cid, hood, billing_type):
+    where, params = [], []
+    for col, val in (("employee_cid", employee_cid), ("hood", hood), ("billing_type", billing_type)):
+        if val is not None:
+            where.append(f"{col} = ?")
+            params.append(val)
+    return where, params
+
+
+def _query(conn, lo, hi, grain, where, params, by):
+    """{label: {key: [bills, revenue, commission]}} for buckets in [lo, hi)."""
+    rows = conn.execute(f"""
+      SELECT {_SQL_BUCKET[grain]} AS b, {by or "NULL"}, SUM(bills), SUM(revenue), SUM(commission)
+      FROM bills_hourly
+      WHERE bucket >= ? AND bucket < ? {''.join(' AND ' + w for w in where)}
+      GROUP BY b{', ' + by if by else ''}
+    """, [lo.strftime("%Y-%m-%d %H"), hi.strftime("%Y-%m-%d %H")] + params).fetchall()
+    out = {}
+    for label, k, bills, revenue, commission in rows:
+        out.setdefault(label, {})[k] = [bills or 0, revenue or 0.0, commission or 0.0]
+    return out
+
+
+def revenue_series(start_str, end_str, grain="day", employee_cid=None, hood=None, billing_type=None, by=None,
+                   now=None):
+    """
+    Bucketed totals between start_str and end_str (IST strings).
+
+    Returns [(bucket_start, bills, revenue, commission)], or with by (one of
+    SPLITS) [(bucket_start, key, bills, revenue, commission)] with a row for
+    every key seen in the range in every bucket. bucket_start is a
+    "YYYY-MM-DD HH:MM:SS" string.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+    if by is not None and by not in SPLITS:
+        raise ValueError(f"by must be one of {', '.join(SPLITS)}")
+    now = (now or datetime.now(db.IST)).replace(tzinfo=None)
+    starts = buckets(datetime.strptime(start_str, TS_FMT), datetime.strptime(end_str, TS_FMT), grain)
+    if not starts:
+        return []
+    stamps = [b.isoformat(" ") for b in starts]     # == strftime(TS_FMT), much cheaper over long hourly ranges
+    labels = [s[:_LABEL_LEN[grain]] for s in stamps]
+    # snapshot reads can lag by up to REPORT_STALENESS_S, so a bucket closes only after that too
+    closed_before = now - max(CLOSE_GRACE, timedelta(seconds=db.REPORT_STALENESS_S))
+    where, params = _filters(employee_cid, hood, billing_type)
+    key = (db.current_db_path(), grain, employee_cid, hood, billing_type, by)
+
+    conn = db.connect_report()
+    try:
+        gen = conn.execute("SELECT MAX(id) FROM audit_log").fetchone()[0]
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is None or entry["gen"] != gen:
+                entry = {"gen": gen, "buckets": {}}
+            cached = dict(entry["buckets"])
+        missing = [b for b, label in zip(starts, labels) if label not in cached]
+        fresh = _query(conn, missing[0], next_bucket(missing[-1], grain), grain, where, params, by) if missing else {}
+    finally:
+        conn.close()
+
+    data, closed = {}, {}
+    for b, label in zip(starts, labels):
+        if label in cached:
+            data[label] = cached[label]
+            continue
+        data[label] = fresh.get(label, {})
+        if next_bucket(b, grain) <= closed_before:
+            closed[label] = data[label]
+    with _cache_lock:
+        entry["buckets"].update(closed)
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    zero = [0, 0.0, 0.0]
+    if by is None:
+        return [(s, *data[label].get(None, zero)) for s, label in zip(stamps, labels)]
+    keys = sorted({k for v in data.values() for k in v}, key=lambda k: (k is None, k or ""))
+    return [(s, k, *data[label].get(k, zero)) for s, label in zip(stamps, labels) for k in keys]
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()